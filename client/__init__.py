@@ -1,6 +1,7 @@
 
 import aiohttp
-from client import object, errors, image_generator, notifications
+import asyncio
+from client import object, errors, image_generator, notifications, chat_counters, mention_matcher, history_catalogue, backups, maintenance, timeseries
 
 import datetime
 import setup as s
@@ -10,8 +11,6 @@ from db import wrapper
 
 from discord.ext import commands
 
-import shutil
-import os
 
 import ijson.backends.yajl2_c as ijson
 
@@ -20,10 +19,19 @@ class Client():
 
         self.refresh_no : int = 0
         self.__dynmap_update_timestamp = 0
+        self.__markers_etag : str = None
+        self.__markers_last_modified : str = None
         self.messages_sent = 0
         
         self.session : aiohttp.ClientSession= None
-        self.database = db.Database("towny.db", auto_commit=False)
+        self.database = db.Database("towny.db", auto_commit=False, read_connections=s.database_read_connections)
+        self.chat_counters = chat_counters.ChatCounters(self, s.chat_journal_path)
+        self.mention_matcher = mention_matcher.MentionMatcher()
+        self.history_catalogue = history_catalogue.HistoryCatalogue(self)
+        self.backups = backups.Backups(self, "towny.db", "backups")
+        self.maintenance = maintenance.Maintenance(self)
+        self.history_today : timeseries.TimeSeriesStore = None
+        self.refresh_lock = asyncio.Lock() # Held while the refresh writes, so maintenance doesn't commit half of one
         self.bot : commands.Bot = None
         self.url = s.map_url
 
@@ -41,6 +49,14 @@ class Client():
     errors = errors
 
     async def init_db(self, update_coro = None):
+        # Set up runs in the task events and loops are made from, so writer routing mustn't stay set for them
+        writer = self.database.use_writer()
+        try:
+            await self.__init_db(update_coro)
+        finally:
+            self.database.stop_using_writer(writer)
+
+    async def __init_db(self, update_coro = None):
         await self.database.connect()
         await self.database.connection.execute("PRAGMA auto_vacuum = FULL")
 
@@ -114,6 +130,9 @@ class Client():
                     db.CreationAttribute("mentions", db.types.Int),
                     db.CreationAttribute("duration", db.types.Int),
                     db.CreationAttribute("last", db.types.Datetime)
+                ],
+                [
+                    db.CreationIndex(["type", "name"], unique=True)
                 ]
             )
         )
@@ -126,6 +145,10 @@ class Client():
                     db.CreationAttribute("town", db.types.String),
                     db.CreationAttribute("duration", db.types.Int),
                     db.CreationAttribute("last", db.types.Datetime)
+                ],
+                [
+                    db.CreationIndex(["player", "town"], unique=True),
+                    db.CreationIndex(["town"])
                 ]
             )
         )
@@ -150,6 +173,9 @@ class Client():
                     db.CreationAttribute("visited_players", db.types.Int),
                     db.CreationAttribute("current_name", db.types.String),
                     db.CreationAttribute("mentions", db.types.Int)
+                ],
+                [
+                    db.CreationIndex(["town", "date"], unique=True)
                 ]
             )
         )
@@ -166,6 +192,10 @@ class Client():
                     db.CreationAttribute("area", db.types.Int),
                     db.CreationAttribute("duration", db.types.Int),
                     db.CreationAttribute("visited_players", db.types.Int)
+                ],
+                [
+                    db.CreationIndex(["town", "time"]),
+                    db.CreationIndex(["time"])
                 ]
             )
         )
@@ -182,6 +212,9 @@ class Client():
                     db.CreationAttribute("likely_nation", db.types.String),
                     db.CreationAttribute("messages", db.types.Int),
                     db.CreationAttribute("mentions", db.types.Int)
+                ],
+                [
+                    db.CreationIndex(["player", "date"], unique=True)
                 ]
             )
         )
@@ -194,6 +227,10 @@ class Client():
                     db.CreationAttribute("time", db.types.Datetime),
                     db.CreationAttribute("duration", db.types.Int),
                     db.CreationAttribute("visited_towns", db.types.Int)
+                ],
+                [
+                    db.CreationIndex(["player", "time"]),
+                    db.CreationIndex(["time"])
                 ]
             )
         )
@@ -213,6 +250,9 @@ class Client():
                     db.CreationAttribute("duration", db.types.Int),
                     db.CreationAttribute("current_name", db.types.String),
                     db.CreationAttribute("mentions", db.types.Int)
+                ],
+                [
+                    db.CreationIndex(["nation", "date"], unique=True)
                 ]
             )
         )
@@ -228,6 +268,10 @@ class Client():
                     db.CreationAttribute("residents", db.types.Int),
                     db.CreationAttribute("area", db.types.Int),
                     db.CreationAttribute("duration", db.types.Int),
+                ],
+                [
+                    db.CreationIndex(["nation", "time"]),
+                    db.CreationIndex(["time"])
                 ]
             )
         )
@@ -246,6 +290,9 @@ class Client():
                     db.CreationAttribute("activity", db.types.Int),
                     db.CreationAttribute("messages", db.types.Int),
                     db.CreationAttribute("database_size", db.types.Float)
+                ],
+                [
+                    db.CreationIndex(["date"])
                 ]
             )
         )
@@ -265,6 +312,9 @@ class Client():
                     db.CreationAttribute("messages", db.types.Int),
                     db.CreationAttribute("online_players", db.types.Int)
                 ],
+                [
+                    db.CreationIndex(["time"])
+                ]
             )
         )
 
@@ -280,6 +330,9 @@ class Client():
                     db.CreationAttribute("residents", db.types.Int),
                     db.CreationAttribute("area", db.types.Int),
                     db.CreationAttribute("mentions", db.types.Int)
+                ],
+                [
+                    db.CreationIndex(["object", "date"])
                 ]
             )
         )
@@ -292,6 +345,9 @@ class Client():
                     db.CreationAttribute("object_name", db.types.String),
                     db.CreationAttribute("name", db.types.String),
                     db.CreationAttribute("value", db.types.Any)
+                ],
+                [
+                    db.CreationIndex(["object_type", "object_name"])
                 ]
             )
         )
@@ -304,6 +360,9 @@ class Client():
                     db.CreationAttribute("object_name", db.types.String),
                     db.CreationAttribute("duration", db.types.Int),
                     db.CreationAttribute("last", db.types.Datetime)
+                ],
+                [
+                    db.CreationIndex(["object_type", "object_name"], unique=True)
                 ]
             )
         )
@@ -321,6 +380,13 @@ class Client():
             )
         )
 
+        # Counters are upserted, so need unique keys. Old merges could have left a name twice, so add those together before the indexes are made
+        existing_tables = [t.name for t in await self.database.tables]
+        if "chat_message_counts" in existing_tables:
+            await self.database.connection.execute("UPDATE chat_message_counts SET amount=(SELECT SUM(amount) FROM chat_message_counts c WHERE c.player=chat_message_counts.player), last=(SELECT MAX(last) FROM chat_message_counts c WHERE c.player=chat_message_counts.player) WHERE player IN (SELECT player FROM chat_message_counts GROUP BY player HAVING COUNT(*) > 1)")
+        if "chat_mentions" in existing_tables:
+            await self.database.connection.execute("UPDATE chat_mentions SET amount=(SELECT SUM(amount) FROM chat_mentions c WHERE c.object_type=chat_mentions.object_type AND c.object_name=chat_mentions.object_name), last=(SELECT MAX(last) FROM chat_mentions c WHERE c.object_type=chat_mentions.object_type AND c.object_name=chat_mentions.object_name) WHERE (object_type, object_name) IN (SELECT object_type, object_name FROM chat_mentions GROUP BY object_type, object_name HAVING COUNT(*) > 1)")
+
         self.chat_message_counts_table = await self.database.create_or_get_table(
             db.CreationTable(
                 "chat_message_counts",
@@ -328,6 +394,9 @@ class Client():
                     db.CreationAttribute("player", db.types.String),
                     db.CreationAttribute("amount", db.types.Int),
                     db.CreationAttribute("last", db.types.Datetime)
+                ],
+                [
+                    db.CreationIndex(["player"], unique=True)
                 ]
             )
         )
@@ -340,13 +409,26 @@ class Client():
                     db.CreationAttribute("object_name", db.types.String),
                     db.CreationAttribute("amount", db.types.Int),
                     db.CreationAttribute("last", db.types.Datetime)
+                ],
+                [
+                    db.CreationIndex(["object_type", "object_name"], unique=True)
                 ]
             )
         )
 
+        self.chat_counters.load_journal()
 
+        # Day history is kept by the time series store now. The tables are only read for their columns
+        self.history_today = timeseries.TimeSeriesStore(s.history_today_path, {
+            object_type:[a.name for a in table.attributes if a.name not in [object_type, "time"]]
+            for object_type, table in [("town", self.town_day_history_table), ("player", self.player_day_history_table), ("nation", self.nation_day_history_table), ("global", self.global_day_history_table)]
+        }, s.history_today_resolutions)
+        self.history_today.load()
+
+        await self.database.connection.commit() # Journal mode can't change inside the migration transaction
         #await self.database.connection.execute('PRAGMA synchronous = OFF')
         await self.database.connection.execute('PRAGMA journal_mode = WAL')
+        await self.database.connect_readers()
         
     @property 
     async def tracking_footer(self):
@@ -358,26 +440,38 @@ class Client():
 
 
     async def fetch_world(self):
+        # Refresh runs in one transaction, so read its own writes
+        self.database.use_writer()
 
         await self.create_session()
 
-        map = await self.session.get(f"{self.url}/up/world/RulerEarth/0")
-        map_data = await self.session.get(f"{self.url}/tiles/_markers_/marker_RulerEarth.json")
+        # Markers (town claims) rarely change, so only download them if they have
+        headers = {"Accept-Encoding":"gzip"}
+        if self.__markers_etag: headers["If-None-Match"] = self.__markers_etag
+        if self.__markers_last_modified: headers["If-Modified-Since"] = self.__markers_last_modified
+
+        map, map_data = await asyncio.gather(
+            self.session.get(f"{self.url}/up/world/RulerEarth/0"),
+            self.session.get(f"{self.url}/tiles/_markers_/marker_RulerEarth.json", headers=headers)
+        )
 
         if map.status == 502 or map_data.status == 502:
             return False
         
-        await self.world.refresh(map.content, map_data.content)
+        markers_changed = map_data.status != 304
+        if not markers_changed:
+            map_data.release()
+        
+        await self.world.refresh(map.content, map_data.content if markers_changed else None)
+
+        if markers_changed:
+            self.__markers_etag = map_data.headers.get("ETag")
+            self.__markers_last_modified = map_data.headers.get("Last-Modified")
     
     async def fetch_chat_messages(self):
-        
-        mentions = {}
-        for town in self.world.towns: 
-            mentions[town.name.lower()] = ("town", town.name)
-        for object_type in self.world._objects: 
-            for object in self.world._objects[object_type]: mentions[object.name.lower()] = (object_type[:-1], object.name) 
-        for player in self.world.players:
-            mentions[player.name.lower()] = ("player", player.name)
+        self.database.use_writer()
+
+        self.mention_matcher.update(self.world)
 
         r = await self.session.get(f"{self.url}/up/world/RulerEarth/{self.__dynmap_update_timestamp+1}")
         
@@ -392,49 +486,46 @@ class Client():
                         sender = self.world.get_player(update["account"], False)
                         message : str = update['message']
 
-                        for word in message.split(" "):
-                            if word.lower() in mentions:
-                                mention = mentions[word.lower()]
-
-                                cond2 = [db.CreationCondition("object_type", mention[0]), db.CreationCondition("object_name", mention[1])]
-                                exists = await self.chat_mentions_table.record_exists(cond2)
-                                if not exists: await self.chat_mentions_table.add_record([mention[0], mention[1], 1, datetime.datetime.now()])
-                                else: await self.chat_mentions_table.update_record(cond2, [db.CreationField.add("amount", 1), db.CreationField("last", datetime.datetime.now())])
+                        now = datetime.datetime.now()
+                        for object_type, object_name in self.mention_matcher.find(message):
+                            self.chat_counters.add_mention(object_type, object_name, now)
 
                         if sender:
-                            cond2 = [db.CreationCondition("player", sender.name)]
-                            exists = await self.chat_message_counts_table.record_exists(cond2)
-                            if not exists: await self.chat_message_counts_table.add_record([sender.name, 1, datetime.datetime.now()])
-                            else: await self.chat_message_counts_table.update_record(cond2, [db.CreationField.add("amount", 1), db.CreationField("last", datetime.datetime.now())])
+                            self.chat_counters.add_message(sender.name, now)
+
+        self.chat_counters.write_journal()
+        if self.chat_counters.size >= s.chat_flush_threshold:
+            async with self.refresh_lock: # Not part way through the refresh's or maintenance's transaction
+                await self.chat_counters.flush()
+                await self.commit()
+
+    async def commit(self):
+        batches = self.chat_counters.unconfirmed_batches
+        await self.database.commit()
+        self.chat_counters.committed(batches)
+        self.history_catalogue.committed()
+
+    async def close(self):
+        self.database.use_writer()
+        await self.chat_counters.flush()
+        await self.commit()
+        if self.history_today:
+            await self.history_today.save()
+        await self.database.close()
     
     async def cull_db(self):
-
-        await self.player_day_history_table.delete_records([db.CreationCondition("time", datetime.datetime.now()-datetime.timedelta(days=1), "<")])
-        await self.town_day_history_table.delete_records([db.CreationCondition("time", datetime.datetime.now()-datetime.timedelta(days=1), "<")])
-        await self.nation_day_history_table.delete_records([db.CreationCondition("time", datetime.datetime.now()-datetime.timedelta(days=1), "<")])
-        await self.global_day_history_table.delete_records([db.CreationCondition("time", datetime.datetime.now()-datetime.timedelta(days=1), "<")])
-
-        await self.players_table.delete_records([db.CreationCondition("last", datetime.datetime.now()-s.cull_players_from, "<")])
-        await self.towns_table.delete_records([db.CreationCondition("last_seen", datetime.datetime.now()-s.cull_objects_after, "<")])
-
-        await self.database.connection.execute("DELETE FROM visited_towns WHERE player IN (SELECT visited_towns.player FROM visited_towns LEFT JOIN players ON visited_towns.player=players.name WHERE players.name IS NULL) AND duration < 300;")
-        await self.database.connection.execute("DELETE FROM player_history WHERE player IN (SELECT player_history.player FROM player_history LEFT JOIN players ON player_history.player=players.name JOIN activity ON activity.object_name=player_history.player WHERE players.name IS NULL AND activity.duration < 1000);")
-        
-        # Abstract history tables, remove some old data which is not needed anymore
-        for object_type in ["player", "town", "nation", "object"]:
-            for threshold_time, days_of_6 in s.history_abstraction_thresholds:
-                await self.database.connection.execute(f"DELETE FROM {object_type}_history WHERE (julianday(date)-julianday('2021-10-29')) % 6 IN ({days_of_6}) AND date<?", (datetime.datetime.now()-threshold_time,))
-        
-
-        await self.flags_table.delete_records([db.CreationCondition("object_type", "nation"), db.CreationField.external_query(self.objects_table, "object_name", db.CreationCondition("type", "nation"), operator="NOT IN")])
+        """Take players, towns and nations Maintenance has culled from the database out of the world, merging ones which were renamed"""
+        self.database.use_writer()
 
         sent = 0
 
+        player_names = {r.attribute("name") for r in await self.players_table.get_records(attributes=["name"])}
         for player in self.world.players.copy():
-            if not await player.exists_in_db:
+            if player.name not in player_names:
                 self.world._remove_player(player.name)
+        town_names = {r.attribute("name") for r in await self.towns_table.get_records(attributes=["name"])}
         for town in self.world.towns.copy():
-            if not await town.exists_in_db:
+            if town.name not in town_names:
                 await self.bot.get_channel(s.alert_channel).send(f"Removed town {town.name}")
                 self.world._remove_town(town.name)
                 for t in self.world.towns:
@@ -466,9 +557,6 @@ class Client():
         
         if sent > 10:
             await self.bot.get_channel(s.alert_channel).send("... + more")
-
-        # Must be done after because accesssed in cull
-        await self.objects_table.delete_records([db.CreationCondition("last", datetime.datetime.now()-s.cull_objects_after, "<")])
     
     async def test(self):
 
@@ -477,14 +565,21 @@ class Client():
             await self.database.connection.execute(f"INSERT INTO town_history(town, date, nation, religion, culture, mayor, resident_count, resident_tax, bank, public, peaceful, area, duration, visited_players, current_name) SELECT town, DATE(date, '+{num} days'), nation, religion, culture, mayor, resident_count, resident_tax, bank, public, peaceful, area, duration, visited_players, current_name FROM town_history WHERE date <= ?", (datetime.date.today(),))
     
     async def backup_db_if_not(self):
-        epoch = datetime.date(2022, 1, 1)
-        td = datetime.date.today()
-        backup_name = f"backups/towny_{(td-epoch).days}_{td.year}_{td.month}_{td.day}.db"
-        if not os.path.exists(backup_name):
-            shutil.copyfile("towny.db", backup_name)
+        self.backups.backup_if_not()
+    
+    async def __merge_history(self, table_name : str, key : str, old_object_name : str, new_object_name : str):
+        # Each new record gets the old duration as it was on that date, then old records are moved over where the date isn't taken
+        await self.database.connection.execute(f"UPDATE {table_name} SET duration = duration + COALESCE((SELECT old.duration FROM {table_name} old WHERE old.{key}=? AND old.date<={table_name}.date ORDER BY old.date DESC LIMIT 1), 0) WHERE {key}=?", (old_object_name, new_object_name))
+        await self.database.connection.execute(f"DELETE FROM {table_name} WHERE {key}=? AND date IN (SELECT date FROM {table_name} WHERE {key}=?)", (old_object_name, new_object_name))
+        await self.database.connection.execute(f"UPDATE {table_name} SET {key}=? WHERE {key}=?", (new_object_name, old_object_name))
     
+    async def __merge_visited_towns(self, key : str, other : str, old_object_name : str, new_object_name : str):
+        await self.database.connection.execute(f"INSERT INTO visited_towns ({key}, {other}, duration, last) SELECT ?, {other}, duration, last FROM visited_towns WHERE {key}=? ON CONFLICT (player, town) DO UPDATE SET duration = duration + excluded.duration", (new_object_name, old_object_name))
+        await self.database.connection.execute(f"DELETE FROM visited_towns WHERE {key}=?", (old_object_name, ))
+
     async def merge_objects(self, object_type : str, old_object_name : str, new_object_name : str):
-        
+        self.database.use_writer()
+
         if object_type == "player":
             obj = self.world.get_player(new_object_name)
         elif object_type == "town":
@@ -495,113 +590,53 @@ class Client():
         if not obj:
             raise errors.MildError(f"{object_type.title()} not found")
 
-        # Merge system. Probably overcomplicated but it works 
+        # Callers hold refresh_lock. Chat counts are flushed before the savepoint so they're committed either way
+        await self.chat_counters.flush()
 
-        # Firstly merge activity. Same for all so can be reused
-        old_activity = await self.activity_table.get_record([db.CreationCondition("object_type", object_type), db.CreationCondition("object_name", old_object_name)], ["duration", "last"]) 
-        await self.activity_table.delete_records([db.CreationCondition("object_type", object_type), db.CreationCondition("object_name", old_object_name)]) 
-        in_new = self.activity_table.record_exists(*[db.CreationCondition("object_type", object_type), db.CreationCondition("object_name", obj.name)])
-        if in_new:
-            await self.activity_table.update_records([db.CreationCondition("object_type", object_type), db.CreationCondition("object_name", obj.name)], [object_type, obj.name, db.CreationField.add("duration", old_activity.attribute("duration")), db.CreationField("last", old_activity.attribute("last"))])
-        else:
-            await self.activity_table.add_record([object_type, obj.name, old_activity.attribute("total"), old_activity.attribute("last")])
+        # A savepoint so a failed merge leaves nothing half done. It joins the refresh's transaction if there is one
+        await self.database.connection.execute("SAVEPOINT merge_objects")
+        try:
+            await self.__merge_objects(object_type, old_object_name, obj.name)
+        except:
+            await self.database.connection.execute("ROLLBACK TO merge_objects")
+            await self.database.connection.execute("RELEASE merge_objects")
+            raise
+        await self.database.connection.execute("RELEASE merge_objects")
+
+    async def __merge_objects(self, object_type : str, old_object_name : str, new_object_name : str):
+        await self.database.connection.execute("INSERT INTO activity (object_type, object_name, duration, last) SELECT object_type, ?, duration, last FROM activity WHERE object_type=? AND object_name=? ON CONFLICT (object_type, object_name) DO UPDATE SET duration = duration + excluded.duration, last = MAX(last, excluded.last)", (new_object_name, object_type, old_object_name))
+        await self.database.connection.execute("DELETE FROM activity WHERE object_type=? AND object_name=?", (object_type, old_object_name))
+
+        await self.chat_counters.merge(object_type, old_object_name, new_object_name)
+        if object_type in ["town", "nation"]:
+            self.history_catalogue.remove_name(object_type, old_object_name)
+
+        # Flags: 1. Delete flags if already exist 2. Update old name
+        await self.flags_table.delete_records([db.CreationCondition("object_type", object_type), db.CreationCondition("object_name", new_object_name)]) 
+        await self.flags_table.update_records([db.CreationCondition("object_type", object_type), db.CreationCondition("object_name", old_object_name)], [db.CreationField(self.flags_table.attribute("object_name"), new_object_name)])
 
         if object_type == "player":
-            old_duration = (await self.player_history_table.get_record([db.CreationCondition("player", old_object_name)], [self.player_history_table.attribute("duration")], order=db.CreationOrder("date", db.types.OrderDescending))).attribute("duration")
-
-            await self.database.connection.execute("UPDATE chat_message_counts SET player=? WHERE player=?", (obj.name, old_object_name))
-            await self.database.connection.execute("UPDATE chat_mentions SET object_name=? WHERE object_name=? AND object_type='player'", (obj.name, old_object_name))
-
-            # Update flag table
-            await self.flags_table.delete_records([db.CreationCondition("object_type", "player"), db.CreationCondition("object_name", obj.name)]) 
-            await self.flags_table.update_records([db.CreationCondition("object_type", "player"), db.CreationCondition("object_name", old_object_name)], [db.CreationField(self.flags_table.attribute("object_name"), new_object_name)])
-
-            # Iterate over old history records. If not under new name, add it. Otherwise, remove old
-                # Add to new player records with old duration
-            for record in await self.player_history_table.get_records([db.CreationCondition("player", obj.name)], order=db.CreationOrder("date", db.types.OrderAscending)):
-                old_duration_at_point = await self.player_history_table.get_record([db.CreationCondition("player", old_object_name), db.CreationCondition("date", record.attribute("date"), "<=")], order=db.CreationOrder("date", db.types.OrderDescending))
-                #if old_duration_at_point: await record.update(db.CreationField.add("duration", old_duration_at_point.attribute("duration")))
-                if old_duration_at_point: await self.player_history_table.update_records([db.CreationCondition("player", obj.name), db.CreationCondition("date", record.attribute("date"))], [db.CreationField.add("duration", old_duration_at_point.attribute("duration"))])
-            # Iterate over old records. If exists for new player, remove
-            for record in await self.player_history_table.get_records([db.CreationCondition("player", old_object_name)], order=db.CreationOrder("date", db.types.OrderAscending)):
-                if not await self.player_history_table.record_exists(db.CreationCondition("player", obj.name), db.CreationCondition("date", record.attribute("date"))):
-                    await self.player_history_table.update_records([db.CreationCondition("player", old_object_name), db.CreationCondition("date", record.attribute("date"))], [db.CreationField("player", obj.name)]) 
-                else:
-                    await record.delete()
-            # if duplicates exist, merge data
-            for record in await self.visited_towns_table.get_records([db.CreationCondition("player", old_object_name)]):
-                rec = await self.visited_towns_table.get_record([db.CreationCondition("player", obj.name), db.CreationCondition("town", record.attribute("town"))])
-                if not rec:
-                    await record.update([db.CreationField("player", obj.name)]) 
-                else:
-                    dur = record.attribute("duration")
-                    await record.delete()
-                    await rec.update(db.CreationField.add("duration", dur))
-
-            await self.players_table.update_records([db.CreationCondition("name", obj.name)], [db.CreationField.add("duration", old_duration)])
+            await self.database.connection.execute("UPDATE players SET duration = duration + COALESCE((SELECT duration FROM player_history WHERE player=? ORDER BY date DESC LIMIT 1), 0) WHERE name=?", (old_object_name, new_object_name))
+            await self.__merge_history("player_history", "player", old_object_name, new_object_name)
+            await self.__merge_visited_towns("player", "town", old_object_name, new_object_name)
 
             await self.players_table.delete_records([db.CreationCondition("name", old_object_name)])
 
-            await self.town_history_table.update_records([db.CreationCondition("mayor", old_object_name)], db.CreationField("mayor", obj.name))
-            await self.nation_history_table.update_records([db.CreationCondition("leader", old_object_name)], db.CreationField("leader", obj.name))
+            await self.town_history_table.update_records([db.CreationCondition("mayor", old_object_name)], db.CreationField("mayor", new_object_name))
+            await self.nation_history_table.update_records([db.CreationCondition("leader", old_object_name)], db.CreationField("leader", new_object_name))
         elif object_type == "town":
-            old_duration = (await self.town_history_table.get_record([db.CreationCondition("town", old_object_name)], [self.town_history_table.attribute("duration")], order=db.CreationOrder("date", db.types.OrderDescending))).attribute("duration")
-
-            await self.database.connection.execute("UPDATE chat_mentions SET object_name=? WHERE object_name=? AND object_type='town'", (obj.name, old_object_name))
-
-            # Update flag table
-            await self.flags_table.delete_records([db.CreationCondition("object_type", "town"), db.CreationCondition("object_name", obj.name)]) 
-            await self.flags_table.update_records([db.CreationCondition("object_type", "town"), db.CreationCondition("object_name", old_object_name)], [db.CreationField(self.flags_table.attribute("object_name"), new_object_name)])
-
-            # Iterate over old history records. If not under new name, add it. Otherwise, remove old
-            for record in await self.town_history_table.get_records([db.CreationCondition("town", obj.name)], order=db.CreationOrder("date", db.types.OrderAscending)):
-                old_duration_at_point = await self.town_history_table.get_record([db.CreationCondition("town", old_object_name), db.CreationCondition("date", record.attribute("date"), "<=")], order=db.CreationOrder("date", db.types.OrderDescending))
-                #if old_duration_at_point: await record.update(db.CreationField.add("duration", old_duration_at_point.attribute("duration")))
-                if old_duration_at_point: await self.town_history_table.update_records([db.CreationCondition("town", obj.name), db.CreationCondition("date", record.attribute("date"))], [db.CreationField.add("duration", old_duration_at_point.attribute("duration"))])
-                # Iterate over old records. If exists for new town, remove
-            for record in await self.town_history_table.get_records([db.CreationCondition("town", old_object_name)]):
-                if not await self.town_history_table.record_exists(db.CreationCondition("town", obj.name), db.CreationCondition("date", record.attribute("date"))):
-                    await self.town_history_table.update_records([db.CreationCondition("town", old_object_name), db.CreationCondition("date", record.attribute("date"))], [db.CreationField("town", obj.name)]) 
-                else:
-                    await record.delete()
-            
-            # If duplicate exists, merge data
-            for record in await self.visited_towns_table.get_records([db.CreationCondition("town", old_object_name)]):
-                rec = await self.visited_towns_table.get_record([db.CreationCondition("town", obj.name), db.CreationCondition("player", record.attribute("player"))])
-                if not rec:
-                    await record.update([db.CreationField("town", obj.name)]) 
-                else:
-                    dur = record.attribute("duration")
-                    await record.delete()
-                    await rec.update(db.CreationField.add("duration", dur))
+            await self.__merge_history("town_history", "town", old_object_name, new_object_name)
+            await self.__merge_visited_towns("town", "player", old_object_name, new_object_name)
             
-            # Update main record
             await self.towns_table.delete_records([db.CreationCondition("name", old_object_name)])
 
-            await self.nation_history_table.update_records([db.CreationCondition("capital", old_object_name)], db.CreationField("capital", obj.name))
-            await self.player_history_table.update_records([db.CreationCondition("likely_town", old_object_name)], db.CreationField("likely_town", obj.name))
+            await self.nation_history_table.update_records([db.CreationCondition("capital", old_object_name)], db.CreationField("capital", new_object_name))
+            await self.player_history_table.update_records([db.CreationCondition("likely_town", old_object_name)], db.CreationField("likely_town", new_object_name))
         elif object_type == "nation":
-
-            await self.database.connection.execute("UPDATE chat_mentions SET object_name=? WHERE object_name=? AND object_type='nation'", (obj.name, old_object_name))
-
-            # Update flags: 1. Delete flags if already exist 2. Update old name
-            await self.flags_table.delete_records([db.CreationCondition("object_type", "nation"), db.CreationCondition("object_name", obj.name)]) 
-            await self.flags_table.update_records([db.CreationCondition("object_type", "nation"), db.CreationCondition("object_name", old_object_name)], [db.CreationField(self.flags_table.attribute("object_name"), new_object_name)])
-            
-            # Iterate over old history records. If not under new name, add it. Otherwise, remove old
-            for record in await self.nation_history_table.get_records([db.CreationCondition("nation", obj.name)], order=db.CreationOrder("date", db.types.OrderAscending)):
-                old_duration_at_point = await self.nation_history_table.get_record([db.CreationCondition("nation", old_object_name), db.CreationCondition("date", record.attribute("date"), "<=")], order=db.CreationOrder("date", db.types.OrderDescending))
-                #await record.update(db.CreationField.add("duration", old_duration_at_point.attribute("duration")))
-                if old_duration_at_point: await self.nation_history_table.update_records([db.CreationCondition("nation", obj.name), db.CreationCondition("date", record.attribute("date"))], [db.CreationField.add("duration", old_duration_at_point.attribute("duration"))])
-            # Iterate over old records. If exists for new nation, remove
-            for record in await self.nation_history_table.get_records([db.CreationCondition("nation", old_object_name)]):
-                if not await self.nation_history_table.record_exists(db.CreationCondition("nation", obj.name), db.CreationCondition("date", record.attribute("date"))):
-                    await self.nation_history_table.update_records([db.CreationCondition("nation", old_object_name), db.CreationCondition("date", record.attribute("date"))], [db.CreationField("nation", obj.name)]) 
-                else:
-                    await record.delete()
+            await self.__merge_history("nation_history", "nation", old_object_name, new_object_name)
             
-            await self.town_history_table.update_records([db.CreationCondition("nation", old_object_name)], db.CreationField("nation", obj.name))
-            await self.player_history_table.update_records([db.CreationCondition("likely_nation", old_object_name)], db.CreationField("likely_nation", obj.name))
+            await self.town_history_table.update_records([db.CreationCondition("nation", old_object_name)], db.CreationField("nation", new_object_name))
+            await self.player_history_table.update_records([db.CreationCondition("likely_nation", old_object_name)], db.CreationField("likely_nation", new_object_name))
 
     
 
@@ -0,0 +1,72 @@
+from __future__ import annotations
+import typing
+if typing.TYPE_CHECKING:
+    import client as client_pre
+
+import db
+
+class Aggregates():
+    """Per refresh totals from activity, visited_towns and chat tables, so tracking writes don't run a subquery for every row"""
+    def __init__(self, client : client_pre.Client):
+        self.client = client
+
+        self.activity : dict[tuple[str, str], int] = {}
+        self.visited : set[tuple[str, str]] = set()
+        self.visited_towns : dict[str, int] = {}
+        self.visited_players : dict[str, int] = {}
+        self.mentions : dict[tuple[str, str], int] = {}
+        self.messages : dict[str, int] = {}
+        self.likely_towns : dict[str, tuple[str, int]] = {} # player: (town visited longest, its resident count)
+        self.likely_residents : dict[str, list[str]] = {} # town: [player]
+
+    async def refresh(self):
+        rs = await self.client.activity_table.get_records(attributes=["object_type", "object_name", "SUM(duration)"], group=["object_type", "object_name"])
+        self.activity = {(r.fields[0].value, r.fields[1].value):r.fields[2].value for r in rs}
+
+        rs = await self.client.visited_towns_table.get_records(attributes=["player", "town"], group=["player", "town"])
+        self.visited = set()
+        self.visited_towns = {}
+        self.visited_players = {}
+        for r in rs:
+            self.__add_visit(r.attribute("player"), r.attribute("town"))
+
+        # Bare columns in a MAX() group come from the row with the max, so this is each player's longest visited town that still exists
+        rs = await self.client.visited_towns_table.get_records(
+            attributes=["visited_towns.player", "visited_towns.town", "towns.resident_count", "MAX(visited_towns.duration)"], 
+            group=["visited_towns.player"], 
+            join=db.CreationTableJoin(self.client.towns_table, "visited_towns.town", "towns.name")
+        )
+        self.likely_towns = {}
+        self.likely_residents = {}
+        for r in rs:
+            self.likely_towns[r.fields[0].value] = (r.fields[1].value, r.fields[2].value)
+            self.likely_residents.setdefault(r.fields[1].value, []).append(r.fields[0].value)
+
+        rs = await self.client.chat_mentions_table.get_records(attributes=["object_type", "object_name", "SUM(amount)"], group=["object_type", "object_name"])
+        self.mentions = {(r.fields[0].value, r.fields[1].value):r.fields[2].value for r in rs}
+
+        rs = await self.client.chat_message_counts_table.get_records(attributes=["player", "SUM(amount)"], group=["player"])
+        self.messages = {r.fields[0].value:r.fields[1].value for r in rs}
+
+    def __add_visit(self, player_name : str, town_name : str):
+        self.visited.add((player_name, town_name))
+        self.visited_towns[player_name] = self.visited_towns.get(player_name, 0) + 1
+        self.visited_players[town_name] = self.visited_players.get(town_name, 0) + 1
+
+    # Keep totals in line with what the refresh writes
+    def add_activity(self, object_type : str, object_name : str, amount : int):
+        key = (object_type, object_name)
+        self.activity[key] = self.activity[key] + amount if key in self.activity else 0
+
+    def add_visit(self, player_name : str, town_name : str):
+        if (player_name, town_name) not in self.visited:
+            self.__add_visit(player_name, town_name)
+
+    def get_activity(self, object_type : str, object_name : str) -> int:
+        return self.activity.get((object_type, object_name)) or 0
+
+    def get_mentions(self, object_type : str, object_name : str) -> int:
+        return self.mentions.get((object_type, object_name)) or 0
+
+    def get_messages(self, player_name : str) -> int:
+        return self.messages.get(player_name) or 0
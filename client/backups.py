@@ -0,0 +1,96 @@
+from __future__ import annotations
+import typing
+if typing.TYPE_CHECKING:
+    import client as client_pre
+
+import asyncio
+import datetime
+import gzip
+import os
+import re
+import shutil
+import sqlite3
+import traceback
+
+import setup as s
+
+EPOCH = datetime.date(2022, 1, 1)
+BACKUP_NAME = re.compile(r"^towny_\d+_(\d+)_(\d+)_(\d+)\.db(\.gz)?$")
+
+class Backups():
+    """Daily compressed backups of the database, made in a thread from a consistent snapshot so the refresh isn't held up"""
+    def __init__(self, client : client_pre.Client, database_path : str, folder : str):
+        self.client = client
+        self.database_path = database_path
+        self.folder = folder
+
+        self.__task : asyncio.Task = None
+
+    def backup_path(self, date : datetime.date) -> str:
+        return os.path.join(self.folder, f"towny_{(date-EPOCH).days}_{date.year}_{date.month}_{date.day}.db")
+
+    def backup_if_not(self):
+        """Start today's backup in the background if it hasn't been made"""
+        if self.__task and not self.__task.done():
+            return
+
+        path = self.backup_path(datetime.date.today())
+        if os.path.exists(path) or os.path.exists(path + ".gz"):
+            return
+
+        self.__task = asyncio.get_running_loop().create_task(self.__run(path))
+
+    async def __run(self, path : str):
+        try:
+            await asyncio.to_thread(self._backup, path)
+            await asyncio.to_thread(self._apply_retention, datetime.date.today())
+        except Exception as e:
+            await self.client.bot.get_channel(s.alert_channel).send(f"Backup error: \n```{e}``` {traceback.format_exc()}"[:2000])
+
+    def _backup(self, path : str):
+        os.makedirs(self.folder, exist_ok=True)
+
+        # Copied in one step, so it's one consistent snapshot (including the WAL). Copying in steps would restart
+        # whenever the writer commits. In WAL mode the read doesn't block the writer
+        source = sqlite3.connect(f"file:{self.database_path}?mode=ro", uri=True)
+        destination = sqlite3.connect(path + ".tmp")
+        try:
+            source.backup(destination, pages=-1)
+        finally:
+            destination.close()
+            source.close()
+
+        with open(path + ".tmp", "rb") as f, gzip.open(path + ".gz.tmp", "wb") as g:
+            shutil.copyfileobj(f, g, 1024*1024)
+        os.replace(path + ".gz.tmp", path + ".gz")
+        os.remove(path + ".tmp")
+
+    def _apply_retention(self, today : datetime.date):
+        """Keep every backup from the last few days, then the newest of each week and each month before those days"""
+        backups : dict[datetime.date, list[str]] = {}
+        for filename in os.listdir(self.folder):
+            match = BACKUP_NAME.match(filename)
+            if match:
+                date = datetime.date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+                backups.setdefault(date, []).append(filename)
+
+        keep = set()
+        weeks, months = set(), set()
+        for date in sorted(backups, reverse=True):
+            age = (today - date).days
+            week = date.isocalendar()[:2]
+            month = (date.year, date.month)
+            if age < s.backup_keep_daily: # Weeks and months are only counted from after these, so they don't use any up
+                keep.add(date)
+                continue
+            if week not in weeks and len(weeks) < s.backup_keep_weekly:
+                keep.add(date)
+            elif month not in months and len(months) < s.backup_keep_monthly:
+                keep.add(date)
+            weeks.add(week)
+            months.add(month)
+
+        for date, filenames in backups.items():
+            if date not in keep:
+                for filename in filenames:
+                    os.remove(os.path.join(self.folder, filename))
@@ -0,0 +1,133 @@
+from __future__ import annotations
+import typing
+if typing.TYPE_CHECKING:
+    import client as client_pre
+
+import datetime
+import json
+import os
+
+import db
+import setup as s
+
+class ChatCounters():
+    """Chat message and mention increments, written as one upsert per table.
+    Increments are journaled until the refresh commit holding them goes through, so a crash doesn't lose them"""
+    def __init__(self, client : client_pre.Client, journal_path : str):
+        self.client = client
+        self.journal_path = journal_path
+
+        self.messages : dict[str, list] = {} # player: [amount, last]
+        self.mentions : dict[tuple[str, str], list] = {} # (object_type, object_name): [amount, last]
+        self.last_flushed = datetime.datetime.now()
+
+        self.__journal_buffer : list[str] = []
+        self.__unconfirmed : list[tuple[dict, dict]] = [] # Flushed, but not committed yet
+
+    @property
+    def size(self) -> int:
+        return len(self.messages) + len(self.mentions)
+
+    @property
+    def due(self) -> bool:
+        return self.size >= s.chat_flush_threshold or datetime.datetime.now() - self.last_flushed >= s.chat_flush_period
+
+    @property
+    def unconfirmed_batches(self) -> int:
+        return len(self.__unconfirmed)
+
+    def __add(self, counts : dict, key, amount : int, last : datetime.datetime):
+        if key in counts:
+            counts[key][0] += amount
+            counts[key][1] = max(counts[key][1], last)
+        else:
+            counts[key] = [amount, last]
+
+    def add_message(self, player_name : str, time : datetime.datetime, amount : int = 1):
+        self.__add(self.messages, player_name, amount, time)
+        self.__journal_buffer.append(json.dumps(["message", player_name, amount, time.isoformat()]))
+
+    def add_mention(self, object_type : str, object_name : str, time : datetime.datetime, amount : int = 1):
+        self.__add(self.mentions, (object_type, object_name), amount, time)
+        self.__journal_buffer.append(json.dumps(["mention", object_type, object_name, amount, time.isoformat()]))
+
+    def write_journal(self):
+        if len(self.__journal_buffer) == 0:
+            return
+        with open(self.journal_path, "a") as f:
+            f.write("\n".join(self.__journal_buffer) + "\n")
+        self.__journal_buffer = []
+
+    def load_journal(self):
+        """Put back increments that weren't committed before the last shutdown"""
+        if not os.path.exists(self.journal_path):
+            return
+
+        with open(self.journal_path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError: # Cut off mid write
+                    continue
+                if entry[0] == "message":
+                    self.__add(self.messages, entry[1], entry[2], datetime.datetime.fromisoformat(entry[3]))
+                elif entry[0] == "mention":
+                    self.__add(self.mentions, (entry[1], entry[2]), entry[3], datetime.datetime.fromisoformat(entry[4]))
+
+    def __rewrite_journal(self):
+        lines = []
+        for messages, mentions in self.__unconfirmed + [(self.messages, self.mentions)]:
+            for player_name, (amount, last) in messages.items():
+                lines.append(json.dumps(["message", player_name, amount, last.isoformat()]))
+            for (object_type, object_name), (amount, last) in mentions.items():
+                lines.append(json.dumps(["mention", object_type, object_name, amount, last.isoformat()]))
+
+        with open(self.journal_path + ".tmp", "w") as f:
+            f.write("".join(line + "\n" for line in lines))
+        os.replace(self.journal_path + ".tmp", self.journal_path)
+        self.__journal_buffer = []
+
+    async def flush(self):
+        self.last_flushed = datetime.datetime.now()
+        if self.size == 0:
+            return
+
+        messages, mentions = self.messages, self.mentions
+        self.messages, self.mentions = {}, {}
+
+        try:
+            await self.client.chat_message_counts_table.upsert_records(
+                [[player_name, amount, last] for player_name, (amount, last) in messages.items()],
+                ["player"],
+                [db.CreationField.add("amount", "excluded.amount"), "last"]
+            )
+            await self.client.chat_mentions_table.upsert_records(
+                [[object_type, object_name, amount, last] for (object_type, object_name), (amount, last) in mentions.items()],
+                ["object_type", "object_name"],
+                [db.CreationField.add("amount", "excluded.amount"), "last"]
+            )
+        except:
+            # Keep them for the next flush. They're still in the journal
+            for player_name, (amount, last) in messages.items():
+                self.__add(self.messages, player_name, amount, last)
+            for key, (amount, last) in mentions.items():
+                self.__add(self.mentions, key, amount, last)
+            raise
+
+        self.__unconfirmed.append((messages, mentions))
+
+    def committed(self, batches : int):
+        """batches: unconfirmed_batches from before the commit started. Anything flushed since is in the next transaction"""
+        if batches == 0:
+            return
+        del self.__unconfirmed[:batches]
+        self.__rewrite_journal()
+
+    async def merge(self, object_type : str, old_object_name : str, new_object_name : str):
+        """Add counts under the old name onto the new name. Flush first, outside any savepoint the merge is in,
+        so a rolled back merge can't take flushed increments with it"""
+        if object_type == "player":
+            await self.client.database.connection.execute("INSERT INTO chat_message_counts (player, amount, last) SELECT ?, amount, last FROM chat_message_counts WHERE player=? ON CONFLICT (player) DO UPDATE SET amount = amount + excluded.amount, last = MAX(last, excluded.last)", (new_object_name, old_object_name))
+            await self.client.database.connection.execute("DELETE FROM chat_message_counts WHERE player=?", (old_object_name, ))
+        await self.client.database.connection.execute("INSERT INTO chat_mentions (object_type, object_name, amount, last) SELECT object_type, ?, amount, last FROM chat_mentions WHERE object_type=? AND object_name=? ON CONFLICT (object_type, object_name) DO UPDATE SET amount = amount + excluded.amount, last = MAX(last, excluded.last)", (new_object_name, object_type, old_object_name))
+        await self.client.database.connection.execute("DELETE FROM chat_mentions WHERE object_type=? AND object_name=?", (object_type, old_object_name))
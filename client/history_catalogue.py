@@ -0,0 +1,73 @@
+from __future__ import annotations
+import typing
+if typing.TYPE_CHECKING:
+    import client as client_pre
+
+import datetime
+
+import db
+import setup as s
+from client.search import SearchIndex
+
+class HistoryCatalogue():
+    """Dates and names in the history tables, for autocompletes. Each is loaded the first time it's needed, then kept up to date by the refresh"""
+    def __init__(self, client : client_pre.Client):
+        self.client = client
+
+        self.__dates : dict[str, list[tuple[datetime.date, str]]] = {} # object_type: [(date, formatted)] ascending
+        self.__names : dict[str, SearchIndex] = {} # object_type: every name with history
+        self.__stale_dates : set[str] = set()
+
+    async def dates(self, object_type : str) -> list[tuple[datetime.date, str]]:
+        if object_type not in self.__dates:
+            table = await self.client.database.get_table(f"{object_type}_history")
+            rs = await table.get_records(attributes=["date"], group=["date"], order=db.CreationOrder("date", db.types.OrderAscending))
+            self.__dates[object_type] = [(r.attribute("date"), r.attribute("date").strftime(s.DATE_STRFTIME)) for r in rs]
+        return self.__dates[object_type]
+
+    def add_date(self, object_type : str, date : datetime.date):
+        dates = self.__dates.get(object_type)
+        if dates is not None and (len(dates) == 0 or dates[-1][0] < date):
+            dates.append((date, date.strftime(s.DATE_STRFTIME)))
+
+    def forget_dates(self, object_type : str):
+        """Dates have been deleted. Reloaded once the deletion is committed, so readers don't load the old dates again"""
+        self.__stale_dates.add(object_type)
+
+    def committed(self):
+        for object_type in self.__stale_dates:
+            self.__dates.pop(object_type, None)
+        self.__stale_dates = set()
+
+    async def search_dates(self, object_type : str, query : str, max : int = 25) -> list[str]:
+        query = query.lower()
+        results = []
+        for _, formatted in await self.dates(object_type):
+            if query in formatted.lower():
+                results.append(formatted)
+                if len(results) >= max:
+                    break
+        return results
+
+    async def names(self, object_type : str) -> SearchIndex:
+        if object_type not in self.__names:
+            table = await self.client.database.get_table(f"{object_type}_history")
+            index = SearchIndex()
+            for r in await table.get_records(attributes=[object_type], group=[object_type]):
+                index.add(r.attribute(object_type), r.attribute(object_type))
+            self.__names[object_type] = index
+        return self.__names[object_type]
+
+    def add_name(self, object_type : str, name : str):
+        index = self.__names.get(object_type)
+        if index is not None and index.get(name) is None:
+            index.add(name, name)
+
+    def remove_name(self, object_type : str, name : str):
+        index = self.__names.get(object_type)
+        if index is not None:
+            index.remove(name)
+
+    async def search_deleted(self, object_type : str, query : str, live : SearchIndex, max : int = 25) -> list[str]:
+        """Names in history which aren't in live"""
+        return (await self.names(object_type)).search(query, max, lambda name: live.get(name) is None)
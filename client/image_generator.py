@@ -9,9 +9,17 @@ import client.object
 
 import io
 import os
+import hashlib
+import collections
 import itertools 
 import math
 import datetime
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
 
 import matplotlib
 import matplotlib.pyplot as plt
@@ -32,12 +40,116 @@ import warnings
 warnings.filterwarnings("ignore")
 
 CACHE_SPLIT_STRING = "_+_"
+CACHE_FOLDER = "./cache"
+
+class CacheEntry():
+    __slots__ = ("key", "extra", "path", "size")
+
+    def __init__(self, key : str, extra : str, path : str, size : int):
+        self.key = key
+        self.extra = extra
+        self.path = path
+        self.size = size
+
+class ImageCache():
+    """
+    In memory index of the renders in CACHE_FOLDER, one per name, least recently used first.
+    Files are named {name}_+_{key}_+_{extra}.png, where the key is a hash of everything drawn
+    """
+    def __init__(self, folder : str, budget : int):
+        self.folder = folder
+        self.budget = budget
+
+        self.__entries : collections.OrderedDict[str, CacheEntry] = None
+        self.__size = 0
+        self.__saving : set[str] = set()
+
+    def __load(self):
+        if self.__entries is not None:
+            return
+        self.__entries = collections.OrderedDict()
+        os.makedirs(self.folder, exist_ok=True)
+
+        files = []
+        for filename in os.listdir(self.folder):
+            path = os.path.join(self.folder, filename)
+            if filename.startswith(".") or not os.path.isfile(path) or not filename.endswith((".png", ".tmp")): # eg. .gitkeep
+                continue
+            parts = filename[:-len(".png")].split(CACHE_SPLIT_STRING)
+            if filename.endswith(".tmp") or len(parts) != 3: # Unfinished writes and the old naming scheme
+                os.remove(path)
+                continue
+            stat = os.stat(path)
+            files.append((stat.st_mtime, parts, path, stat.st_size))
+        
+        for _, (name, key, extra), path, size in sorted(files):
+            self.__add(name, CacheEntry(key, extra, path, size))
+        self.__evict()
+    
+    def __add(self, name : str, entry : CacheEntry) -> typing.Optional[CacheEntry]:
+        old = self.__entries.pop(name, None)
+        if old:
+            self.__size -= old.size
+            if old.path == entry.path:
+                old = None
+        self.__entries[name] = entry
+        self.__size += entry.size
+        return old
+    
+    def __evict(self) -> list[str]:
+        """Least recently used entries over the budget. Never the newest"""
+        removed = []
+        while self.__size > self.budget and len(self.__entries) > 1:
+            _, entry = self.__entries.popitem(last=False)
+            self.__size -= entry.size
+            removed.append(entry.path)
+        return removed
+
+    def get(self, name : str, key : str) -> typing.Optional[CacheEntry]:
+        self.__load()
+        entry = self.__entries.get(name)
+        if not entry or entry.key != key:
+            return None
+        self.__entries.move_to_end(name)
+        return entry
+
+    async def put(self, name : str, key : str, extra : str, data : bytes):
+        self.__load()
+        if name in self.__saving:
+            return
+        self.__saving.add(name)
+        try:
+            path = os.path.join(self.folder, f"{name}{CACHE_SPLIT_STRING}{key}{CACHE_SPLIT_STRING}{extra}.png")
+            await asyncio.to_thread(self.__write, path, data)
+
+            old = self.__add(name, CacheEntry(key, extra, path, len(data)))
+            removed = ([old.path] if old else []) + self.__evict()
+            if len(removed) > 0:
+                await asyncio.to_thread(self.__remove, removed)
+        finally:
+            self.__saving.discard(name)
+    
+    @staticmethod
+    def __write(path : str, data : bytes):
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+    
+    @staticmethod
+    def __remove(paths : list[str]):
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
 
 class CacheItem():
-    def __init__(self, name : str, id : str, extra : str = None):
+    def __init__(self, cache : ImageCache, name : str, id : str, extra : str = None, profile : str = "full"):
 
         self.checked = False
+        self.profile = profile
 
+        self.cache = cache
         self.name = name 
         self.id = id 
         self.extra = extra 
@@ -45,40 +157,161 @@ class CacheItem():
         self.valid : bool = None
         self.path : str = None
         """
-        Cache file names have three parts:
-        1. Name - A name of the object. Only one cache should exist for each name
-        2. ID - Something to identify the cache and compare to see if it needs to be updated
+        1. Name - A name of the object. Only one cache exists for each name
+        2. ID - Hash of the geometry and render parameters. A different ID means the cache needs to be updated
         3. Extra - Extra data which is used
-
-        These are split by "_+_"
         """
     
+    def add_parameters(self, *parameters):
+        """Mix anything else which changes the image into the ID"""
+        self.id = hashlib.blake2b(repr((self.id, ) + parameters).encode(), digest_size=16).hexdigest()
+        self.checked = False
+        return self
+    
     def check_cache(self):
         self.checked = True
-        cache_files = [file_name for file_name in os.listdir('./cache') if file_name.endswith(".png")]
-    
-        for fname in cache_files:
-            path = f"./cache/{fname}"
-
-            if fname.startswith(f"{self.name}{CACHE_SPLIT_STRING}{self.id}") and "png" in fname:
-                self.extra = fname.replace(f"{self.name}{CACHE_SPLIT_STRING}{self.id}", "").replace(".png", "").replace(CACHE_SPLIT_STRING, "")
-                self.valid = True
-                self.path = path
-            elif self.name in fname:
-                os.remove(path)
+        entry = self.cache.get(self.name, self.id)
+        self.valid = entry is not None
+        if entry:
+            self.extra = entry.extra
+            self.path = entry.path
         
         return self
     
     async def save(self, buf):
-        with open(f"./cache/{self.name}{CACHE_SPLIT_STRING}{self.id}{CACHE_SPLIT_STRING}{self.extra}.png", "wb") as f:
-            f.write(buf.getbuffer())
+        await self.cache.put(self.name, self.id, self.extra, buf.getvalue())
+
+
+MAP_WIDTH, MAP_HEIGHT = 36864, 18400
+
+class RenderJob():
+    """
+    Picklable description of an image. Each step is the name of a drawing function below and its arguments.
+    Steps are run in order in a render worker, which has its own pyplot state
+    """
+    def __init__(self, dpi : int = None):
+        self.steps : list[tuple[str, dict]] = []
+        self.dpi = dpi
+    
+    def add(self, step : str, **kwargs):
+        self.steps.append((step, kwargs))
+        return self
+
+def _area_spec(area : client_pre.object.Area) -> dict:
+    x, y = area.polygon.exterior.xy
+    return {"x":list(x), "y":list(y), "fill_color":area.fill_color, "border_color":area.border_color}
+
+def _to_seconds(values : list) -> np.ndarray:
+    """Dates and datetimes as seconds since the epoch (in their own timezone), timedeltas as seconds. None is NaN"""
+    sample = next((v for v in values if v is not None), None)
+    if isinstance(sample, datetime.date): # Also datetimes
+        return (np.array(values, dtype="datetime64[us]") - np.datetime64(0, "us")) / np.timedelta64(1, "s")
+    if isinstance(sample, datetime.timedelta):
+        return np.array(values, dtype="timedelta64[us]") / np.timedelta64(1, "s")
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+class EarthTiles():
+    """
+    The whole earth's towns as a grid of transparent raster tiles, s.earth_tile_columns across.
+    Only tiles under towns whose geometry or colour changed are drawn again
+    """
+    def __init__(self, image_generator : ImageGenerator):
+        self.image_generator = image_generator
+
+        self.size = s.earth_tile_size
+        self.columns, self.rows = s.earth_tile_columns, s.earth_tile_columns//2
+        self.tile_width, self.tile_height = MAP_WIDTH*2/self.columns, MAP_HEIGHT*2/self.rows
+        
+        self.canvas : np.ndarray = None # RGBA bytes, first row is the north
+        self.__towns : dict[str, tuple[str, set[tuple[int, int]]]] = {} # name: (geometry hash, tiles it's drawn on)
+        self.__png : bytes = None
+        self.__background : Image.Image = None
+        self.__lock = asyncio.Lock()
+    
+    @property 
+    def ready(self) -> bool:
+        return self.canvas is not None
+    
+    def __tiles_of(self, bounds : tuple[float]) -> set[tuple[int, int]]:
+        # A couple of pixels either side for the border line
+        margin_x, margin_z = 2*self.tile_width/self.size, 2*self.tile_height/self.size
+        min_x, min_z, max_x, max_z = bounds
+        columns = range(max(int((min_x-margin_x+MAP_WIDTH)//self.tile_width), 0), min(int((max_x+margin_x+MAP_WIDTH)//self.tile_width), self.columns-1)+1)
+        rows = range(max(int((min_z-margin_z+MAP_HEIGHT)//self.tile_height), 0), min(int((max_z+margin_z+MAP_HEIGHT)//self.tile_height), self.rows-1)+1)
+        return {(column, row) for column in columns for row in rows}
+    
+    def __extent(self, tile : tuple[int, int]) -> tuple[float]:
+        column, row = tile
+        x = column*self.tile_width-MAP_WIDTH
+        z = row*self.tile_height-MAP_HEIGHT
+        return (x, x+self.tile_width, z, z+self.tile_height)
+
+    async def update(self, towns : list[client_pre.object.Town]):
+        async with self.__lock:
+            current = {town.name:town for town in towns}
+
+            dirty = set()
+            for name, (geometry_hash, tiles) in list(self.__towns.items()):
+                town = current.get(name)
+                if not town or town._geometry_hash != geometry_hash:
+                    dirty |= tiles
+                    del self.__towns[name]
+            for name, town in current.items():
+                if name not in self.__towns:
+                    tiles = self.__tiles_of(town.locations.bounds) if len(town.areas) > 0 else set()
+                    self.__towns[name] = (town._geometry_hash, tiles)
+                    dirty |= tiles
+            
+            if self.canvas is None:
+                self.canvas = np.zeros((self.rows*self.size, self.columns*self.size, 4), dtype=np.uint8)
+                dirty = {(column, row) for column in range(self.columns) for row in range(self.rows)}
+            if len(dirty) == 0:
+                return
+            
+            tile_towns : dict[tuple[int, int], list[str]] = {}
+            for name, (_, tiles) in self.__towns.items():
+                for tile in tiles & dirty:
+                    tile_towns.setdefault(tile, []).append(name)
+            
+            jobs = [(tile, self.__extent(tile), [_area_spec(area) for name in tile_towns.get(tile, []) for area in current[name].areas]) for tile in sorted(dirty)]
+            chunks = [jobs[i::s.render_workers] for i in range(s.render_workers)]
+            loop = asyncio.get_running_loop()
+            results = await asyncio.gather(*[
+                loop.run_in_executor(self.image_generator.executor, _render_tiles, [job[1:] for job in chunk], self.size, s.IMAGE_DPI_DRAWING_BIG) 
+                for chunk in chunks if len(chunk) > 0
+            ])
+
+            for chunk, pixels in zip([chunk for chunk in chunks if len(chunk) > 0], results):
+                for ((column, row), _, _), tile_pixels in zip(chunk, pixels):
+                    self.canvas[row*self.size:(row+1)*self.size, column*self.size:(column+1)*self.size] = tile_pixels
+            self.__png = None
+
+    def __render_png(self) -> bytes:
+        towns = Image.fromarray(self.canvas)
+
+        if not self.__background or self.__background.size != towns.size:
+            self.__background = Image.open(s.earth_bg_path_whole).convert("RGBA").resize(towns.size, Image.LANCZOS)
+        
+        buf = io.BytesIO()
+        Image.alpha_composite(self.__background, towns).save(buf, "PNG")
+        return buf.getvalue()
 
+    async def png(self) -> bytes:
+        """The earth background with every town, composited from the tiles"""
+        async with self.__lock:
+            if not self.__png:
+                self.__png = await asyncio.to_thread(self.__render_png)
+            return self.__png
 
 class ImageGenerator():
     def __init__(self, client : client_pre.Client):
         self.client = client 
 
-        self.map_width, self.map_height = 36864, 18400
+        self.map_width, self.map_height = MAP_WIDTH, MAP_HEIGHT
+
+        self.__executor : ProcessPoolExecutor = None
+        self.cache = ImageCache(CACHE_FOLDER, s.image_cache_budget)
+        self.earth_tiles = EarthTiles(self)
     
     class Vertex():
         def __init__(self, x : typing.Union[datetime.datetime, int], y : float):
@@ -107,40 +340,37 @@ class ImageGenerator():
             return f"<Vertex {self.x} {self.y}>"
         
     class Line():
-        def __init__(self, points : list[ImageGenerator.Vertex], name : str = None, remove_none = True):
-            self.raw_points = [p for p in points if p.y != None] if remove_none else points
+        """Points as sorted float64 arrays. x is in seconds for dates, datetimes and timedeltas.
+        Takes either Vertex points or x and y columns straight from records"""
+        def __init__(self, points : list[ImageGenerator.Vertex] = None, name : str = None, remove_none = True, x : typing.Sequence = None, y : typing.Sequence = None):
+            if points is not None:
+                x, y = [p.x for p in points], [p.y for p in points]
+            x, y = list(x) if x is not None else [], list(y) if y is not None else []
             self.name = name
-        
-        @property 
-        def min_max_x(self):
-            return min(self.raw_points, key=lambda k: k.x), max(self.raw_points, key=lambda k: k.x)
-        
-        @property 
-        def sorted_points(self):
-            return sorted(self.raw_points, key=lambda p: p.x)
 
-        @property 
-        def abstracted_points(self):
-            return self.sorted_points
-        
-        def decode_points(self, line_graph : client_pre.image_generator.ImageGenerator.LineGraph):
-            
-            abstracted = self.abstracted_points
+            xs, ys = _to_seconds(x), _to_seconds(y)
+            rows = np.flatnonzero(~np.isnan(ys)) if remove_none else np.arange(len(ys))
+            rows = rows[np.argsort(xs[rows], kind="stable")]
 
-            points = []
-            for i, point in enumerate(abstracted):
-                points.append(point.make_relative(line_graph.min_max_x[0]))
-            
-            return points
+            self.x, self.y = xs[rows], ys[rows]
+            self.first_x = x[rows[0]] if len(rows) > 0 else None # Original value, for tick labels
+        
+        def __len__(self):
+            return len(self.x)
+        
+        def decode_points(self, line_graph : client_pre.image_generator.ImageGenerator.LineGraph) -> tuple[np.ndarray, np.ndarray]:
+            """x relative to the start of the graph, and y"""
+            return self.x - line_graph.min_max_x[0], self.y
 
+    # Formatters are functions (not lambdas) so render jobs holding them can be pickled
     class XTickFormatter:
-        DATETIME = lambda initial, x: datetime.datetime.strftime(initial + datetime.timedelta(seconds=x), f"{s.DATE_STRFTIME} %H:%M")
-        DATE = lambda initial, x: datetime.datetime.strftime(initial + datetime.timedelta(seconds=x), s.DATE_STRFTIME)
-        NUMBER = lambda initial, x: str(x)
+        def DATETIME(initial, x): return datetime.datetime.strftime(initial + datetime.timedelta(seconds=x), f"{s.DATE_STRFTIME} %H:%M")
+        def DATE(initial, x): return datetime.datetime.strftime(initial + datetime.timedelta(seconds=x), s.DATE_STRFTIME)
+        def NUMBER(initial, x): return str(x)
     
     class YTickFormatter:
-        TIME = lambda y: client.funcs.generate_time(y)
-        DEFAULT = lambda x: str(int(x))
+        def TIME(y): return client.funcs.generate_time(y)
+        def DEFAULT(x): return str(int(x))
 
     class LineGraph():
         def __init__(self, x_tick_formatter : ImageGenerator.XTickFormatter, y_tick_formatter = None, colors : list[str] = None):
@@ -150,26 +380,27 @@ class ImageGenerator():
             if not y_tick_formatter:
                 y_tick_formatter = ImageGenerator.YTickFormatter.DEFAULT
 
-            self.__min_x, self.__max_x = None, None 
+            self.__min_x, self.__max_x, self.__initial = None, None, None
             self.__x_tick_formatter, self.__y_tick_formatter = x_tick_formatter, y_tick_formatter
         
         def add_line(self, line : ImageGenerator.Line):
             self.lines.append(line)
         
         @property 
-        def min_max_x(self):
-
-            if not self.__min_x and not self.__max_x:
-            
-                _ = [l.min_max_x for l in self.lines]
-                mins, maxes = [mm[0] for mm in _], [mm[1] for mm in _]
-
-                self.__min_x, self.__max_x = min(mins, key=lambda k: k.x), max(maxes, key=lambda k: k.x) 
+        def min_max_x(self) -> tuple[float, float]:
+            if self.__min_x is None:
+                lines = [l for l in self.lines if len(l) > 0]
+                if len(lines) == 0:
+                    return 0, 0
+                first = min(lines, key=lambda l: l.x[0])
+                self.__min_x, self.__max_x = float(first.x[0]), float(max(l.x[-1] for l in lines))
+                self.__initial = first.first_x
             
             return self.__min_x, self.__max_x
 
         def format_x(self, ticks : list[plt.Text]):
-            return [self.__x_tick_formatter(self.min_max_x[0].x, t) for t in ticks]
+            _ = self.min_max_x
+            return [self.__x_tick_formatter(self.__initial, t) for t in ticks]
         
         def format_y(self, ticks : list[plt.Text]):
             return [str(self.__y_tick_formatter(t)) for t in ticks]
@@ -179,7 +410,7 @@ class ImageGenerator():
             if self.__x_tick_formatter == ImageGenerator.XTickFormatter.DATETIME:
                 return None
             
-            difference_seconds = (self.min_max_x[1].x_num-self.min_max_x[0].x_num)
+            difference_seconds = self.min_max_x[1]-self.min_max_x[0]
             difference_days = difference_seconds/60/60/60/24 
             gap_days = int(max(round(difference_days), 1))
             
@@ -187,205 +418,68 @@ class ImageGenerator():
         
         def get_xlim(self, x_gap : float = 0):
             pad = 0.85
-            return [0-(pad*x_gap), self.min_max_x[1].x_num-self.min_max_x[0].x_num+(pad*x_gap)]
+            return [0-(pad*x_gap), self.min_max_x[1]-self.min_max_x[0]+(pad*x_gap)]
         
         @property 
         def x_formatter(self):
             return self.__x_tick_formatter
     
-    def __config_graph_chart(self, title, x_label, y_label):
-        plt.rcParams["figure.figsize"] = [6.4*1.6, 4.8]
-
-        plt.title(title, y=1)
-        if x_label: plt.xlabel(x_label)
-        if y_label: plt.ylabel(y_label)
-        plt.xticks(rotation=270)
-
-    async def plot_linegraph(self, lg : LineGraph, title : str, x_label : str, y_label : str):
-        plt.close()
-        
-        self.__config_graph_chart(title, x_label, y_label)
-
-        if not lg.colors:
-            lg.colors = s.compare_line_colors
-
-        total_points = 0
-        for i, line in enumerate(lg.lines):
-            color_i = s.line_color if len(lg.lines) == 1 else lg.colors[i%len(lg.colors)]
-            points = line.decode_points(lg)
-            total_points += len(points)
-
-            if len(points) == 1: # Remove nan and count
-                plt.scatter(x=points[-1][0] if len(points) > 0 else 0, y=points[-1][1], color=color_i, label=line.name)
-            else:
-                plt.plot([p[0] for p in points], [p[1] for p in points], color=color_i, label=line.name, alpha=1 if len(lg.lines) == 1 else 0.75)
-
-        gca = plt.gca()
-
-        gca.yaxis.set_major_locator(plt.MaxNLocator(integer=True))
-
-        if total_points > 0:
-            x_gap = lg.calculate_x_gap()
-            gca.set_xlim(lg.get_xlim(x_gap or 0))
-
-            if x_gap:
-                gca.xaxis.set_major_locator(plt.MultipleLocator(x_gap))
-
-            xticks, yticks = gca.get_xticks(), gca.get_yticks()
-            gca.set_xticklabels(lg.format_x(list(xticks)))
-            gca.set_yticklabels(lg.format_y(list(yticks)))
-
-        if len(lg.lines) > 1:
-            plt.legend(bbox_to_anchor=(0, 1.05, 1, 0.2), loc="lower left", prop={'size':10}, frameon=False, mode="expand", borderaxespad=0, ncol=3)
-    
-    async def plot_barchart(self, data : list[ImageGenerator.Vertex], title : str, x_label : str, y_label : str, y_formatter : ImageGenerator.YTickFormatter, highlight : str = None ):
-        plt.close()
-        if not y_formatter:
-            y_formatter = ImageGenerator.YTickFormatter.DEFAULT
-        
-        self.__config_graph_chart(title, x_label, y_label)
-
-        barlist = plt.bar([d.x for d in data], [d.y for d in data], color=s.bar_color)
-
-        gca = plt.gca()
-
-        gca.yaxis.set_major_locator(plt.MaxNLocator(integer=True))
-
-        yticks = gca.get_yticks()
-        gca.set_yticklabels([y_formatter(t) for t in yticks])
-
-        xticks = [d.x for d in data]
-
-        if highlight:
-            highlight = highlight.replace("_", " ")
-            if highlight in list(xticks):
-                barlist[list(xticks).index(highlight)].set_color('r')
-    
-    async def plot_piechart(self, data : list[ImageGenerator.Vertex], title : str ):
-        plt.close()
-
-        plt.rcParams["figure.figsize"] = [6.4*1.6, 4.8]
-
-        def _autopct(pct):
-            return ('%.1f' % pct) + "%" if pct > 3 else ''
-
-        barlist, labels, pct_texts = plt.pie([d.y for d in data], labels=[d.x for d in data], autopct=_autopct, textprops={'fontsize': 7, "color":"white"}, rotatelabels=True, radius=1, startangle=160)
-        
-        for label, pct_text in zip(labels, pct_texts):
-            pct_text.set_rotation(label.get_rotation())
-        
-        plt.title(title, y=1.2)
-        plt.xticks(rotation=270)
-    
-    async def plot_timeline(self, points : list[ImageGenerator.Vertex], title : str, x_label : str = None, y_label : str = None, boolean_values : bool = False):
-        plt.close()
-
-        self.__config_graph_chart(title, x_label, y_label)
-        
-        minimum = min(points, key=lambda p: p.x_num)
-        today = ImageGenerator.Vertex(datetime.date.today(), 1).make_relative(minimum)[0]
-        gca = plt.gca()
-
-        last = None
-        bar_spaces : dict[str, list[tuple[int, int]]]= {}
-        x_ticks, x_ticklabels = [], []
-        for i, point in enumerate(points):
-            rel = point.make_relative(minimum)
-
-            if last != None:
-                if last[1] not in bar_spaces:
-                    bar_spaces[last[1]] = []
-                bar_spaces[last[1]].append((last[0], rel[0]-last[0] ))
-
-            x_ticks.append(rel[0])
-            x_ticklabels.append(ImageGenerator.XTickFormatter.DATE(minimum.x, rel[0]))
-            
-            last = rel 
-
-        if point.y not in bar_spaces:
-            bar_spaces[point.y] = []
-        bar_spaces[point.y].append((last[0], today-last[0]))
-        x_ticks.append(today)
-        x_ticklabels.append(ImageGenerator.XTickFormatter.DATE(minimum.x, today))
-
-        gca.set_ylim(0, len(bar_spaces))
-        
-        start_y = 1
-        add_end_y = 1
-
-        gca.set_yticks([start_y+i+0.5 for i in range(len(bar_spaces))] + [len(bar_spaces)+0.5+start_y+add_end_y])
-        gca.set_yticklabels(list(bar_spaces) + [""])
-        gca.set_xticks(x_ticks)
-        gca.set_xticklabels(x_ticklabels)
-
-        colors = s.timeline_colors
-        if boolean_values:
-            colors = s.timeline_colors_bool if points[0].y == True else list(reversed(s.timeline_colors_bool))
-
-        for i, (name, spaces) in enumerate(bar_spaces.items()):
-            plt.broken_barh(spaces, (start_y+i, 1), facecolors =(f'tab:{colors[i%len(colors)]}'))
-
-
     
     class MapBackground:
         AUTO = "auto" 
         ON = True 
         OFF = False
     
-    def __plot_area(self, area : client_pre.object.Area, dimmed : bool, show_whole_earth : bool):
-
-        if not dimmed:
-            plt.fill(
-                *area.polygon.exterior.xy, 
-                fc=area.fill_color + "20", 
-                ec=area.border_color, 
-                zorder=3, 
-                lw=0.2 if show_whole_earth == True else 0.3,
-                rasterized=True
-            )
-        else:
-            plt.fill(
-                *area.polygon.exterior.xy, 
-                fc=s.map_bordering_town_fill_colour + f"{s.map_bordering_town_opacity:02}", 
-                ec=area.border_color + f"{s.map_bordering_town_opacity//2:02}", 
-                zorder=2, 
-                lw=0.2 if show_whole_earth == True else 0.3,
-                rasterized=True
-            )
-
-    def town_cache_item(self, name : str, towns : list[client_pre.object.Town]):
-        total_vertex_count = total_area = 0
-        for town in towns:
-            total_vertex_count += town.vertex_count
-            total_area += town.area
-
-        return CacheItem(name, f"{total_vertex_count}{CACHE_SPLIT_STRING}{total_area}")
-
-    def __calculate_limits(self, main_lim : tuple[float], other_lim : tuple[float], main_width : int, r : float) -> tuple[float]:
-
-        if (main_lim[1]-main_lim[0]) >= r*(other_lim[1]-other_lim[0]):
-            return main_lim
-
-        x_lim_centre = (main_lim[1]+main_lim[0])/2
-        y_lim_mag_from_centre = (other_lim[1]-other_lim[0])/2
-
-        x_lim = (x_lim_centre-y_lim_mag_from_centre*r, x_lim_centre+y_lim_mag_from_centre*r)
-
-        shift_x = ((main_width-x_lim[1]) if x_lim[1] > main_width else 0) + (0-((0-main_width)-(0-x_lim[0])) if x_lim[0] < 0-main_width else 0)
-        x_lim = x_lim[0]+shift_x, x_lim[1]+shift_x
-
-        return x_lim
-
-    async def init_map(self):
-        ax = plt.gca()
-        ax.set_aspect('equal', adjustable='box')
-        plt.axis('off')
-        return ax
+    @property 
+    def executor(self) -> ProcessPoolExecutor:
+        # Made on first use. Spawned so workers don't inherit the bot's threads or event loop
+        if not self.__executor:
+            self.__executor = ProcessPoolExecutor(max_workers=s.render_workers, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker)
+        return self.__executor
+
+    async def plot_linegraph(self, lg : LineGraph, title : str, x_label : str, y_label : str) -> RenderJob:
+        return RenderJob(s.IMAGE_DPI_GRAPH).add("linegraph", lg=lg, title=title, x_label=x_label, y_label=y_label)
+    
+    async def plot_barchart(self, data : list[ImageGenerator.Vertex], title : str, x_label : str, y_label : str, y_formatter : ImageGenerator.YTickFormatter, highlight : str = None ) -> RenderJob:
+        return RenderJob(s.IMAGE_DPI_GRAPH).add("barchart", data=data, title=title, x_label=x_label, y_label=y_label, y_formatter=y_formatter, highlight=highlight)
+    
+    async def plot_piechart(self, data : list[ImageGenerator.Vertex], title : str ) -> RenderJob:
+        return RenderJob(s.IMAGE_DPI_GRAPH).add("piechart", data=data, title=title)
+    
+    async def plot_timeline(self, points : list[ImageGenerator.Vertex], title : str, x_label : str = None, y_label : str = None, boolean_values : bool = False) -> RenderJob:
+        return RenderJob(s.IMAGE_DPI_GRAPH).add("timeline", points=points, title=title, x_label=x_label, y_label=y_label, boolean_values=boolean_values)
+
+    @staticmethod
+    def __geometry_key(objects : list[typing.Union[o_pre.Area, o_pre.Town, o_pre.Object]]) -> list[tuple]:
+        towns = []
+        for o in objects:
+            for town in ([o.town] if type(o) == client.object.Area else [o] if type(o) == client.object.Town else o.towns):
+                if town not in towns:
+                    towns.append(town)
+        return [(
+            town.name, 
+            town._geometry_hash, 
+            (town.spawn.x, town.spawn.z) if town.spawn else None, 
+            [(p.x, p.z) for p in town.outpost_spawns]
+        ) for town in towns]
+
+    def town_cache_item(self, name : str, towns : list[client_pre.object.Town], profile : str = "full"):
+        """Each render profile is cached separately"""
+        return CacheItem(self.cache, name if profile == "full" else f"{name}+{profile}", None, profile=profile).add_parameters(self.__geometry_key(towns))
+
+    async def init_map(self) -> RenderJob:
+        return RenderJob(s.IMAGE_DPI_DRAWING).add("init_map")
+    
+    async def earth_map_png(self, towns : list[client_pre.object.Town]) -> bytes:
+        await self.earth_tiles.update(towns)
+        return await self.earth_tiles.png()
     
-    def __expand_limits(self, x_lim, y_lim, expand_limits_multiplier):
-        x_lim = x_lim[1]-((x_lim[1]-x_lim[0])*expand_limits_multiplier[0]), x_lim[1]
-        y_lim = y_lim[0], (y_lim[0]+(expand_limits_multiplier[1]*(y_lim[1]-y_lim[0])))
-        return x_lim, y_lim
+    async def earth_map(self, towns : list[client_pre.object.Town]) -> RenderJob:
+        """The whole earth map from its tiles, to draw more layers on"""
+        job = await self.init_map()
+        job.dpi = s.IMAGE_DPI_DRAWING_BIG
+        job.add("cached_map", data=await self.earth_map_png(towns), extent=[0-MAP_WIDTH, MAP_WIDTH, 0-MAP_HEIGHT, MAP_HEIGHT])
+        return job.add("invert_y")
 
     async def generate_area_map(
             self, 
@@ -398,152 +492,479 @@ class ImageGenerator():
             dimmed_areas : list[typing.Union[o_pre.Area, o_pre.Town, o_pre.Object]] = [],
             maintain_aspect_ratio : bool = True,
             expand_limits_multiplier : tuple[float] = (1, 1)
-    ):
-        plt.close()
+    ) -> RenderJob:
+        job = await self.init_map()
 
-        bg_path = s.earth_bg_path
-
-        towns : list[client.object.Town] = []
-
-        ax = await self.init_map()
-
-        if cache_item and not cache_item.checked:
-            cache_item.check_cache()
+        if cache_item:
+            cache_item.add_parameters(
+                town_spawn_dot, show_outposts, show_background, show_whole_earth, self.__geometry_key(dimmed_areas), maintain_aspect_ratio, expand_limits_multiplier
+            ).check_cache()
 
         if cache_item and cache_item.valid:
-            dpi = int(cache_item.extra.split("+")[0])
+            job.dpi = int(cache_item.extra.split("+")[0])
             lims = [float(n) for n in cache_item.extra.split("+")[1:]]
-            img = plt.imread(cache_item.path)
-            plt.imshow(img, extent=[lims[0], lims[1], lims[2], lims[3]], origin='lower')
+            job.add("cached_map", path=cache_item.path, extent=lims)
         else:
-            # Plot towns and dimmed towns
+            towns : list[client.object.Town] = []
+
+            # Geometry is sent to the worker as plain coordinates
+            plotted = []
             for o in areas :
                 _areas = [o] if type(o) == client.object.Area else o.areas
                 for area in _areas:
                     if area.town not in towns:
                         towns.append(area.town)
                     if area.is_mainland or show_outposts:
-                        self.__plot_area(area, False, show_whole_earth)
-
-            x_lim, y_lim = ax.get_xlim(), ax.get_ylim()
-
-            # Plot dimmed areas after getting limits
+                        plotted.append(_area_spec(area))
+            
+            dimmed = []
             for o in dimmed_areas:
                 _areas = [o] if type(o) == client.object.Area else o.areas
                 for area in _areas:
                     if area.is_mainland or show_outposts:
-                        self.__plot_area(area, True, show_whole_earth)
-            
-            if not show_whole_earth:
-                if maintain_aspect_ratio:
-                    x_lim = self.__calculate_limits(x_lim, y_lim, self.map_width, 2)
-                    y_lim = self.__calculate_limits(y_lim, x_lim, self.map_height, 0.3)
-            
-            x_lim, y_lim = (max(x_lim[0], 0-self.map_width), min(x_lim[1], self.map_width)), (max(y_lim[0], 0-self.map_height), min(y_lim[1], self.map_height))
-            
-            if town_spawn_dot:
-                if town_spawn_dot == True: town_spawn_dot : int = 7
-                biggest_boundary = max(x_lim[1]-x_lim[0], y_lim[1]-y_lim[0])
-                for town in towns:
-                    plt.scatter([town.spawn.x], [town.spawn.z], color=town.border_color, zorder=3, s=(min(1000/biggest_boundary, 1))*town_spawn_dot)
-
-            if show_background == self.MapBackground.AUTO:
-                show_background = x_lim[1]-x_lim[0] > s.show_earth_bg_if_over or y_lim[1]-y_lim[0] > s.show_earth_bg_if_over
-
-            if (show_whole_earth or (x_lim[1]-x_lim[0] > self.map_width*1.7 or y_lim[1]-y_lim[0] > self.map_height*1.5)):
-                bg_path = s.earth_bg_path_whole
-                dpi = s.IMAGE_DPI_DRAWING_BIG
-            else:
-                dpi = s.IMAGE_DPI_DRAWING
-        
-            if show_background == True:
-                plt.imshow(plt.imread(bg_path), extent=[0-self.map_width, self.map_width, 0-self.map_height, self.map_height], origin='lower')
+                        dimmed.append(_area_spec(area))
             
-            x_lim, y_lim = self.__expand_limits(x_lim, y_lim, expand_limits_multiplier)
+            spawns = [(town.spawn.x, town.spawn.z, town.border_color) for town in towns] if town_spawn_dot else []
             
-            if not show_whole_earth:
-                ax.set_xlim(x_lim)
-                ax.set_ylim(y_lim)
-            
-            if cache_item:
-                cache_item.extra = f"{dpi}+{x_lim[0]:.2f}+{x_lim[1]:.2f}+{y_lim[0]:.2f}+{y_lim[1]:.2f}"
-        
-        ax.invert_yaxis()
+            job.dpi = None # Picked by the worker from the map's limits
+            job.add(
+                "area_map", 
+                areas=plotted, 
+                dimmed_areas=dimmed, 
+                spawns=spawns, 
+                town_spawn_dot=town_spawn_dot, 
+                show_background=show_background, 
+                show_whole_earth=show_whole_earth, 
+                maintain_aspect_ratio=maintain_aspect_ratio, 
+                expand_limits_multiplier=expand_limits_multiplier
+            )
         
+        job.add("invert_y")
 
-        return dpi
+        return job
     
     async def layer_player_locations(
                 self, 
+                job : RenderJob,
                 primary_players : list[o_pre.Player], 
                 secondary_players : list[o_pre.Player], 
                 primary_dot_size : int = 8, 
                 secondary_dot_size : float = 0.5, 
                 show_background: MapBackground=False, 
                 expand_limits_multiplier : tuple[float] = (1, 1)
-    ):
+    ) -> RenderJob:
+        return job.add(
+            "player_locations",
+            primary=[(p.location.x, p.location.z) for p in primary_players],
+            secondary=[(p.location.x, p.location.z) for p in secondary_players],
+            primary_dot_size=primary_dot_size,
+            secondary_dot_size=secondary_dot_size,
+            show_background=show_background,
+            expand_limits_multiplier=expand_limits_multiplier
+        )
+
+    async def layer_journey(self, job : RenderJob, journey : list[list[int]]) -> RenderJob:
+        return job.add("journey", journey=journey)
+    
+    async def layer_spawn_connections(self, job : RenderJob, towns : list[client.object.Town]) -> RenderJob:
+        return job.add("spawn_connections", spawns=[(t.name, t.spawn.x, t.spawn.z) for t in towns])
+    
+    async def render_plt(self, job : RenderJob, cache_item : CacheItem = None, pad : bool = False, dpi : int = None, profile : str = None):
+        """profile: one of s.render_profiles, for where the image is shown. Defaults to the cache item's"""
+        profile = s.render_profiles[profile or (cache_item.profile if cache_item else "full")]
+        png, cache_extra = await asyncio.get_running_loop().run_in_executor(self.executor, _render_job, job, dpi or profile["dpi"] or job.dpi, pad, profile["line_width"])
+        buf = io.BytesIO(png)
+
+        if cache_item and cache_extra:
+            cache_item.extra = cache_extra
+        if cache_item and not cache_item.valid:
+            await cache_item.save(buf)
+        
+        buf.seek(0)
+
+        return buf
 
-        ax = plt.gca()
+# Drawing. These only run in render workers
 
-        x_online, z_online, x_offline, z_offline = [], [], [], []
+def _config_graph_chart(title, x_label, y_label):
+    plt.rcParams["figure.figsize"] = [6.4*1.6, 4.8]
 
-        for player in primary_players:
-            x_online.append(player.location.x)
-            z_online.append(player.location.z)
-        for player in secondary_players:
-            x_offline.append(player.location.x)
-            z_offline.append(player.location.z)
-        
-        plt.scatter(x_online, z_online, color="white", s=primary_dot_size, zorder=6)
-        plt.scatter(x_offline, z_offline, color="#707070", s=secondary_dot_size, zorder=5)
-        
-        x_lim, y_lim = ax.get_xlim(), ax.get_ylim()
-        if show_background == self.MapBackground.AUTO:
-            show_background = x_lim[1]-x_lim[0] > s.show_earth_bg_if_over or y_lim[1]-y_lim[0] > s.show_earth_bg_if_over
-        if show_background == True:
-            plt.imshow(plt.imread(s.earth_bg_path_whole), extent=[0-self.map_width, self.map_width, 0-self.map_height, self.map_height], origin='lower')
-        
-        x_lim, y_lim = self.__expand_limits(x_lim, y_lim, expand_limits_multiplier)
+    plt.title(title, y=1)
+    if x_label: plt.xlabel(x_label)
+    if y_label: plt.ylabel(y_label)
+    plt.xticks(rotation=270)
 
-        ax.set_xlim(x_lim)
-        ax.set_ylim(y_lim)
+def _draw_linegraph(state : dict, lg : ImageGenerator.LineGraph, title : str, x_label : str, y_label : str):
+    _config_graph_chart(title, x_label, y_label)
 
-        if show_background == True:
-            ax.invert_yaxis()
+    if not lg.colors:
+        lg.colors = s.compare_line_colors
 
-    async def layer_journey(self, journey : list[list[int]]):
-        for i in range(len(journey)):
-            if i == 0:
-                continue 
-            
-            prev, current = journey[i-1], journey[i]
-            d = [current[0]-prev[0], current[1]-prev[1]]
+    total_points = 0
+    for i, line in enumerate(lg.lines):
+        color_i = s.line_color if len(lg.lines) == 1 else lg.colors[i%len(lg.colors)]
+        x, y = line.decode_points(lg)
+        total_points += len(x)
+
+        if len(x) == 1:
+            plt.scatter(x=x, y=y, color=color_i, label=line.name)
+        else:
+            plt.plot(x, y, color=color_i, label=line.name, alpha=1 if len(lg.lines) == 1 else 0.75)
+
+    gca = plt.gca()
+
+    gca.yaxis.set_major_locator(plt.MaxNLocator(integer=True))
 
-            plt.arrow(prev[0], prev[1], d[0], d[1], length_includes_head=True, head_width=5, head_length=10, color="#FFFFFFB4", zorder=5, lw=0.5, linestyle='dashed')
+    if total_points > 0:
+        x_gap = lg.calculate_x_gap()
+        gca.set_xlim(lg.get_xlim(x_gap or 0))
+
+        if x_gap:
+            gca.xaxis.set_major_locator(plt.MultipleLocator(x_gap))
+
+        xticks, yticks = gca.get_xticks(), gca.get_yticks()
+        gca.set_xticklabels(lg.format_x(list(xticks)))
+        gca.set_yticklabels(lg.format_y(list(yticks)))
+
+    if len(lg.lines) > 1:
+        plt.legend(bbox_to_anchor=(0, 1.05, 1, 0.2), loc="lower left", prop={'size':10}, frameon=False, mode="expand", borderaxespad=0, ncol=3)
+
+def _draw_barchart(state : dict, data : list[ImageGenerator.Vertex], title : str, x_label : str, y_label : str, y_formatter : ImageGenerator.YTickFormatter, highlight : str = None):
+    if not y_formatter:
+        y_formatter = ImageGenerator.YTickFormatter.DEFAULT
     
-    async def layer_spawn_connections(self, towns : list[client.object.Town]):
-        done = []
-        for i, ts in enumerate(itertools.product(towns, repeat=2)):
-            if ts[0].name == ts[1].name or [ts[0].name, ts[1].name] in done:
-                continue 
-            
-            distance = math.sqrt((ts[0].spawn.x-ts[1].spawn.x)**2 + (ts[0].spawn.z-ts[1].spawn.z)**2)
-            plt.plot([t.spawn.x for t in ts], [t.spawn.z for t in ts], color=s.connection_line_colours[i%len(s.connection_line_colours)], zorder=4, lw=0.5, label=f"{int(distance):,} blocks ({ts[0].name[:2]}->{ts[1].name[:2]})")
-            done.append([ts[0].name, ts[1].name])
-            done.append([ts[1].name, ts[0].name])
-        plt.legend(loc="upper left", prop={'size':5}, frameon=False)
+    _config_graph_chart(title, x_label, y_label)
+
+    barlist = plt.bar([d.x for d in data], [d.y for d in data], color=s.bar_color)
+
+    gca = plt.gca()
+
+    gca.yaxis.set_major_locator(plt.MaxNLocator(integer=True))
+
+    yticks = gca.get_yticks()
+    gca.set_yticklabels([y_formatter(t) for t in yticks])
+
+    xticks = [d.x for d in data]
+
+    if highlight:
+        highlight = highlight.replace("_", " ")
+        if highlight in list(xticks):
+            barlist[list(xticks).index(highlight)].set_color('r')
+
+def _draw_piechart(state : dict, data : list[ImageGenerator.Vertex], title : str):
+    plt.rcParams["figure.figsize"] = [6.4*1.6, 4.8]
+
+    def _autopct(pct):
+        return ('%.1f' % pct) + "%" if pct > 3 else ''
+
+    barlist, labels, pct_texts = plt.pie([d.y for d in data], labels=[d.x for d in data], autopct=_autopct, textprops={'fontsize': 7, "color":"white"}, rotatelabels=True, radius=1, startangle=160)
     
-    async def render_plt(self, dpi : int, cache_item : CacheItem = None, pad : bool = False):
-        buf = io.BytesIO()
-        plt.savefig(buf, dpi=dpi, transparent=True, bbox_inches="tight", pad_inches = None if pad else 0 )
+    for label, pct_text in zip(labels, pct_texts):
+        pct_text.set_rotation(label.get_rotation())
+    
+    plt.title(title, y=1.2)
+    plt.xticks(rotation=270)
 
-        if cache_item and not cache_item.valid:
-            await cache_item.save(buf)
+def _draw_timeline(state : dict, points : list[ImageGenerator.Vertex], title : str, x_label : str = None, y_label : str = None, boolean_values : bool = False):
+    _config_graph_chart(title, x_label, y_label)
+    
+    minimum = min(points, key=lambda p: p.x_num)
+    today = ImageGenerator.Vertex(datetime.date.today(), 1).make_relative(minimum)[0]
+    gca = plt.gca()
+
+    last = None
+    bar_spaces : dict[str, list[tuple[int, int]]]= {}
+    x_ticks, x_ticklabels = [], []
+    for i, point in enumerate(points):
+        rel = point.make_relative(minimum)
+
+        if last != None:
+            if last[1] not in bar_spaces:
+                bar_spaces[last[1]] = []
+            bar_spaces[last[1]].append((last[0], rel[0]-last[0] ))
+
+        x_ticks.append(rel[0])
+        x_ticklabels.append(ImageGenerator.XTickFormatter.DATE(minimum.x, rel[0]))
         
-        buf.seek(0)
+        last = rel 
 
-        return buf
+    if point.y not in bar_spaces:
+        bar_spaces[point.y] = []
+    bar_spaces[point.y].append((last[0], today-last[0]))
+    x_ticks.append(today)
+    x_ticklabels.append(ImageGenerator.XTickFormatter.DATE(minimum.x, today))
+
+    gca.set_ylim(0, len(bar_spaces))
     
+    start_y = 1
+    add_end_y = 1
+
+    gca.set_yticks([start_y+i+0.5 for i in range(len(bar_spaces))] + [len(bar_spaces)+0.5+start_y+add_end_y])
+    gca.set_yticklabels(list(bar_spaces) + [""])
+    gca.set_xticks(x_ticks)
+    gca.set_xticklabels(x_ticklabels)
+
+    colors = s.timeline_colors
+    if boolean_values:
+        colors = s.timeline_colors_bool if points[0].y == True else list(reversed(s.timeline_colors_bool))
+
+    for i, (name, spaces) in enumerate(bar_spaces.items()):
+        plt.broken_barh(spaces, (start_y+i, 1), facecolors =(f'tab:{colors[i%len(colors)]}'))
+
+def _plot_area(area : dict, dimmed : bool, show_whole_earth : bool, line_width : float = 1):
+
+    if not dimmed:
+        plt.fill(
+            area["x"], area["y"], 
+            fc=area["fill_color"] + "20", 
+            ec=area["border_color"], 
+            zorder=3, 
+            lw=(0.2 if show_whole_earth == True else 0.3)*line_width,
+            rasterized=True
+        )
+    else:
+        plt.fill(
+            area["x"], area["y"], 
+            fc=s.map_bordering_town_fill_colour + f"{s.map_bordering_town_opacity:02}", 
+            ec=area["border_color"] + f"{s.map_bordering_town_opacity//2:02}", 
+            zorder=2, 
+            lw=(0.2 if show_whole_earth == True else 0.3)*line_width,
+            rasterized=True
+        )
+
+def _calculate_limits(main_lim : tuple[float], other_lim : tuple[float], main_width : int, r : float) -> tuple[float]:
+
+    if (main_lim[1]-main_lim[0]) >= r*(other_lim[1]-other_lim[0]):
+        return main_lim
+
+    x_lim_centre = (main_lim[1]+main_lim[0])/2
+    y_lim_mag_from_centre = (other_lim[1]-other_lim[0])/2
+
+    x_lim = (x_lim_centre-y_lim_mag_from_centre*r, x_lim_centre+y_lim_mag_from_centre*r)
+
+    shift_x = ((main_width-x_lim[1]) if x_lim[1] > main_width else 0) + (0-((0-main_width)-(0-x_lim[0])) if x_lim[0] < 0-main_width else 0)
+    x_lim = x_lim[0]+shift_x, x_lim[1]+shift_x
+
+    return x_lim
+
+def _expand_limits(x_lim, y_lim, expand_limits_multiplier):
+    x_lim = x_lim[1]-((x_lim[1]-x_lim[0])*expand_limits_multiplier[0]), x_lim[1]
+    y_lim = y_lim[0], (y_lim[0]+(expand_limits_multiplier[1]*(y_lim[1]-y_lim[0])))
+    return x_lim, y_lim
+
+_BACKGROUNDS : dict[str, list[np.ndarray]] = {} # path: decoded image then each half size version. One per render worker
+
+def _init_worker():
+    for path in [s.earth_bg_path, s.earth_bg_path_whole]:
+        _background_levels(path)
+
+def _background_levels(path : str) -> list[np.ndarray]:
+    if path not in _BACKGROUNDS:
+        image = Image.open(path)
+        image.load()
+        levels = [np.asarray(image)]
+        while len(levels) < s.background_mipmap_levels and min(image.size) > 1:
+            image = image.reduce(2)
+            levels.append(np.asarray(image))
+        _BACKGROUNDS[path] = levels
+    return _BACKGROUNDS[path]
+
+def _draw_background(path : str, x_lim : tuple[float], y_lim : tuple[float], dpi : int):
+    """Only the part of a background inside the limits, from the smallest version with enough detail for the figure"""
+    x_lim, y_lim = sorted(x_lim), sorted(y_lim) # y may be inverted
+    pixels_across = plt.gcf().get_size_inches()[0]*(dpi or s.IMAGE_DPI_DRAWING)
+
+    levels = _background_levels(path)
+    image = levels[0]
+    for level in reversed(levels):
+        if level.shape[1]*(x_lim[1]-x_lim[0])/(MAP_WIDTH*2) >= pixels_across:
+            image = level
+            break
+    
+    # Rows go from south to north, as it's drawn with origin="lower"
+    rows, columns = image.shape[:2]
+    block_width, block_height = MAP_WIDTH*2/columns, MAP_HEIGHT*2/rows
+    column_start, column_end = max(int((x_lim[0]+MAP_WIDTH)//block_width)-1, 0), min(int((x_lim[1]+MAP_WIDTH)//block_width)+2, columns)
+    row_start, row_end = max(int((y_lim[0]+MAP_HEIGHT)//block_height)-1, 0), min(int((y_lim[1]+MAP_HEIGHT)//block_height)+2, rows)
+    if column_start >= column_end or row_start >= row_end:
+        return
+    
+    plt.imshow(
+        image[row_start:row_end, column_start:column_end], 
+        extent=[column_start*block_width-MAP_WIDTH, column_end*block_width-MAP_WIDTH, row_start*block_height-MAP_HEIGHT, row_end*block_height-MAP_HEIGHT], 
+        origin='lower'
+    )
+
+def _draw_init_map(state : dict):
+    ax = plt.gca()
+    ax.set_aspect('equal', adjustable='box')
+    plt.axis('off')
+
+def _draw_cached_map(state : dict, extent : list[float], path : str = None, data : bytes = None):
+    img = plt.imread(path or io.BytesIO(data))
+    plt.imshow(img, extent=extent, origin='lower')
+
+def _draw_area_map(
+        state : dict, 
+        areas : list[dict], 
+        dimmed_areas : list[dict], 
+        spawns : list[tuple], 
+        town_spawn_dot : typing.Union[int, bool], 
+        show_background : ImageGenerator.MapBackground, 
+        show_whole_earth : bool, 
+        maintain_aspect_ratio : bool, 
+        expand_limits_multiplier : tuple[float]
+):
+    ax = plt.gca()
+    bg_path = s.earth_bg_path
+
+    # Plot towns and dimmed towns
+    for area in areas:
+        _plot_area(area, False, show_whole_earth, state["line_width"])
+
+    x_lim, y_lim = ax.get_xlim(), ax.get_ylim()
+
+    # Plot dimmed areas after getting limits
+    for area in dimmed_areas:
+        _plot_area(area, True, show_whole_earth, state["line_width"])
+    
+    if not show_whole_earth:
+        if maintain_aspect_ratio:
+            x_lim = _calculate_limits(x_lim, y_lim, MAP_WIDTH, 2)
+            y_lim = _calculate_limits(y_lim, x_lim, MAP_HEIGHT, 0.3)
+    
+    x_lim, y_lim = (max(x_lim[0], 0-MAP_WIDTH), min(x_lim[1], MAP_WIDTH)), (max(y_lim[0], 0-MAP_HEIGHT), min(y_lim[1], MAP_HEIGHT))
+    
+    if town_spawn_dot:
+        if town_spawn_dot == True: town_spawn_dot : int = 7
+        biggest_boundary = max(x_lim[1]-x_lim[0], y_lim[1]-y_lim[0])
+        for x, z, color in spawns:
+            plt.scatter([x], [z], color=color, zorder=3, s=(min(1000/biggest_boundary, 1))*town_spawn_dot)
+
+    if show_background == ImageGenerator.MapBackground.AUTO:
+        show_background = x_lim[1]-x_lim[0] > s.show_earth_bg_if_over or y_lim[1]-y_lim[0] > s.show_earth_bg_if_over
+
+    if (show_whole_earth or (x_lim[1]-x_lim[0] > MAP_WIDTH*1.7 or y_lim[1]-y_lim[0] > MAP_HEIGHT*1.5)):
+        bg_path = s.earth_bg_path_whole
+        dpi = s.IMAGE_DPI_DRAWING_BIG
+    else:
+        dpi = s.IMAGE_DPI_DRAWING
+    
+    x_lim, y_lim = _expand_limits(x_lim, y_lim, expand_limits_multiplier)
+    state["dpi"] = state.get("dpi") or dpi
 
+    if show_background == True:
+        if show_whole_earth:
+            _draw_background(bg_path, (0-MAP_WIDTH, MAP_WIDTH), (0-MAP_HEIGHT, MAP_HEIGHT), state["dpi"])
+        else:
+            _draw_background(bg_path, x_lim, y_lim, state["dpi"])
+    
+    if not show_whole_earth:
+        ax.set_xlim(x_lim)
+        ax.set_ylim(y_lim)
+    state["cache_extra"] = f"{state['dpi']}+{x_lim[0]:.2f}+{x_lim[1]:.2f}+{y_lim[0]:.2f}+{y_lim[1]:.2f}"
+
+def _draw_invert_y(state : dict):
+    plt.gca().invert_yaxis()
+
+def _draw_player_locations(
+            state : dict,
+            primary : list[tuple[float]], 
+            secondary : list[tuple[float]], 
+            primary_dot_size : int, 
+            secondary_dot_size : float, 
+            show_background : ImageGenerator.MapBackground, 
+            expand_limits_multiplier : tuple[float]
+):
+    ax = plt.gca()
+
+    plt.scatter([p[0] for p in primary], [p[1] for p in primary], color="white", s=primary_dot_size, zorder=6)
+    plt.scatter([p[0] for p in secondary], [p[1] for p in secondary], color="#707070", s=secondary_dot_size, zorder=5)
+    
+    x_lim, y_lim = ax.get_xlim(), ax.get_ylim()
+    if show_background == ImageGenerator.MapBackground.AUTO:
+        show_background = x_lim[1]-x_lim[0] > s.show_earth_bg_if_over or y_lim[1]-y_lim[0] > s.show_earth_bg_if_over
+    
+    x_lim, y_lim = _expand_limits(x_lim, y_lim, expand_limits_multiplier)
+    if show_background == True:
+        _draw_background(s.earth_bg_path_whole, x_lim, y_lim, state["dpi"])
+
+    ax.set_xlim(x_lim)
+    ax.set_ylim(y_lim)
+
+    if show_background == True:
+        ax.invert_yaxis()
+
+def _draw_journey(state : dict, journey : list[list[int]]):
+    for i in range(len(journey)):
+        if i == 0:
+            continue 
         
+        prev, current = journey[i-1], journey[i]
+        d = [current[0]-prev[0], current[1]-prev[1]]
+
+        plt.arrow(prev[0], prev[1], d[0], d[1], length_includes_head=True, head_width=5, head_length=10, color="#FFFFFFB4", zorder=5, lw=0.5, linestyle='dashed')
+
+def _draw_spawn_connections(state : dict, spawns : list[tuple[str, float, float]]):
+    done = []
+    for i, ts in enumerate(itertools.product(spawns, repeat=2)):
+        if ts[0][0] == ts[1][0] or [ts[0][0], ts[1][0]] in done:
+            continue 
+        
+        distance = math.sqrt((ts[0][1]-ts[1][1])**2 + (ts[0][2]-ts[1][2])**2)
+        plt.plot([t[1] for t in ts], [t[2] for t in ts], color=s.connection_line_colours[i%len(s.connection_line_colours)], zorder=4, lw=0.5, label=f"{int(distance):,} blocks ({ts[0][0][:2]}->{ts[1][0][:2]})")
+        done.append([ts[0][0], ts[1][0]])
+        done.append([ts[1][0], ts[0][0]])
+    plt.legend(loc="upper left", prop={'size':5}, frameon=False)
+
+_STEPS = {
+    "linegraph":_draw_linegraph,
+    "barchart":_draw_barchart,
+    "piechart":_draw_piechart,
+    "timeline":_draw_timeline,
+    "init_map":_draw_init_map,
+    "cached_map":_draw_cached_map,
+    "area_map":_draw_area_map,
+    "invert_y":_draw_invert_y,
+    "player_locations":_draw_player_locations,
+    "journey":_draw_journey,
+    "spawn_connections":_draw_spawn_connections
+}
+
+def _render_tiles(tiles : list[tuple[tuple[float], list[dict]]], size : int, dpi : int) -> list[np.ndarray]:
+    """Worker entry point. Draws each (extent, areas) to a size x size RGBA array with the north at the top"""
+    rendered = []
+    for (min_x, max_x, min_z, max_z), areas in tiles:
+        plt.close("all")
+        fig = plt.figure(figsize=(size/dpi, size/dpi), dpi=dpi)
+        ax = fig.add_axes([0, 0, 1, 1])
+        ax.axis("off")
+        fig.patch.set_alpha(0)
+        
+        for area in areas:
+            _plot_area(area, False, True)
+        ax.set_xlim(min_x, max_x)
+        ax.set_ylim(max_z, min_z)
+
+        fig.canvas.draw()
+        pixels = np.zeros((size, size, 4), dtype=np.uint8)
+        drawn = np.asarray(fig.canvas.buffer_rgba())[:size, :size]
+        pixels[:drawn.shape[0], :drawn.shape[1]] = drawn
+        rendered.append(pixels)
+    plt.close("all")
+
+    return rendered
+
+def _render_job(job : RenderJob, dpi : int, pad : bool, line_width : float = 1) -> tuple[bytes, str]:
+    """Worker entry point. Returns the PNG and the cache extra (for area maps)"""
+    plt.close("all")
+
+    state = {"dpi":dpi, "line_width":line_width}
+    for step, kwargs in job.steps:
+        _STEPS[step](state, **kwargs)
+    
+    buf = io.BytesIO()
+    plt.savefig(buf, dpi=state["dpi"], transparent=True, bbox_inches="tight", pad_inches = None if pad else 0 )
+    plt.close("all")
 
+    return buf.getvalue(), state.get("cache_extra")
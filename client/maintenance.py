@@ -0,0 +1,125 @@
+from __future__ import annotations
+import typing
+if typing.TYPE_CHECKING:
+    import client as client_pre
+
+import datetime
+import time
+
+import setup as s
+
+class ChunkedDelete():
+    """Deletes matching rows one range of rowids at a time, so each chunk only reads that range
+    (however few rows match) and stops at the largest rowid there was when it started"""
+    def __init__(self, client : client_pre.Client, table_name : str, where : str, params : tuple = (), on_deleted : typing.Callable = None):
+        self.client = client
+        self.table_name = table_name
+        self.where = where
+        self.params = params
+        self.on_deleted = on_deleted
+
+        self.__last_rowid = 0
+        self.__max_rowid : int = None
+
+    async def __call__(self) -> bool:
+        """Delete one chunk. Returns whether it's finished"""
+        if self.__max_rowid is None:
+            self.__max_rowid = (await (await self.client.database.connection.execute(f"SELECT MAX(rowid) FROM {self.table_name}")).fetchone())[0] or 0
+
+        upper = self.__last_rowid + s.maintenance_chunk_size
+        cursor = await self.client.database.connection.execute(f"DELETE FROM {self.table_name} WHERE rowid > ? AND rowid <= ? AND ({self.where})", (self.__last_rowid, upper) + self.params)
+        self.__last_rowid = upper
+        if cursor.rowcount > 0 and self.on_deleted:
+            self.on_deleted()
+
+        return self.__last_rowid >= self.__max_rowid
+
+class Maintenance():
+    """Database upkeep that used to run in every refresh. Each job runs on its own schedule, in slices of at most
+    s.maintenance_slice_budget seconds taken between refreshes"""
+    def __init__(self, client : client_pre.Client):
+        self.client = client
+
+        # name: (how often, hour of the day it has to run at or after)
+        self.jobs : dict[str, tuple[datetime.timedelta, typing.Optional[int]]] = {
+            "cull_objects":(s.cull_period, None),
+            "day_history":(s.maintenance_day_history_period, None),
+            "save_history_today":(s.history_today_save_period, None),
+            "orphans":(datetime.timedelta(days=1), s.maintenance_nightly_hour),
+            "history_abstraction":(datetime.timedelta(days=1), s.maintenance_nightly_hour)
+        }
+        self.last_run : dict[str, datetime.datetime] = {}
+
+        self.__pending : dict[str, list[typing.Callable[[], typing.Awaitable[bool]]]] = {}
+
+    def __due(self, name : str, now : datetime.datetime) -> bool:
+        period, hour = self.jobs[name]
+        last = self.last_run.get(name)
+        if hour is not None:
+            return (not last or last.date() < now.date()) and now.hour >= hour
+        return not last or now - last >= period
+
+    def __steps(self, name : str) -> list[typing.Callable[[], typing.Awaitable[bool]]]:
+        if name == "cull_objects":
+            now = datetime.datetime.now()
+            # Removing culled objects from the world is one step. It's in memory apart from merging renamed objects, which is per object
+            async def remove_culled():
+                await self.client.cull_db()
+                return True
+            return [
+                ChunkedDelete(self.client, "players", "last < ?", (now-s.cull_players_from, )),
+                ChunkedDelete(self.client, "towns", "last_seen < ?", (now-s.cull_objects_after, )),
+                ChunkedDelete(self.client, "flags", "object_type = 'nation' AND NOT EXISTS (SELECT 1 FROM objects WHERE objects.type = 'nation' AND objects.name = flags.object_name)"),
+                remove_culled,
+                ChunkedDelete(self.client, "objects", "last < ?", (now-s.cull_objects_after, )) # After, because nations are looked up in it
+            ]
+
+        if name == "day_history":
+            yesterday = datetime.datetime.now()-datetime.timedelta(days=1)
+            return [ChunkedDelete(self.client, f"{object_type}_day_history", "time < ?", (yesterday, )) for object_type in ["player", "town", "nation", "global"]]
+
+        if name == "save_history_today":
+            async def save_history_today():
+                await self.client.history_today.save()
+                return True
+            return [save_history_today]
+
+        if name == "orphans":
+            return [
+                # Correlated lookups on indexed columns, so only the rows in each chunk's range are looked up
+                ChunkedDelete(self.client, "visited_towns", "duration < 300 AND NOT EXISTS (SELECT 1 FROM players WHERE players.name = visited_towns.player)"),
+                ChunkedDelete(self.client, "player_history", "NOT EXISTS (SELECT 1 FROM players WHERE players.name = player_history.player) AND EXISTS (SELECT 1 FROM activity WHERE activity.object_type = 'player' AND activity.object_name = player_history.player AND activity.duration < 1000)")
+            ]
+
+        if name == "history_abstraction": # Remove some old data which is not needed anymore
+            steps = []
+            for object_type in ["player", "town", "nation", "object"]:
+                for threshold_time, days_of_6 in s.history_abstraction_thresholds:
+                    steps.append(ChunkedDelete(
+                        self.client,
+                        f"{object_type}_history",
+                        f"(julianday(date)-julianday('2021-10-29')) % 6 IN ({days_of_6}) AND date < ?",
+                        (datetime.datetime.now()-threshold_time, ),
+                        lambda object_type=object_type: self.client.history_catalogue.forget_dates(object_type)
+                    ))
+            return steps
+
+    async def run(self):
+        self.client.database.use_writer()
+
+        now = datetime.datetime.now()
+        for name in self.jobs:
+            if name not in self.__pending and self.__due(name, now):
+                self.__pending[name] = self.__steps(name)
+                self.last_run[name] = now
+
+        for name, steps in list(self.__pending.items()):
+            async with self.client.refresh_lock:
+                deadline = time.monotonic() + s.maintenance_slice_budget
+                while len(steps) > 0 and time.monotonic() < deadline:
+                    if await steps[0]():
+                        steps.pop(0)
+                await self.client.commit()
+
+            if len(steps) == 0:
+                del self.__pending[name]
@@ -0,0 +1,101 @@
+from __future__ import annotations
+import typing
+if typing.TYPE_CHECKING:
+    import client as client_pre
+
+class MentionMatcher():
+    """Aho-Corasick automaton over every town, object and player name, so a message is scanned once however big the world is.
+    Only rebuilt when World.entities_version changes"""
+    def __init__(self):
+        self.version : int = None
+
+        # Transitions are keyed by state << 21 | ord(char) (chars fit in 21 bits) to keep the automaton small
+        self.__goto : dict[int, int] = {}
+        self.__fail : list[int] = [0]
+        self.__output : dict[int, list[tuple[int, tuple[str, str]]]] = {} # state: [(pattern length, (object_type, object_name))]
+
+    def update(self, world : client_pre.object.World) -> bool:
+        """Rebuild if towns, objects or players have changed. Returns whether it was rebuilt"""
+        if world.entities_version == self.version:
+            return False
+
+        names : dict[str, tuple[str, str]] = {}
+        for town in world.towns:
+            names[town.name.lower()] = ("town", town.name)
+        for object_type in world._objects:
+            for object in world._objects[object_type]:
+                names[object.name.lower()] = (object_type[:-1], object.name)
+        for player in world.players:
+            names[player.name.lower()] = ("player", player.name)
+
+        self.build(names)
+        self.version = world.entities_version
+        return True
+
+    def build(self, names : dict[str, tuple[str, str]]):
+        patterns = dict(names)
+        for name, mention in names.items(): # Names are often written with spaces instead of underscores
+            patterns.setdefault(name.replace("_", " "), mention)
+
+        goto : dict[int, int] = {}
+        children : list[list[tuple[str, int]]] = [[]]
+        output : dict[int, list[tuple[int, tuple[str, str]]]] = {}
+        for pattern, mention in patterns.items():
+            if len(pattern) == 0:
+                continue
+            state = 0
+            for char in pattern:
+                key = state << 21 | ord(char)
+                if key not in goto:
+                    goto[key] = len(children)
+                    children[state].append((char, len(children)))
+                    children.append([])
+                state = goto[key]
+            output[state] = [(len(pattern), mention)]
+
+        # Breadth first, so a state's fail link is always done before its children's
+        fail = [0] * len(children)
+        queue = [child for _, child in children[0]]
+        for state in queue:
+            for char, child in children[state]:
+                f = fail[state]
+                while f and (f << 21 | ord(char)) not in goto:
+                    f = fail[f]
+                fail[child] = goto.get(f << 21 | ord(char), 0)
+                if fail[child] in output:
+                    output[child] = output.get(child, []) + output[fail[child]]
+                queue.append(child)
+
+        self.__goto = goto
+        self.__fail = fail
+        self.__output = output
+
+    @staticmethod
+    def __is_boundary(text : str, i : int) -> bool:
+        return i < 0 or i >= len(text) or not (text[i].isalnum() or text[i] == "_")
+
+    def find(self, message : str) -> list[tuple[str, str]]:
+        """(object_type, object_name) for every whole word mention. Overlapping matches keep the longest"""
+        text = message.lower()
+        goto, fail, output = self.__goto, self.__fail, self.__output
+
+        matches = []
+        state = 0
+        for i, char in enumerate(text):
+            c = ord(char)
+            while state and (state << 21 | c) not in goto:
+                state = fail[state]
+            state = goto.get(state << 21 | c, 0)
+
+            for length, mention in output.get(state, []):
+                start = i - length + 1
+                if self.__is_boundary(text, start - 1) and self.__is_boundary(text, i + 1):
+                    matches.append((start, i + 1, mention))
+
+        mentions = []
+        end = 0
+        for start, match_end, mention in sorted(matches, key=lambda m: (m[0], m[0] - m[1])):
+            if start >= end:
+                mentions.append(mention)
+                end = match_end
+        return mentions
@@ -162,9 +162,9 @@ class Notifications():
                                 for point in journey:
                                     if area.is_point_in_area(Point(point[0], 64, point[1])) and area not in a:
                                         a.append(area)
-                            dpi = await self.client.image_generator.generate_area_map(a, False, False, False, False, None, [])
-                            await self.client.image_generator.layer_journey(journey)
-                            attachments = [discord.File(await self.client.image_generator.render_plt(dpi, None), "journey.png")]
+                            job = await self.client.image_generator.generate_area_map(a, False, False, False, False, None, [])
+                            await self.client.image_generator.layer_journey(job, journey)
+                            attachments = [discord.File(await self.client.image_generator.render_plt(job), "journey.png")]
                             embed.set_image(url="attachment://journey.png")
                         else:
                             attachments = []
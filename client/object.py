@@ -17,10 +17,17 @@ import ijson.backends.yajl2_c as ijson
 
 import discord
 from client import funcs
+from client.aggregates import Aggregates
+from client.spatial import SpatialIndex
+from client.rankings import Rankings
+from client.snapshot import Snapshot
+from client.search import SearchIndex
 import traceback
 
 import random
 import os
+import json
+import hashlib
 
 class Area():
     def __init__(self, town : client_pre.object.Town, verticies : list, name : str = None):
@@ -44,6 +51,7 @@ class Area():
     
     def set_verticies(self, verticies : list[tuple[float]]):
         self.__verticies = verticies
+        self.__polygon_cache = None
 
     @property 
     def polygon(self):
@@ -136,6 +144,8 @@ class Object():
 
         if self.name not in world._objects[self.object_type + "s"]:
             world._objects[self.object_type + "s"].append(self)
+            world.search_indexes[self.object_type].add(self.name, self)
+            world.entities_version += 1
         else:
             for o in world._objects[self.object_type + "s"]:
                 if o == self.name:
@@ -165,14 +175,8 @@ class Object():
             self.total_value, 
             res_count, 
             self.total_area,
-            db.CreationField.external_query(
-                self.world.client.chat_mentions_table, "mentions", [db.CreationCondition("object_type", self.object_type), db.CreationCondition("object_name", self.name)], query_attribute="amount"
-            ), 
-            db.CreationField.external_query(
-                    self.world.client.activity_table, 
-                    "duration", 
-                    [db.CreationCondition("object_type", self.object_type), db.CreationCondition("object_name", self.name)]
-            ), 
+            self.world.aggregates.get_mentions(self.object_type, self.name), 
+            self.world.aggregates.get_activity(self.object_type, self.name), 
             datetime.datetime.now()
         ]
     
@@ -187,11 +191,15 @@ class Object():
     async def mention_count(self): return (await self.total_mentions)[0]
 
     @property 
-    def total_residents(self) -> int: return self.__total(self.towns, "resident_count")
+    def towns(self) -> list[Town]:
+        return self.world.get_member_towns(self.object_type, self.name)
+    
     @property 
-    def total_area(self) -> int: return self.__total(self.towns, "area")
+    def total_residents(self) -> int: return self.world.get_total(self.object_type, self.name, "residents")
     @property 
-    def total_value(self) -> float: return self.__total(self.towns, "bank")
+    def total_area(self) -> int: return self.world.get_total(self.object_type, self.name, "area")
+    @property 
+    def total_value(self) -> float: return self.world.get_total(self.object_type, self.name, "bank")
     @property 
     def total_detached_area(self) -> int: return self.__total(self.towns, "detached_area")
     @property
@@ -246,9 +254,7 @@ class Object():
             self.total_value,
             self.total_residents,
             self.total_area,
-            db.CreationField.external_query(
-                self.world.client.chat_mentions_table, "mentions", [db.CreationCondition("object_type", self.object_type), db.CreationCondition("object_name", self.name)], query_attribute="amount"
-            )
+            self.world.aggregates.get_mentions(self.object_type, self.name)
         ]
 
     def __str__(self):
@@ -261,10 +267,6 @@ class Nation(Object):
     def __init__(self, world, name : str):
         super().__init__(world, name, "nation")
     
-    @property 
-    def towns(self) -> list[Town]:
-        return [t for t in self.world.towns if t.nation == self]
-
     @property 
     def capital(self) -> Town:
         for town in self.towns:
@@ -280,15 +282,11 @@ class Nation(Object):
         borders_towns = []
         borders_nations = []
 
-        multi = MultiPolygon()
         for nation_town in self.towns:
-            multi = multi.union(nation_town.locations)
-        
-        for town in self.world.towns:
-            nation = town.nation 
+            for town in self.world.spatial_index.towns_intersecting(nation_town.locations):
+                nation = town.nation 
 
-            if nation and nation != self and town not in borders_towns:
-                if multi.intersects(town.locations):
+                if nation and nation != self and town not in borders_towns:
                     borders_towns.append(town)
         
         for town in borders_towns:
@@ -301,8 +299,7 @@ class Nation(Object):
     async def top_rankings(self) -> dict[str, list[int, int]]:
         rankings = {}
         for command in setup.top_commands["nation"]:
-            value = (await self.world.client.objects_table.get_record(conditions=[db.CreationCondition("type", "nation"), db.CreationCondition("name", self.name)], attributes=[command["attribute"]])).attribute(command["attribute"])
-            ranking = await self.world.client.objects_table.count_rows(conditions=[db.CreationCondition("type", "nation"), db.CreationCondition(command["attribute"], value, ">")])
+            value, ranking = self.world.rankings.get("nation", command["attribute"], self.name)
             if command.get("reverse_notable"): ranking = len(self.world.nations)-ranking-1
             notable = True if ranking <= len(self.world.nations)/2 else False
             rankings[command.get("name") or command.get("attribute")] = [value, ranking+1, notable]
@@ -354,26 +351,18 @@ class Nation(Object):
         return [r.attribute("current_name") for r in rs]
 
     def to_record_history(self):
-        cond_objects = [db.CreationCondition("type", "nation"), db.CreationCondition("name", self.name)]
-
         return [
             self.name, 
             datetime.date.today(), 
-            db.CreationField.external_query(self.world.client.objects_table, "towns", cond_objects),
-            db.CreationField.external_query(self.world.client.objects_table, "town_balance", cond_objects),
-            db.CreationField.external_query(self.world.client.objects_table, "residents", cond_objects),
+            len(self.towns),
+            self.total_value,
+            self.total_residents,
             str(self.capital), 
             str(self.capital.mayor), 
-            db.CreationField.external_query(self.world.client.objects_table, "area", cond_objects),
-            db.CreationField.external_query(
-                    self.world.client.activity_table, 
-                    "duration", 
-                    [db.CreationCondition("object_type", "nation"), db.CreationCondition("object_name", self.name)]
-            ),
+            self.total_area,
+            self.world.aggregates.get_activity("nation", self.name),
             self.name,
-            db.CreationField.external_query(
-                self.world.client.chat_mentions_table, "mentions", [db.CreationCondition("object_type", self.object_type), db.CreationCondition("object_name", self.name)], query_attribute="amount"
-            )
+            self.world.aggregates.get_mentions(self.object_type, self.name)
         ]
     
     def to_record_day_history(self):
@@ -399,10 +388,6 @@ class Culture(Object):
     def __init__(self, world, name : str):
         super().__init__(world, name, "culture")
     
-    @property 
-    def towns(self) -> list[Town]:
-        return [t for t in self.world.towns if t.culture == self]
-    
     @property 
     def nation_make_up(self) -> typing.Dict[str, int]:
         d = {}
@@ -418,10 +403,6 @@ class Religion(Object):
     def __init__(self, world, name : str):
         super().__init__(world, name, "religion")
     
-    @property 
-    def towns(self) -> list[Town]:
-        return [t for t in self.world.towns if t.religion == self]
-    
     @property 
     def nation_make_up(self) -> typing.Dict[str, int]:
         d = {}
@@ -468,6 +449,7 @@ class Town():
 
         self.outpost_spawns : list[Point] = []
         self.__areas : list[Area] = []
+        self.__area : int = None # Worked out when first needed after the geometry changes
 
         self.search_boost = 0
 
@@ -492,6 +474,12 @@ class Town():
 
         self.last_updated : datetime.datetime = None
 
+        # Change detection. Hashes of the raw map payload and the last rows written
+        self._geometry_hash : str = None 
+        self._marker_hash : int = None
+        self._last_record : list = None 
+        self._last_history : list = None
+
     def is_point_in_town(self, point : Point) -> bool:
         try:
             return self.locations.contains(Point(point.x, point.z))
@@ -519,13 +507,16 @@ class Town():
 
     @property 
     def area(self) -> int:
-        return round((self.locations.area)/256)
+        if self.__area is None:
+            self.__area = round((self.locations.area)/256)
+        return self.__area
 
     @property 
     async def likely_residents(self) -> list[Player]:
         pls = []
-        for player in self.__world.players:
-            if await player.likely_residency == self:
+        for player_name in [self._mayor_raw] + self.__world.aggregates.likely_residents.get(self.name, []):
+            player = self.__world.get_player(player_name, False)
+            if player and player not in pls and self.__world.get_likely_residency(player_name) == self:
                 pls.append(player)
         return pls
 
@@ -577,10 +568,9 @@ class Town():
     def borders(self) -> list[client_pre.object.Town]:
         borders = []
 
-        for town in self.__world.towns:
+        for town in self.__world.spatial_index.towns_intersecting(self.locations):
             if town != self and town.name not in setup.DEFAULT_TOWNS and True not in [l in town.name for l in setup.DEFAULT_TOWNS_SUBSTRING]:
-                if self.locations.intersects(town.locations):
-                    borders.append(town)
+                borders.append(town)
         
         return borders
     
@@ -608,8 +598,7 @@ class Town():
     async def top_rankings(self) -> dict[str, list[int, int]]:
         rankings = {}
         for command in setup.top_commands["town"]:
-            value = (await self.__world.client.towns_table.get_record(conditions=[db.CreationCondition("name", self.name)], attributes=[command["attribute"]])).attribute(command["attribute"])
-            ranking = await self.__world.client.towns_table.count_rows(conditions=[db.CreationCondition(command["attribute"], value, ">")])
+            value, ranking = self.__world.rankings.get("town", command["attribute"], self.name)
             if command.get("reverse_notable"): ranking = len(self.__world.towns)-ranking-1
             notable = True if ranking <= len(self.__world.towns)/5 else False
             rankings[command.get("name") or command.get("attribute")] = [value, ranking+1, notable]
@@ -676,25 +665,14 @@ class Town():
             0,
             len(self.outposts),
             0,
-            db.CreationField.external_query(
-                    self.__world.client.activity_table, 
-                    "duration", 
-                    [db.CreationCondition("object_type", "town"), db.CreationCondition("object_name", self.name)]
-            ),
+            self.__world.aggregates.get_activity("town", self.name),
             self.last_updated
         ]
     
     def to_record_update(self) -> list:
         r = self.to_record()
-        r[-3] = db.CreationField.external_query(
-                    self.__world.client.visited_towns_table, 
-                    "visited_players", 
-                    [db.CreationCondition("town", self.name)],
-                    query_attribute="COUNT(*)"
-        )
-        r[-5] = db.CreationField.external_query(
-            self.__world.client.chat_mentions_table, "mentions", [db.CreationCondition("object_type", "town"), db.CreationCondition("object_name", self.name)], query_attribute="amount"
-        )
+        r[-3] = self.__world.aggregates.visited_players.get(self.name, 0)
+        r[-5] = self.__world.aggregates.get_mentions("town", self.name)
         return r
     
     def to_record_history(self) -> list:
@@ -711,16 +689,10 @@ class Town():
             self.public,
             self.peaceful,
             self.area,
-            db.CreationField.external_query(
-                    self.__world.client.activity_table, 
-                    "duration", 
-                    [db.CreationCondition("object_type", "town"), db.CreationCondition("object_name", self.name)]
-            ),
-            db.CreationField.external_query(self.__world.client.visited_towns_table, "visited_players", [db.CreationCondition("town", self.name)], query_attribute="COUNT(*)"),
+            self.__world.aggregates.get_activity("town", self.name),
+            self.__world.aggregates.visited_players.get(self.name, 0),
             self.name,
-            db.CreationField.external_query(
-                self.__world.client.chat_mentions_table, "mentions", [db.CreationCondition("object_type", "town"), db.CreationCondition("object_name", self.name)], query_attribute="amount"
-            )
+            self.__world.aggregates.get_mentions("town", self.name)
         ]
     
     def to_record_day_history(self) -> list:
@@ -774,10 +746,13 @@ class Town():
             self.public = True if "true" in groups[11] else False
             #self.peaceful = True if "true" in groups[12] else False
 
+            self.__world._index_town(self)
+
         self.__desc = desc
     
     def clear_areas(self):
         self.__areas = []
+        self.__area = None
         self.outpost_spawns = []
 
     async def set_marker(self, data : dict):
@@ -806,6 +781,7 @@ class Town():
             self.__areas.append(a)
         else:
             self.__areas[self.__areas.index(a)].set_verticies(locs)
+        self.__area = None
         
         
         self.last_updated = datetime.datetime.now()
@@ -886,8 +862,7 @@ class Player():
     async def top_rankings(self) -> dict[str, list[int, int]]:
         rankings = {}
         for command in setup.top_commands["player"]:
-            value = (await self.__world.client.players_table.get_record(conditions=[db.CreationCondition("name", self.name)], attributes=[command["attribute"]])).attribute(command["attribute"])
-            ranking = await self.__world.client.players_table.count_rows(conditions=[db.CreationCondition(command["attribute"], value, ">")])
+            value, ranking = self.__world.rankings.get("player", command["attribute"], self.name)
             if command.get("reverse_notable"): ranking = len(self.__world.players)-ranking-1
             notable = True if ranking <= len(self.__world.players)/10 else False
             rankings[command.get("name") or command.get("attribute")] = [value, ranking+1, notable]
@@ -904,11 +879,7 @@ class Player():
 
     @property 
     def town(self) -> Town:
-        nearby_town = None
-
-        for town in self.__world.towns:
-            if town.is_point_in_town(self.location):
-                nearby_town = town
+        nearby_town = self.__world.spatial_index.town_at(self.location.x, self.location.z) if self.location else None
 
         self._town_cache = nearby_town
         return nearby_town
@@ -952,21 +923,7 @@ class Player():
     
     @property 
     async def likely_residency(self) -> Town:
-
-        for town in self.__world.towns:
-            if town._mayor_raw == self.name:
-                return town 
-        
-        r = await self.__world.client.visited_towns_table.get_record(
-            [db.CreationCondition("player", self.name), db.CreationCondition("towns.name", None, "is not")], 
-            ["visited_towns.town AS town", "towns.resident_count AS residents"], 
-            group=["visited_towns.town"], 
-            order=db.CreationOrder("visited_towns.duration", db.types.OrderDescending),
-            join=db.CreationTableJoin(self.__world.client.towns_table, "visited_towns.town", "towns.name", "left") # Remove towns which don't exist anymore
-        )
-
-        if r and r.attribute("residents") != 1: # If town has one resident and player is not mayor they cannot be a resident
-            return self.__world.get_town(r.attribute("town"), False)
+        return self.__world.get_likely_residency(self.name)
     
     @property 
     async def exists_in_db(self):
@@ -1033,23 +990,10 @@ class Player():
 
     def to_record_update(self) -> list:
         r = self.to_record()
-        r[-6] = db.CreationField.external_query(
-                    self.__world.client.visited_towns_table, 
-                    "visited_towns", 
-                    [db.CreationCondition("player", self.name)],
-                    query_attribute="COUNT(*)"
-        )
-        r[-2] = db.CreationField.external_query(
-                    self.__world.client.activity_table, 
-                    "duration", 
-                    [db.CreationCondition("object_type", "player"), db.CreationCondition("object_name", self.name)]
-        )
-        r[-4] = db.CreationField.external_query(
-                    self.__world.client.chat_message_counts_table, "messages", [db.CreationCondition("player", self.name)], query_attribute="amount"
-        )
-        r[-3] = db.CreationField.external_query(
-                    self.__world.client.chat_mentions_table, "mentions", [db.CreationCondition("object_type", "player"), db.CreationCondition("object_name", self.name)], query_attribute="amount"
-        )
+        r[-6] = self.__world.aggregates.visited_towns.get(self.name, 0)
+        r[-2] = self.__world.aggregates.get_activity("player", self.name)
+        r[-4] = self.__world.aggregates.get_messages(self.name)
+        r[-3] = self.__world.aggregates.get_mentions("player", self.name)
         return r
     
     async def to_record_history(self) -> list:
@@ -1057,16 +1001,12 @@ class Player():
         return [
             self.name, 
             datetime.date.today(), 
-            db.CreationField.external_query(self.__world.client.players_table, "duration", db.CreationCondition("name", self.name)), 
-            db.CreationField.external_query(self.__world.client.visited_towns_table, "visited_towns", [db.CreationCondition("player", self.name)], query_attribute="COUNT(*)"),
+            self.__world.aggregates.get_activity("player", self.name), 
+            self.__world.aggregates.visited_towns.get(self.name, 0),
             likely.name if likely else None,
             likely.nation.name if likely and likely.nation else None,
-            db.CreationField.external_query(
-                    self.__world.client.chat_message_counts_table, "messages", [db.CreationCondition("player", self.name)], query_attribute="amount"
-            ),
-            db.CreationField.external_query(
-                    self.__world.client.chat_mentions_table, "mentions", [db.CreationCondition("object_type", "player"), db.CreationCondition("object_name", self.name)], query_attribute="amount"
-            )
+            self.__world.aggregates.get_messages(self.name),
+            self.__world.aggregates.get_mentions("player", self.name)
         ]
     
     async def to_record_day_history(self) -> list:
@@ -1093,7 +1033,16 @@ class World():
         self.client = client
 
         self.__towns : dict[str, Town] = {}
+        self.__towns_list : list[Town] = None
         self.__players : dict[str, Player] = {}
+
+        # Towns by nation/culture/religion name and running totals for each. Kept up to date by _index_town
+        self.__members : dict[str, dict[str, dict[str, Town]]] = {"nation":{}, "culture":{}, "religion":{}}
+        self.__totals : dict[tuple[str, str], dict[str, float]] = {}
+        self.__town_index : dict[str, dict] = {}
+        self.__mayors : dict[str, Town] = {}
+        self.entities_version = 0 # Bumped whenever a town, player or object is added or removed
+        self.search_indexes : dict[str, SearchIndex] = {"town":SearchIndex(), "player":SearchIndex(), "nation":SearchIndex(), "culture":SearchIndex(), "religion":SearchIndex()}
         self._objects : dict[str, list[Object]] = {
             "nations":[],
             "cultures":[],
@@ -1105,6 +1054,11 @@ class World():
 
         self.towns_with_players : typing.Dict[str, typing.List[Player]] = {}
         self.last_refreshed : datetime.datetime = None
+
+        self.aggregates = Aggregates(client)
+        self.spatial_index = SpatialIndex()
+        self.snapshot = Snapshot(client)
+        self.rankings = Rankings()
         
 
     def get_object(self, array : list, name : str, search=False, multiple=False, max=25):
@@ -1120,47 +1074,36 @@ class World():
         if multiple:
             return multi
 
+    def __get_indexed(self, object_type : str, name : str, multiple : bool, max : int):
+        results = self.search_indexes[object_type].search(name, max if multiple else 1)
+        if multiple:
+            return results
+        return results[0] if len(results) > 0 else None
+
     def get_town(self, town_name : str, search=False, multiple=False, max=25) -> Town:
         if not search and not multiple:
             return self.__towns.get(town_name)
-        
-        multi = []
-
-        i=0
-        for town in sorted(self.__towns, key = lambda x: (x.lower()==town_name.lower(),self.__towns[x].search_boost), reverse=True):
-            if town_name.replace(" ", "_").lower() in str(town).replace(" ", "_").lower():
-                if not multiple: return self.__towns[town]
-                i+=1
-                multi.append(self.__towns[town])
-                if i >= max: break
-        
-        if multiple:
-            return multi 
+        return self.__get_indexed("town", town_name, multiple, max)
 
     def get_player(self, player_name : str, search=True, multiple=False, max=25) -> Player:
         if not search and not multiple:
             return self.__players.get(player_name)
-        
-        multi = []
-        i=0
-        for player in sorted(self.__players, key = lambda x: (x.lower()==player_name.lower(),self.__players[x].search_boost), reverse=True):
-            if player_name.replace(" ", "_").lower() in str(player).replace(" ", "_").lower():
-                if not multiple: return self.__players[player]
-                i += 1
-                multi.append(self.__players[player])
-                if i >= max: break
-
-        if multiple:
-            return multi
+        return self.__get_indexed("player", player_name, multiple, max)
 
     def get_nation(self, nation_name : str, search=False, multiple=False, max=25) -> Nation:
-        return self.get_object(self.nations, nation_name, search, multiple, max)
+        if not search and not multiple:
+            return self.search_indexes["nation"].get(nation_name)
+        return self.__get_indexed("nation", nation_name, multiple, max)
     
     def get_culture(self, culture_name : str, search=False, multiple=False, max=25) -> Culture:
-        return self.get_object(self.cultures, culture_name, search, multiple, max)
+        if not search and not multiple:
+            return self.search_indexes["culture"].get(culture_name)
+        return self.__get_indexed("culture", culture_name, multiple, max)
     
     def get_religion(self, religion_name : str, search=False, multiple=False, max=25) -> Religion:
-        return self.get_object(self.religions, religion_name, search, multiple, max)
+        if not search and not multiple:
+            return self.search_indexes["religion"].get(religion_name)
+        return self.__get_indexed("religion", religion_name, multiple, max)
     
     def search(self, get_func : callable, query : str, max : int = 25) -> list:
         return get_func(query, True, True, max)
@@ -1187,7 +1130,10 @@ class World():
 
     @property 
     def towns(self) -> list[Town]:
-        return list(self.__towns.values())
+        """Cached. Don't modify the returned list"""
+        if self.__towns_list is None:
+            self.__towns_list = list(self.__towns.values())
+        return self.__towns_list
     @property 
     def players(self) -> list[Player]:
         return list(self.__players.values() )
@@ -1217,18 +1163,82 @@ class World():
                 ps.append(p)
         return ps
     
-    def __total(self, arr : list, attr : str):
-        t = 0
-        for o in arr:
-            t += getattr(o, attr) or 0
-        return t
-
     @property 
-    def total_residents(self) -> int: return self.__total(self.towns, "resident_count")
+    def total_residents(self) -> int: return self.get_total("world", None, "residents")
     @property 
-    def total_area(self) -> int: return self.__total(self.towns, "area")
+    def total_area(self) -> int: return self.get_total("world", None, "area")
     @property 
-    def total_value(self) -> float: return self.__total(self.towns, "bank")
+    def total_value(self) -> float: return self.get_total("world", None, "bank")
+
+    def get_member_towns(self, object_type : str, name : str) -> list[Town]:
+        return list((self.__members[object_type].get(name) or {}).values())
+    
+    def get_likely_residency(self, player_name : str) -> typing.Optional[Town]:
+        if player_name in self.__mayors:
+            return self.__mayors[player_name]
+        
+        likely = self.aggregates.likely_towns.get(player_name)
+        if likely and likely[1] != 1: # If town has one resident and player is not mayor they cannot be a resident
+            return self.get_town(likely[0], False)
+    
+    def get_total(self, object_type : str, name : str, attribute : str) -> float:
+        totals = self.__totals.get((object_type, name))
+        return totals[attribute] if totals else 0
+    
+    def __apply_town_entry(self, town_name : str, town : Town, entry : dict, sign : int):
+        if entry["mayor"]:
+            if sign > 0:
+                self.__mayors[entry["mayor"]] = town
+            elif self.__mayors.get(entry["mayor"]) and self.__mayors[entry["mayor"]].name == town_name:
+                del self.__mayors[entry["mayor"]]
+
+        for object_type in self.__members:
+            object_name = entry[object_type]
+            keys = [("world", None)]
+            if object_name:
+                members = self.__members[object_type].setdefault(object_name, {})
+                if sign > 0:
+                    members[town_name] = town
+                else:
+                    members.pop(town_name, None)
+                    if len(members) == 0:
+                        del self.__members[object_type][object_name]
+                keys.append((object_type, object_name))
+            
+            for key in keys:
+                if key[0] == "world" and object_type != "nation": # Only count world totals once
+                    continue
+                totals = self.__totals.setdefault(key, {"residents":0, "area":0, "bank":0})
+                for attribute in totals:
+                    totals[attribute] += sign*entry[attribute]
+
+    def _index_town(self, town : Town, area : int = None):
+        """Update membership and totals for a town. Area is only recalculated if passed, or the first time a town is seen"""
+        old = self.__town_index.get(town.name)
+        if area is None:
+            area = old["area"] if old else town.area
+        
+        entry = {
+            "nation":town.nation.name if town.nation else None, 
+            "culture":town.culture.name if town.culture else None, 
+            "religion":town.religion.name if town.religion else None, 
+            "residents":town.resident_count or 0, 
+            "area":area or 0, 
+            "bank":town.bank or 0,
+            "mayor":town._mayor_raw
+        }
+        if old == entry:
+            return
+        
+        if old:
+            self.__apply_town_entry(town.name, town, old, -1)
+        self.__apply_town_entry(town.name, town, entry, 1)
+        self.__town_index[town.name] = entry
+    
+    def _unindex_town(self, town_name : str):
+        old = self.__town_index.pop(town_name, None)
+        if old:
+            self.__apply_town_entry(town_name, None, old, -1)
 
     @property 
     async def total_activity(self) -> Activity:
@@ -1260,8 +1270,15 @@ class World():
 
     def _remove_player(self, player_name : str):
         del self.__players[player_name]
+        self.search_indexes["player"].remove(player_name)
+        self.entities_version += 1
     def _remove_town(self, town_name : str):
+        self._unindex_town(town_name)
         del self.__towns[town_name]
+        self.search_indexes["town"].remove(town_name)
+        self.__towns_list = None
+        self.entities_version += 1
+        self.spatial_index.update(self.towns)
     def _remove_nation(self, nation_name : str):
         rm = []
         for nation in self._objects["nations"]:
@@ -1269,9 +1286,12 @@ class World():
                 rm.append(nation)
         for r in rm:
             self._objects["nations"].remove(r)
+        self.search_indexes["nation"].remove(nation_name)
+        self.entities_version += 1
         
 
-    async def refresh(self, map : StreamReader, map_data : StreamReader):
+    async def refresh(self, map : StreamReader, map_data : StreamReader = None):
+        """map_data is None when markers haven't changed since the last refresh. Towns aren't re-parsed"""
 
         objects_map = ijson.kvitems_async(map, "", use_float=True)
         
@@ -1286,18 +1306,26 @@ class World():
             else:
                 continue
         
-        objects_map_data = ijson.kvitems_async(map_data, "sets.towny.markerset", use_float=True)
-        areas = {}
-        markers = {}
-        async for o in objects_map_data:
-            if o[0] == "areas":
-                areas = o[1]
-            elif o[0] == "markers":
-                markers = o[1]
-            else:
-                continue
-
-        await self.__update_town_list(areas, markers)
+        await self.aggregates.refresh()
+
+        if map_data:
+            objects_map_data = ijson.kvitems_async(map_data, "sets.towny.markerset", use_float=True)
+            areas = {}
+            markers = {}
+            async for o in objects_map_data:
+                if o[0] == "areas":
+                    areas = o[1]
+                elif o[0] == "markers":
+                    markers = o[1]
+                else:
+                    continue
+
+            await self.__update_town_list(areas, markers)
+        else: # Towns are unchanged but still on the map
+            now = datetime.datetime.now()
+            for town in self.towns:
+                if town._geometry_hash is not None: # Towns gone from the map in the last full parse stay gone, so they get culled
+                    town.last_updated = now
         await self.__update_global()
         if player_list: # Has to be done after towns are found
             self.towns_with_players = await self.__update_player_list(player_list)
@@ -1305,6 +1333,18 @@ class World():
         await self.__update_objects()
         await self.__update_town_tracking()
         await self.__update_nations()
+        await self.snapshot.refresh()
+        self.rankings.refresh(self.snapshot)
+        for index in self.search_indexes.values(): # Boosts are areas and resident counts, which may have changed
+            index.invalidate_order()
+        
+        today = datetime.date.today()
+        for object_type in ["town", "player", "nation", "object", "global"]:
+            self.client.history_catalogue.add_date(object_type, today)
+        for town in self.towns:
+            self.client.history_catalogue.add_name("town", town.name)
+        for nation in self.nations:
+            self.client.history_catalogue.add_name("nation", nation.name)
         
         self.last_refreshed = datetime.datetime.now()
 
@@ -1344,7 +1384,6 @@ class World():
     async def __update_nations(self):
         add_nation_history = []
         new_records_activity= []
-        add_nation_day_history = []
 
         for nation in self.nations:
             
@@ -1355,6 +1394,7 @@ class World():
                 new_records_activity.append(nation.to_record_activity())
             else:
                 await self.client.activity_table.update_record(cond3, *nation.to_record_activity_update(self.towns_with_players))
+            self.aggregates.add_activity("nation", nation.name, self.client.refresh_period*sum(len(ps) for t, ps in self.towns_with_players.items() if t in nation.towns))
 
             cond2 = [db.CreationCondition("nation", nation.name), db.CreationCondition("date", datetime.date.today())]
             exists = await self.client.nation_history_table.record_exists(cond2)
@@ -1363,14 +1403,9 @@ class World():
                     add_nation_history.append(nation.to_record_history())
                 else:
                     await self.client.nation_history_table.update_record(cond2, *nation.to_record_history())
-                
-                cond3 = [db.CreationCondition("nation", nation.name), db.CreationCondition("time", datetime.datetime.now()-setup.today_tracking_period, ">")]
-                exists = await self.client.nation_day_history_table.record_exists(cond3)
-                if not exists or datetime.datetime.now().minute in setup.production_today_tracking_minutes:
-                    cond3[1] = db.CreationCondition("time", datetime.datetime.now()-datetime.timedelta(minutes=5), ">")
-                    exists2 = await self.client.nation_day_history_table.record_exists(cond3)
-                    if not exists2:
-                        add_nation_day_history.append(nation.to_record_day_history())
+
+                record = nation.to_record_day_history()
+                self.client.history_today.record("nation", record[0], record[2:], record[1])
             except Exception as e:
                 # Nation needs to be removed! Should be removed on next pass from Client.cull_db()
                 await self.client.bot.get_channel(setup.alert_channel).send(f"{nation.name} Nation Tracking Update Error! `{e}`"[:2000])
@@ -1381,8 +1416,6 @@ class World():
             await self.client.activity_table.add_record(new_records_activity)
         if len(add_nation_history) > 0:
             await self.client.nation_history_table.add_record(add_nation_history)
-        if len(add_nation_day_history) > 0:
-            await self.client.nation_day_history_table.add_record(add_nation_day_history)
 
     async def __update_global(self):
 
@@ -1399,12 +1432,9 @@ class World():
             await self.client.global_history_table.add_record(await self.to_record_history())
         else:
             await self.client.global_history_table.update_record(cond, *await self.to_record_history())
-        
-        exists = await self.client.global_day_history_table.record_exists([db.CreationCondition("time", datetime.datetime.now()-setup.today_tracking_period, ">")])
-        if not exists or datetime.datetime.now().minute in setup.production_today_tracking_minutes:
-            exists2 = await self.client.global_day_history_table.record_exists([db.CreationCondition("time", datetime.datetime.now()-datetime.timedelta(minutes=5), ">")])
-            if not exists2:
-                await self.client.global_day_history_table.add_record(await self.to_record_day_history())
+
+        record = await self.to_record_day_history()
+        self.client.history_today.record("global", None, record[1:], record[0])
 
     async def __update_town_list(self, areas : dict[str, dict], markers : dict[str, dict]):
 
@@ -1417,79 +1447,118 @@ class World():
                     outposts[town_name] = []
                 outposts[town_name].append(Point(marker_data["x"], marker_data["y"], marker_data["z"]))
         
-        for town in self.__towns.values():
-            town.clear_areas()
-        
+        # Group areas by town so each town is only handled once
+        town_areas : dict[str, dict[str, dict]] = {}
         for area_name, area in areas.items():
             if area.get("set") != "siegewar.markerset":
+                label = area.get("label")
                 
-                try:
-                    
-                    if area["label"] in setup.DONT_TRACK_TOWNS:
-                        continue 
+                if label in setup.DONT_TRACK_TOWNS:
+                    continue 
 
-                    if True in [su in area["label"] for su in setup.DEFAULT_TOWNS_SUBSTRING]:
-                        continue
+                if True in [su in str(label) for su in setup.DEFAULT_TOWNS_SUBSTRING]:
+                    continue
 
-                    if area["label"] not in self.__towns:
-                        
-                        t = Town(self)
-                        await t.add_area(area_name, area)
-                        
-                        if markers.get(f"{t.name}__home"):
-                            self.__towns[area["label"]] = t
-                    else:
-                        t = self.get_town(area["label"], False)
+                if label not in town_areas:
+                    town_areas[label] = {}
+                town_areas[label][area_name] = area
+        
+        geometry_changed : list[Town] = []
+        
+        for town in self.__towns.values():
+            if town.name not in town_areas and town._geometry_hash is not None: # No longer on the map
+                town.clear_areas()
+                town._geometry_hash = None
+                geometry_changed.append(town)
+        
+        now = datetime.datetime.now()
+        for town_name, t_areas in town_areas.items():
+            try:
+                marker = markers.get(f"{town_name}__home")
+
+                t = self.get_town(town_name, False)
+                if not t:
+                    if not marker:
+                        continue
+                    t = Town(self)
+                
+                # Only rebuild geometry or re-parse the description if the raw data has changed
+                geometry_hash = hashlib.blake2b(json.dumps([(area_name, area.get("x"), area.get("z"), area.get("color"), area.get("fillcolor")) for area_name, area in sorted(t_areas.items())]).encode(), digest_size=16).hexdigest() # Stable between restarts, as cached maps are keyed by it
+                if geometry_hash != t._geometry_hash:
+                    t.clear_areas()
+                    for area_name, area in t_areas.items():
                         await t.add_area(area_name, area)
-                    
-                    if markers.get(f"{t.name}__home"):
-                        await t.set_marker(markers[f"{t.name}__home"])
-                    if t.name in outposts:
-                        await t.set_outposts(outposts[t.name])
-                    #await asyncio.sleep(0.001) # Allow "parallel" processing
-                    
-                except Exception as e:
-                    # Error with town add. Town may need to be removed!
-                    await self.client.bot.get_channel(setup.alert_channel).send(f"{area.get('label')} Town Update Error! `{e}`"[:2000])
+                    t._geometry_hash = geometry_hash
+                    geometry_changed.append(t)
+                
+                if town_name not in self.__towns:
+                    self.__towns[town_name] = t
+                    self.search_indexes["town"].add(town_name, t)
+                    self.__towns_list = None
+                    self.entities_version += 1
+                
+                if marker:
+                    marker_hash = hash(json.dumps(marker, sort_keys=True))
+                    if marker_hash != t._marker_hash:
+                        await t.set_marker(marker)
+                        t._marker_hash = marker_hash
+                await t.set_outposts(outposts.get(town_name) or [])
+
+                t.last_updated = now
+                
+            except Exception as e:
+                # Error with town add. Town may need to be removed!
+                await self.client.bot.get_channel(setup.alert_channel).send(f"{town_name} Town Update Error! `{e}`"[:2000])
+        
+        self.spatial_index.update(self.towns)
+        for town in geometry_changed: # Recalculate areas
+            self._index_town(town, town.area)
     
     async def __update_town_tracking(self):
         new_records = []
         add_town_history = []
-        add_town_day_history = []
         new_records_activity = []
+        seen_towns = []
         for town in self.towns:
             try:
-                # Add town activity
+                players = self.towns_with_players.get(town.name) or []
+
+                # Add town activity. Rows are known to exist once a town has been written this session
                 cond3 = [db.CreationCondition("object_name", town.name), db.CreationCondition("object_type", "town")]
-                exists = await self.client.activity_table.record_exists(cond3)
+                exists = town._last_record is not None or await self.client.activity_table.record_exists(cond3)
                 if not exists:
                     new_records_activity.append(town.to_record_activity())
-                else:
-                    await self.client.activity_table.update_record(cond3, *town.to_record_activity_update(self.towns_with_players.get(town.name) or []))
+                elif len(players) > 0:
+                    await self.client.activity_table.update_record(cond3, *town.to_record_activity_update(players))
+                self.aggregates.add_activity("town", town.name, self.client.refresh_period*len(players))
 
-                
+                # Only rewrite the town's row if something other than last_seen has changed
                 cond = db.CreationCondition(self.client.towns_table.primary_key, town.name)
-                exists = await self.client.towns_table.record_exists(cond)
-                if not exists:
-                    new_records.append(town.to_record())
+                if town._last_record is None and not await self.client.towns_table.record_exists(cond):
+                    record = town.to_record()
+                    new_records.append(record)
+                    town._last_record = record
                 else:
-                    await self.client.towns_table.update_record([cond], *town.to_record_update())
+                    record = town.to_record_update()
+                    if record[:-1] != (town._last_record or [])[:-1]:
+                        await self.client.towns_table.update_record([cond], *record)
+                        town._last_record = record
+                    else:
+                        seen_towns.append((town.last_updated, town.name))
             
                 # Add town history
-                cond2 = [db.CreationCondition("town", town.name), db.CreationCondition("date", datetime.date.today())]
-                exists = await self.client.town_history_table.record_exists(cond2)
-                if not exists:
-                    add_town_history.append(town.to_record_history())
-                else:
-                    await self.client.town_history_table.update_record(cond2, *town.to_record_history())
-                
-                cond3 = [db.CreationCondition("town", town.name), db.CreationCondition("time", datetime.datetime.now()-setup.today_tracking_period, ">")]
-                exists = await self.client.town_day_history_table.record_exists(cond3)
-                if not exists or datetime.datetime.now().minute in setup.production_today_tracking_minutes:
-                    cond3[1] = db.CreationCondition("time", datetime.datetime.now()-datetime.timedelta(minutes=5), ">")
-                    exists2 = await self.client.town_day_history_table.record_exists(cond3)
-                    if not exists2:
-                        add_town_day_history.append(town.to_record_day_history())
+                record = town.to_record_history()
+                if record != town._last_history:
+                    cond2 = [db.CreationCondition("town", town.name), db.CreationCondition("date", datetime.date.today())]
+                    exists = (town._last_history is not None and town._last_history[1] == record[1]) or await self.client.town_history_table.record_exists(cond2)
+                    if not exists:
+                        add_town_history.append(record)
+                    else:
+                        await self.client.town_history_table.update_record(cond2, *record)
+                    town._last_history = record
+
+                record = town.to_record_day_history()
+                self.client.history_today.record("town", record[0], record[2:], record[1])
                 
             except Exception as e:
                 # Error with town add. Town may need to be removed!
@@ -1499,10 +1568,10 @@ class World():
             await self.client.activity_table.add_record(new_records_activity)
         if len(new_records) > 0:
             await self.client.towns_table.add_record(new_records)
+        if len(seen_towns) > 0:
+            await self.client.database.connection.executemany("UPDATE towns SET last_seen = ? WHERE name = ?", seen_towns)
         if len(add_town_history) > 0:
                 await self.client.town_history_table.add_record(add_town_history)
-        if len(add_town_day_history) > 0:
-            await self.client.town_day_history_table.add_record(add_town_day_history)
 
     async def initialise_player_list(self):
         players = await self.client.players_table.get_records()
@@ -1517,13 +1586,14 @@ class World():
             p.donator = bool(player.attribute("donator")) if player.attribute("donator") else None
 
             self.__players[p.name] = p
+            self.search_indexes["player"].add(p.name, p)
+            self.entities_version += 1
 
     async def __update_player_list(self, players : list[dict]):
-        add_players = []
-        add_visited_towns = []
-        add_player_history = []
-        add_player_day_history =[]
-        new_records_activity = []
+        records_activity = []
+        records_players = []
+        records_player_history = []
+        records_visited_towns = []
         online_players : list[str] = []
 
         towns_with_players : dict[str, list[Player]] = {}
@@ -1539,61 +1609,48 @@ class World():
                 
                 p = Player(self)
                 self.__players[player_data["account"]] = p
+                self.search_indexes["player"].add(player_data["account"], p)
+                self.entities_version += 1
             p.update(player_data)
 
-            # Add activity
-            cond3 = [db.CreationCondition("object_name", p.name), db.CreationCondition("object_type", "player")]
-            exists = await self.client.activity_table.record_exists(cond3)
-            if not exists:
-                new_records_activity.append(p.to_record_activity())
-            else:
-                await self.client.activity_table.update_record(cond3, *p.to_record_activity_update())
-
+            self.aggregates.add_activity("player", p.name, self.client.refresh_period)
+            town = p._town_cache
+            if town:
+                self.aggregates.add_visit(p.name, town.name)
 
-            cond = db.CreationCondition(self.client.players_table.primary_key, p.name)
-            exists = await self.client.players_table.record_exists(cond)
-            if not exists:
-                add_players.append(p.to_record())
-            else:
-                await self.client.players_table.update_record([cond], *p.to_record_update())
-            
-            # Add player history
-            cond2 = [db.CreationCondition("player", p.name), db.CreationCondition("date", datetime.date.today())]
-            exists = await self.client.player_history_table.record_exists(cond2)
-            if not exists:
-                add_player_history.append(await p.to_record_history())
-            else:
-                await self.client.player_history_table.update_record(cond2, *(await p.to_record_history()))
+            records_activity.append(p.to_record_activity())
+            records_players.append(p.to_record_update())
+            records_player_history.append(await p.to_record_history())
             
-            cond3 = [db.CreationCondition("player", p.name), db.CreationCondition("time", datetime.datetime.now()-setup.today_tracking_period, ">")]
-            exists = await self.client.player_day_history_table.record_exists(cond3)
-            if not exists:
-                add_player_day_history.append(await p.to_record_day_history())
-            
-            town = p._town_cache
             if town:
                 if town.name not in towns_with_players:
                     towns_with_players[town.name] = []
                 towns_with_players[town.name].append(p)
 
-                conds = [db.CreationCondition(self.client.visited_towns_table.attribute("player"), p.name), db.CreationCondition(self.client.visited_towns_table.attribute("town"), town.name)]
-                exists = await self.client.visited_towns_table.record_exists(conds)
+                records_visited_towns.append([p.name, town.name, self.client.refresh_period, datetime.datetime.now()])
+        
+        # One upsert per table
+        await self.client.activity_table.upsert_records(
+            records_activity, ["object_type", "object_name"], 
+            [db.CreationField.add("duration", self.client.refresh_period), "last"]
+        )
+        await self.client.players_table.upsert_records(
+            records_players, ["name"], 
+            [a.name for a in self.client.players_table.attributes if a.name != "name"]
+        )
+        await self.client.player_history_table.upsert_records(
+            records_player_history, ["player", "date"], 
+            [a.name for a in self.client.player_history_table.attributes if a.name not in ["player", "date"]]
+        )
 
-                if not exists:
-                    add_visited_towns.append([p.name, town.name, self.client.refresh_period, datetime.datetime.now()])
-                else:
-                    await self.client.visited_towns_table.update_record(conds, *[p.name, town.name, db.CreationField.add("duration", self.client.refresh_period), datetime.datetime.now()])
+        for name in online_players:
+            record = await self.__players[name].to_record_day_history()
+            self.client.history_today.record("player", record[0], record[2:], record[1])
         
-        if len(new_records_activity) > 0:
-            await self.client.activity_table.add_record(new_records_activity)
-        if len(add_players) > 0:
-            await self.client.players_table.add_record(add_players)
-        if len(add_visited_towns) > 0:
-            await self.client.visited_towns_table.add_record(add_visited_towns)
-        if len(add_player_history) > 0:
-            await self.client.player_history_table.add_record(add_player_history)
-        if len(add_player_day_history) > 0:
-            await self.client.player_day_history_table.add_record(add_player_day_history)
+        await self.client.visited_towns_table.upsert_records(
+            records_visited_towns, ["player", "town"], 
+            [db.CreationField.add("duration", self.client.refresh_period), "last"]
+        )
         
         for player in self.players:
             if player.online and player.name not in online_players:
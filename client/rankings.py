@@ -0,0 +1,28 @@
+from __future__ import annotations
+import typing
+
+import numpy as np
+
+import setup
+from client.snapshot import Columns, Snapshot
+
+class Rankings():
+    """Every town, nation and player's place on each setup.top_commands leaderboard. Worked out once per refresh"""
+    def __init__(self):
+        self.columns : dict[str, Columns] = {}
+        self.ranks : dict[str, dict[str, np.ndarray]] = {} # object_type: {attribute: number ranked above, aligned with columns}
+
+    def refresh(self, snapshot : Snapshot):
+        columns, ranks = {}, {}
+        for object_type in ["town", "player", "nation"]:
+            columns[object_type] = snapshot.get(object_type)
+            ranks[object_type] = {command["attribute"]:columns[object_type].ranks(command["attribute"]) for command in setup.top_commands[object_type]}
+        self.columns, self.ranks = columns, ranks
+
+    def get(self, object_type : str, attribute : str, name : str) -> tuple[typing.Any, int]:
+        """(value, number ranked above). Not yet ranked is (None, 0)"""
+        columns = self.columns.get(object_type)
+        i = columns.index.get(name) if columns else None
+        if i is None or attribute not in self.ranks[object_type]:
+            return (None, 0)
+        return (columns.get(attribute, name), int(self.ranks[object_type][attribute][i]))
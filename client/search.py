@@ -0,0 +1,94 @@
+from __future__ import annotations
+import typing
+
+import heapq
+
+class SearchIndex():
+    """Normalised names with a trigram index, so searches and autocompletes don't sort and scan everything on each keystroke.
+    Results are exact matches first, then by search_boost"""
+    def __init__(self):
+        self.__objects : dict[str, typing.Any] = {}
+        self.__keys : dict[str, str] = {}
+        self.__lower : dict[str, list[str]] = {} # For exact matches
+        self.__trigrams : dict[str, set[str]] = {}
+
+        self.__order : dict[str, int] = None # name: position by search_boost
+        self.__ordered_names : list[str] = []
+
+    @staticmethod
+    def normalise(name : str) -> str:
+        return name.replace(" ", "_").lower()
+
+    @staticmethod
+    def __trigrams_of(key : str) -> set[str]:
+        return {key[i:i+3] for i in range(len(key)-2)}
+
+    def __len__(self):
+        return len(self.__objects)
+
+    def get(self, name : str):
+        return self.__objects.get(name)
+
+    def add(self, name : str, object):
+        if name in self.__objects:
+            self.remove(name)
+
+        key = self.normalise(name)
+        self.__objects[name] = object
+        self.__keys[name] = key
+        self.__lower.setdefault(name.lower(), []).append(name)
+        for trigram in self.__trigrams_of(key):
+            self.__trigrams.setdefault(trigram, set()).add(name)
+
+        self.__order = None
+
+    def remove(self, name : str):
+        if name not in self.__objects:
+            return
+
+        key = self.__keys.pop(name)
+        del self.__objects[name]
+        self.__lower[name.lower()].remove(name)
+        if len(self.__lower[name.lower()]) == 0:
+            del self.__lower[name.lower()]
+        for trigram in self.__trigrams_of(key):
+            self.__trigrams[trigram].discard(name)
+            if len(self.__trigrams[trigram]) == 0:
+                del self.__trigrams[trigram]
+
+        self.__order = None
+
+    def invalidate_order(self):
+        """Call when search boosts may have changed"""
+        self.__order = None
+
+    def __ordered(self) -> dict[str, int]:
+        if self.__order is None:
+            self.__ordered_names = sorted(self.__objects, key=lambda name: getattr(self.__objects[name], "search_boost", 0), reverse=True)
+            self.__order = {name:i for i, name in enumerate(self.__ordered_names)}
+        return self.__order
+
+    def search(self, query : str, max : int = 25, include : typing.Callable[[str], bool] = None) -> list:
+        """include: optionally filter names"""
+        order = self.__ordered()
+        key = self.normalise(query)
+
+        exact = sorted((name for name in self.__lower.get(query.lower(), []) if not include or include(name)), key=order.get)
+        names = exact[:max]
+        remaining = max - len(names)
+
+        if remaining > 0:
+            if len(key) < 3: # Most names match short queries, so a scan in boost order finishes quickly
+                for name in self.__ordered_names:
+                    if key in self.__keys[name] and name not in exact and (not include or include(name)):
+                        names.append(name)
+                        remaining -= 1
+                        if remaining == 0:
+                            break
+            else:
+                sets = sorted((self.__trigrams.get(trigram, set()) for trigram in self.__trigrams_of(key)), key=len)
+                candidates = set.intersection(*sets) if len(sets[0]) > 0 else set()
+                matches = [name for name in candidates if key in self.__keys[name] and name not in exact and (not include or include(name))]
+                names += heapq.nsmallest(remaining, matches, key=order.get)
+
+        return [self.__objects[name] for name in names]
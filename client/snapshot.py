@@ -0,0 +1,128 @@
+from __future__ import annotations
+import typing
+if typing.TYPE_CHECKING:
+    import client as client_pre
+
+import datetime
+
+import numpy as np
+
+class Columns():
+    """Current values of one object type as numpy arrays, one row per name. Missing (NULL) values are NaN"""
+    def __init__(self, attributes : list[str], rows : list[list]):
+        self.names : list[str] = [row[attributes.index("name")] for row in rows] if "name" in attributes else []
+        self.index : dict[str, int] = {name:i for i, name in enumerate(self.names)}
+
+        self.__kinds : dict[str, str] = {}
+        self.__columns : dict[str, np.ndarray] = {}
+        for i, attribute in enumerate(attributes):
+            values = [row[i] for row in rows]
+            kind = self.__kind_of(values)
+            self.__kinds[attribute] = kind
+            if kind == "string":
+                self.__columns[attribute] = np.array(values, dtype=object)
+            else:
+                self.__columns[attribute] = np.array([np.nan if v is None else self.__to_number(kind, v) for v in values], dtype=np.float64)
+
+    def __len__(self):
+        return len(self.names)
+
+    @staticmethod
+    def __kind_of(values : list) -> str:
+        types = {type(v) for v in values if v is not None}
+        if datetime.datetime in types:
+            return "datetime"
+        if datetime.date in types:
+            return "date"
+        if types and types <= {int, bool}:
+            return "int"
+        if types and types <= {int, bool, float}:
+            return "float"
+        return "string" if types else "int"
+
+    @staticmethod
+    def __to_number(kind : str, value) -> float:
+        if kind == "datetime":
+            return value.timestamp()
+        if kind == "date":
+            return value.toordinal()
+        return value
+
+    def kind(self, expression : str) -> str:
+        if "/" in expression:
+            a, b = expression.split("/")
+            return "int" if self.kind(a) == "int" and self.kind(b) == "int" else "float"
+        return self.__kinds.get(expression, "int")
+
+    def column(self, expression : str) -> np.ndarray:
+        """An attribute, or attribute/attribute. Division matches SQLite: whole numbers give whole numbers and dividing by 0 is NULL"""
+        if "/" not in expression:
+            values = self.__columns.get(expression)
+            return np.full(len(self.names), np.nan) if values is None else values
+
+        a, b = expression.split("/")
+        x, y = self.column(a), self.column(b)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            values = np.where(y != 0, x / y, np.nan)
+        return np.trunc(values) if self.kind(expression) == "int" else values
+
+    def to_value(self, expression : str, raw) -> typing.Any:
+        kind = self.kind(expression)
+        if kind == "string":
+            return raw
+        if np.isnan(raw):
+            return None
+        if kind == "datetime":
+            return datetime.datetime.fromtimestamp(raw)
+        if kind == "date":
+            return datetime.date.fromordinal(int(raw))
+        return int(raw) if kind == "int" else float(raw)
+
+    def get(self, expression : str, name : str) -> typing.Any:
+        i = self.index.get(name)
+        return None if i is None else self.to_value(expression, self.column(expression)[i])
+
+    def mask(self, attribute : str, value) -> np.ndarray:
+        return self.column(attribute) == value
+
+    def ordered(self, expression : str, mask : np.ndarray = None) -> list[tuple[str, typing.Any]]:
+        """(name, value) from highest to lowest, with NULLs last like ORDER BY ... DESC"""
+        values = self.column(expression)
+        rows = np.arange(len(self.names)) if mask is None else np.flatnonzero(mask)
+        rows = rows[np.argsort(-values[rows], kind="stable")]
+        return [(self.names[i], self.to_value(expression, values[i])) for i in rows]
+
+    def total(self, expression : str, mask : np.ndarray = None) -> typing.Union[int, float]:
+        values = self.column(expression)
+        total = np.nansum(values if mask is None else values[mask])
+        return int(total) if self.kind(expression) == "int" else float(total)
+
+    def ranks(self, expression : str) -> np.ndarray:
+        """Number of rows with a greater value, 0 for NULLs"""
+        values = self.column(expression)
+        ranked = np.sort(values[~np.isnan(values)])
+        ranks = len(ranked) - np.searchsorted(ranked, values, side="right")
+        ranks[np.isnan(values)] = 0
+        return ranks
+
+class Snapshot():
+    """Towns, players, nations, cultures and religions as written by the last refresh, for commands which rank or total them"""
+    def __init__(self, client : client_pre.Client):
+        self.client = client
+
+        self.columns : dict[str, Columns] = {}
+
+    async def refresh(self):
+        columns = {}
+        for object_type, table in [("town", self.client.towns_table), ("player", self.client.players_table)]:
+            columns[object_type] = Columns([a.name for a in table.attributes], [[f.value for f in r.fields] for r in await table.get_records()])
+
+        attributes = [a.name for a in self.client.objects_table.attributes]
+        objects = [[f.value for f in r.fields] for r in await self.client.objects_table.get_records()]
+        for object_type in ["nation", "culture", "religion"]:
+            columns[object_type] = Columns(attributes, [row for row in objects if row[attributes.index("type")] == object_type])
+
+        self.columns = columns
+
+    def get(self, object_type : str) -> Columns:
+        return self.columns.get(object_type) or Columns([], [])
@@ -0,0 +1,70 @@
+from __future__ import annotations
+import typing
+if typing.TYPE_CHECKING:
+    import client as client_pre
+
+import shapely
+from shapely.geometry import Point, box
+from shapely.strtree import STRtree
+
+class SpatialIndex():
+    """STRtree over every town area. Rebuilt only when town geometry changes"""
+    def __init__(self):
+        self.__tree : STRtree = None
+        self.__polygons : list = []
+        self.__towns : list[client_pre.object.Town] = []
+
+        self.__signature : int = None
+
+    def _geometry_signature(self, towns : list[client_pre.object.Town]) -> int:
+        return hash(tuple((town.name, town._geometry_hash) for town in towns))
+
+    def update(self, towns : list[client_pre.object.Town]) -> bool:
+        """Rebuild if geometry has changed. Returns whether it was rebuilt"""
+        signature = self._geometry_signature(towns)
+        if signature == self.__signature:
+            return False
+
+        polygons = []
+        polygon_towns = []
+        for town in towns:
+            for area in town.areas:
+                if len(area.raw_verticies) < 3: # Not a valid polygon
+                    continue
+                polygons.append(area.polygon)
+                polygon_towns.append(town)
+
+        shapely.prepare(polygons)
+
+        self.__polygons = polygons
+        self.__towns = polygon_towns
+        self.__tree = STRtree(polygons) if len(polygons) > 0 else None
+        self.__signature = signature
+
+        return True
+
+    def __unique_towns(self, indexes) -> list[client_pre.object.Town]:
+        towns = []
+        for i in indexes:
+            if self.__towns[i] not in towns:
+                towns.append(self.__towns[i])
+        return towns
+
+    def town_at(self, x : float, z : float) -> typing.Optional[client_pre.object.Town]:
+        if not self.__tree:
+            return None
+
+        point = Point(x, z)
+        for i in self.__tree.query(point):
+            if self.__polygons[i].contains(point):
+                return self.__towns[i]
+
+    def towns_intersecting(self, geometry) -> list[client_pre.object.Town]:
+        if not self.__tree:
+            return []
+        return self.__unique_towns(self.__tree.query(geometry, predicate="intersects"))
+
+    def towns_in_bbox(self, min_x : float, min_z : float, max_x : float, max_z : float) -> list[client_pre.object.Town]:
+        if not self.__tree:
+            return []
+        return self.__unique_towns(self.__tree.query(box(min_x, min_z, max_x, max_z), predicate="intersects"))
@@ -0,0 +1,128 @@
+from __future__ import annotations
+import typing
+
+import asyncio
+import datetime
+import os
+import pickle
+
+import numpy as np
+
+class Ring():
+    """Fixed number of slots, each holding the last values written in its step (every write if step is 0)"""
+    __slots__ = ("step", "times", "values", "head", "count", "bucket")
+
+    def __init__(self, step : int, size : int, width : int):
+        self.step = step
+        self.times = np.full(size, np.nan)
+        self.values = np.full((size, width), np.nan)
+        self.head = 0 # Next slot to write to
+        self.count = 0
+        self.bucket : int = None
+
+    def write(self, time : float, values : list):
+        bucket = int(time // self.step) if self.step else None
+        if bucket is None or bucket != self.bucket or self.count == 0:
+            i = self.head
+            self.head = (self.head + 1) % len(self.times)
+            self.count = min(self.count + 1, len(self.times))
+            self.bucket = bucket
+        else:
+            i = (self.head - 1) % len(self.times)
+
+        self.times[i] = time
+        self.values[i] = values
+
+    @property
+    def full(self) -> bool:
+        return self.count == len(self.times)
+
+    @property
+    def oldest(self) -> typing.Optional[float]:
+        if self.count == 0:
+            return None
+        return self.times[self.head] if self.full else self.times[0]
+
+    @property
+    def newest(self) -> typing.Optional[float]:
+        if self.count == 0:
+            return None
+        return self.times[(self.head - 1) % len(self.times)]
+
+    def read(self, column : int, since : float) -> tuple[np.ndarray, np.ndarray]:
+        indexes = (np.arange(self.count) + self.head - self.count) % len(self.times)
+        times = self.times[indexes]
+        values = self.values[indexes, column]
+        mask = (times >= since) & ~np.isnan(values)
+        return times[mask], values[mask]
+
+class TimeSeriesStore():
+    """Round robin history for towns, nations, players and the world at a few resolutions.
+    Writing is O(1) and the size is fixed, so nothing needs deleting. Kept in memory and pickled to one file"""
+    def __init__(self, path : str, attributes : dict[str, list[str]], resolutions : dict[str, list[tuple[int, int]]]):
+        self.path = path
+        self.attributes = attributes
+        self.resolutions = resolutions
+
+        self.series : dict[tuple[str, str], list[Ring]] = {}
+
+    def record(self, object_type : str, name : typing.Optional[str], values : list, time : datetime.datetime = None):
+        """values in the order of attributes[object_type]"""
+        key = (object_type, name)
+        if key not in self.series:
+            self.series[key] = [Ring(step, size, len(self.attributes[object_type])) for step, size in self.resolutions[object_type]]
+
+        timestamp = (time or datetime.datetime.now()).timestamp()
+        values = [np.nan if v is None else v for v in values]
+        for ring in self.series[key]:
+            ring.write(timestamp, values)
+
+    def read(self, object_type : str, name : typing.Optional[str], attribute : str, since : datetime.datetime) -> list[tuple[datetime.datetime, typing.Union[int, float]]]:
+        """Values from the finest resolution that goes back to since. Oldest first"""
+        rings = self.series.get((object_type, name))
+        if not rings or attribute not in self.attributes[object_type]:
+            return []
+
+        since = since.timestamp()
+        ring = rings[-1]
+        for r in rings: # Finest first. A full ring is a step short of its whole span, so allow that
+            if r.count > 0 and (not r.full or r.oldest <= since + r.step):
+                ring = r
+                break
+
+        times, values = ring.read(self.attributes[object_type].index(attribute), since)
+        return [(datetime.datetime.fromtimestamp(t), int(v) if float(v).is_integer() else float(v)) for t, v in zip(times, values)]
+
+    def names(self, object_type : str, since : datetime.datetime) -> list[str]:
+        """Names with values since"""
+        since = since.timestamp()
+        return [name for (t, name), rings in self.series.items() if t == object_type and rings[0].count > 0 and rings[0].newest >= since]
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            data = pickle.load(f)
+        # Series are only kept if they were stored with the same layout
+        for key, rings in data["series"].items():
+            object_type = key[0]
+            if data["attributes"].get(object_type) == self.attributes.get(object_type) and [(r.step, len(r.times)) for r in rings] == [tuple(r) for r in self.resolutions[object_type]]:
+                self.series[key] = rings
+
+    def __evict(self):
+        now = datetime.datetime.now().timestamp()
+        for key, rings in list(self.series.items()):
+            span = max(r.step * len(r.times) for r in rings)
+            if rings[-1].newest is not None and now - rings[-1].newest > span:
+                del self.series[key]
+
+    async def save(self):
+        self.__evict()
+        # Pickled here so the series can't change part way through, written in a thread
+        data = pickle.dumps({"attributes":self.attributes, "series":self.series}, protocol=pickle.HIGHEST_PROTOCOL)
+        await asyncio.to_thread(self.__write, data)
+
+    def __write(self, data : bytes):
+        with open(self.path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(self.path + ".tmp", self.path)
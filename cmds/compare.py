@@ -50,9 +50,9 @@ class Compare(commands.GroupCog, name="compare", description="Compare two (or mo
         attributes = s.compare_attributes["town"]
 
         async def im_map(twns : list[client.object.Town]):
-            dpi = await self.client.image_generator.generate_area_map(twns, True, False, self.client.image_generator.MapBackground.AUTO, False, None, [], True, (1.25, 0.92+(0.08*len(twns))))
-            await self.client.image_generator.layer_spawn_connections(twns)
-            return await self.client.image_generator.render_plt(dpi, None)
+            job = await self.client.image_generator.generate_area_map(twns, True, False, self.client.image_generator.MapBackground.AUTO, False, None, [], True, (1.25, 0.92+(0.08*len(twns))))
+            await self.client.image_generator.layer_spawn_connections(job, twns)
+            return await self.client.image_generator.render_plt(job)
         image_generators.append((im_map, (towns,)))
 
         for _, attribute in enumerate(attributes):
@@ -74,14 +74,14 @@ class Compare(commands.GroupCog, name="compare", description="Compare two (or mo
                 if not attribute.get('no_history') and not attribute.get('qualitative'):
                     total =  total + value
                     history_r = await self.client.town_history_table.get_records([db.CreationCondition("town", town.name)], order=db.CreationOrder("date", db.types.OrderAscending), attributes=[history_name, "date"])
-                    graph.add_line(self.client.image_generator.Line([self.client.image_generator.Vertex(r.attribute("date"), r.attribute(history_name)) for r in history_r], town.name))
+                    graph.add_line(self.client.image_generator.Line(x=[r.attribute("date") for r in history_r], y=[r.attribute(history_name) for r in history_r], name=town.name))
             
             if not attribute.get("qualitative"):
                 y = attribute.get("y") or display_name
                 if not attribute.get("no_history"):
                     async def plot_lines(graph, display_name, y):
-                        await self.client.image_generator.plot_linegraph(graph, f"{display_name} Comparison", "Date", y)
-                        return await self.client.image_generator.render_plt(s.IMAGE_DPI_GRAPH, pad=True)
+                        job = await self.client.image_generator.plot_linegraph(graph, f"{display_name} Comparison", "Date", y)
+                        return await self.client.image_generator.render_plt(job, pad=True)
                     image_generators.append((plot_lines, (graph,display_name,y)))
             
             total = total if type(total) == int else round(total, 2)
@@ -134,9 +134,9 @@ class Compare(commands.GroupCog, name="compare", description="Compare two (or mo
         if interaction.extras.get("author"): embed._author = interaction.extras.get("author")
         
         async def im_map(twns : list[client.object.Town], capitals : list[client.object.Town]):
-            dpi = await self.client.image_generator.generate_area_map(twns, True, False, self.client.image_generator.MapBackground.AUTO, False, None, [], True, (1.25, 0.92+(0.08*len(capitals))))
-            await self.client.image_generator.layer_spawn_connections(capitals)
-            return await self.client.image_generator.render_plt(dpi, None)
+            job = await self.client.image_generator.generate_area_map(twns, True, False, self.client.image_generator.MapBackground.AUTO, False, None, [], True, (1.25, 0.92+(0.08*len(capitals))))
+            await self.client.image_generator.layer_spawn_connections(job, capitals)
+            return await self.client.image_generator.render_plt(job)
         image_generators.append((im_map, (twns, capitals)))
 
         attributes = s.compare_attributes["nation"]
@@ -159,14 +159,14 @@ class Compare(commands.GroupCog, name="compare", description="Compare two (or mo
                 if not attribute.get('no_history') and not attribute.get('qualitative'):
                     total += value
                     history_r = await self.client.nation_history_table.get_records([db.CreationCondition("nation", nation.name)], order=db.CreationOrder("date", db.types.OrderAscending), attributes=[history_name, "date"])
-                    graph.add_line(self.client.image_generator.Line([self.client.image_generator.Vertex(r.attribute("date"), r.attribute(history_name)) for r in history_r], nation.name))
+                    graph.add_line(self.client.image_generator.Line(x=[r.attribute("date") for r in history_r], y=[r.attribute(history_name) for r in history_r], name=nation.name))
             
             if not attribute.get("qualitative"):
                 y = attribute.get("y") or display_name
                 if not attribute.get("no_history"):
                     async def plot_lines(graph, display_name, y):
-                        await self.client.image_generator.plot_linegraph(graph, f"{display_name} Comparison", "Date", y)
-                        return await self.client.image_generator.render_plt(s.IMAGE_DPI_GRAPH, pad=True)
+                        job = await self.client.image_generator.plot_linegraph(graph, f"{display_name} Comparison", "Date", y)
+                        return await self.client.image_generator.render_plt(job, pad=True)
                     image_generators.append((plot_lines, (graph,display_name,y)))
             
             total = total if type(total) == int else round(total, 2)
@@ -214,11 +214,11 @@ class Compare(commands.GroupCog, name="compare", description="Compare two (or mo
         if interaction.extras.get("author"): embed._author = interaction.extras.get("author")
 
         async def im_map(players : list[client.object.Player]):
-            await self.client.image_generator.init_map()
+            job = await self.client.image_generator.init_map()
 
-            await self.client.image_generator.layer_player_locations(players, [], show_background=True, expand_limits_multiplier=(1.4, 0.92+(0.08*len(players))))
-            await self.client.image_generator.layer_spawn_connections(players)
-            return await self.client.image_generator.render_plt(s.IMAGE_DPI_DRAWING, None)
+            await self.client.image_generator.layer_player_locations(job, players, [], show_background=True, expand_limits_multiplier=(1.4, 0.92+(0.08*len(players))))
+            await self.client.image_generator.layer_spawn_connections(job, players)
+            return await self.client.image_generator.render_plt(job)
         image_generators.append((im_map, (players,)))
 
         attributes = s.compare_attributes["player"]
@@ -241,14 +241,14 @@ class Compare(commands.GroupCog, name="compare", description="Compare two (or mo
                 if not attribute.get('no_history') and not attribute.get('qualitative'):
                     total += value
                     history_r = await self.client.player_history_table.get_records([db.CreationCondition("player", player.name)], order=db.CreationOrder("date", db.types.OrderAscending), attributes=[history_name, "date"])
-                    graph.add_line(self.client.image_generator.Line([self.client.image_generator.Vertex(r.attribute("date"), r.attribute(history_name)) for r in history_r], player.name))
+                    graph.add_line(self.client.image_generator.Line(x=[r.attribute("date") for r in history_r], y=[r.attribute(history_name) for r in history_r], name=player.name))
             
             if not attribute.get("qualitative"):
                 y = attribute.get("y") or display_name
                 if not attribute.get("no_history"):
                     async def plot_lines(graph, display_name, y):
-                        await self.client.image_generator.plot_linegraph(graph, f"{display_name} Comparison", "Date", y)
-                        return await self.client.image_generator.render_plt(s.IMAGE_DPI_GRAPH, pad=True)
+                        job = await self.client.image_generator.plot_linegraph(graph, f"{display_name} Comparison", "Date", y)
+                        return await self.client.image_generator.render_plt(job, pad=True)
                     image_generators.append((plot_lines, (graph,display_name,y)))
             
             total = total if type(total) == int else round(total, 2)
@@ -7,8 +7,6 @@ from funcs import paginator, autocompletes, commands_view
 from discord import app_commands
 from discord.ext import commands
 
-import db
-
 import client
 
 def generate_command(c : client.Client, attribute : str, formatter = str, parser = None, is_nation=False, is_culture=False, is_religion=False,attname : str = None):
@@ -29,28 +27,30 @@ def generate_command(c : client.Client, attribute : str, formatter = str, parser
             typeatt = "religion"
             if not o: raise client.errors.MildError("Nothing found!")
 
-        rs = await c.towns_table.get_records(conditions=[db.CreationCondition(typeatt, o.name)], attributes=["name", attribute], order=db.CreationOrder(attribute, db.types.OrderDescending))
-        total = await c.towns_table.total_column(attribute, conditions=[db.CreationCondition(typeatt, o.name)])
+        columns = c.world.snapshot.get("town")
+        members = columns.mask(typeatt, o.name)
+        rs = columns.ordered(attribute, members)
+        total = columns.total(attribute, members)
 
         attnameformat = attname.replace('_', ' ')
 
         log = ""
         values : list[c.image_generator.Vertex] = []
-        for i, record in enumerate(rs):
-            parsed = parser(record.attribute(attribute)) if parser else record.attribute(attribute)
-            name = str(record.attribute('name').replace("_", " "))
+        for i, (r_name, value) in enumerate(rs):
+            parsed = parser(value) if parser else value
+            name = str(r_name.replace("_", " "))
             val = formatter(parsed)
-            perc = (record.attribute(attribute)/total)*100
+            perc = (value/total)*100
 
             log = log + f"{i+1}. **{discord.utils.escape_markdown(name)}**: {val} ({perc:,.1f}%)\n"
 
             if int(parsed) > 0:
                 values.append(c.image_generator.Vertex(name, int(parsed)))
 
-        await c.image_generator.plot_piechart(
+        job = await c.image_generator.plot_piechart(
             values[:s.top_graph_object_count], f"{o.name_formatted}'s distribution of {attnameformat} ({len(rs)})"
         )
-        graph = discord.File(await c.image_generator.render_plt(s.IMAGE_DPI_GRAPH, pad=True), "graph.png")
+        graph = discord.File(await c.image_generator.render_plt(job, pad=True), "graph.png")
 
         embed = discord.Embed(title=f"{o.name_formatted}'s distribution of {attnameformat} ({len(rs)} towns)", color=s.embed)
         if interaction.extras.get("author"): embed._author = interaction.extras.get("author")
@@ -1,5 +1,6 @@
 
 import discord 
+import io
 
 import setup as s
 from funcs import autocompletes, commands_view, paginator
@@ -164,9 +165,9 @@ class Get(commands.GroupCog, name="get", description="All get commands"):
                     if item.label == "Expand Outposts":
                         item.disabled = True 
                 
-                c = self.client.image_generator.town_cache_item(f"TownOutposts+{town.name}", [town]).check_cache()
-                dpi = await self.client.image_generator.generate_area_map([town], True, True, self.client.image_generator.MapBackground.AUTO, False, c, borders)
-                file = discord.File(await self.client.image_generator.render_plt(dpi, c), "town_outpost_map.png")
+                c = self.client.image_generator.town_cache_item(f"TownOutposts+{town.name}", [town])
+                job = await self.client.image_generator.generate_area_map([town], True, True, self.client.image_generator.MapBackground.AUTO, False, c, borders)
+                file = discord.File(await self.client.image_generator.render_plt(job, c), "town_outpost_map.png")
 
                 interaction.message.embeds[0].set_thumbnail(url=None)
                 interaction.message.embeds[0].set_image(url="attachment://town_outpost_map.png")
@@ -180,9 +181,9 @@ class Get(commands.GroupCog, name="get", description="All get commands"):
         c_view.add_command(commands_view.Command("history town bank", "Bank History", (town.name,), button_style=discord.ButtonStyle.secondary, emoji="💵", row=2))
         c_view.add_command(commands_view.Command("history town residents", "Resident History", (town.name,), button_style=discord.ButtonStyle.secondary, emoji="👤", row=2))
         
-        c = self.client.image_generator.town_cache_item(f"Town+{town.name}", [town]).check_cache()
-        dpi = await self.client.image_generator.generate_area_map([town], True, False, self.client.image_generator.MapBackground.OFF, False, c, borders)
-        file = discord.File(await self.client.image_generator.render_plt(dpi, c), "town_map.png")
+        c = self.client.image_generator.town_cache_item(f"Town+{town.name}", [town], "thumbnail")
+        job = await self.client.image_generator.generate_area_map([town], True, False, self.client.image_generator.MapBackground.OFF, False, c, borders)
+        file = discord.File(await self.client.image_generator.render_plt(job, c), "town_map.png")
         embed.set_thumbnail(url="attachment://town_map.png")
 
         return await interaction.response.edit_message(embed=embed, attachments=[file], view=c_view) if edit else await interaction.response.send_message(embed=embed, file=file, view=c_view)
@@ -253,9 +254,9 @@ class Get(commands.GroupCog, name="get", description="All get commands"):
                     if type(item) == discord.ui.Button and item.label == "Expand Outposts":
                         item.disabled = True 
 
-                c = self.client.image_generator.town_cache_item(f"NationOutposts+{nation.name}", nation.towns).check_cache()
-                dpi = await self.client.image_generator.generate_area_map(nation.towns, True, True, self.client.image_generator.MapBackground.AUTO, False, c, nation.borders[1])
-                file = discord.File(await self.client.image_generator.render_plt(dpi, c), "nation_map_outposts.png")
+                c = self.client.image_generator.town_cache_item(f"NationOutposts+{nation.name}", nation.towns)
+                job = await self.client.image_generator.generate_area_map(nation.towns, True, True, self.client.image_generator.MapBackground.AUTO, False, c, nation.borders[1])
+                file = discord.File(await self.client.image_generator.render_plt(job, c), "nation_map_outposts.png")
 
                 interaction.message.embeds[0].set_thumbnail(url=None)
                 interaction.message.embeds[0].set_image(url="attachment://nation_map_outposts.png")
@@ -282,15 +283,15 @@ class Get(commands.GroupCog, name="get", description="All get commands"):
             cmds.append(commands_view.Command("get town", town.name_formatted, (town.name,), emoji=None))
         c_view.add_item(commands_view.CommandSelect(self, cmds, "Get Town Info...", 3))
 
-        c = self.client.image_generator.town_cache_item(f"Nation+{nation.name}", nation.towns).check_cache()
+        c = self.client.image_generator.town_cache_item(f"Nation+{nation.name}", nation.towns)
+        job = await self.client.image_generator.generate_area_map(nation.towns, True, False, self.client.image_generator.MapBackground.AUTO, False, c, nation.borders[1])
         if not c.valid and not edit:
             embed.set_image(url="attachment://map_waiting.jpg")
             await interaction.response.send_message(embed=embed, view=c_view, file=discord.File(s.waiting_bg_path, "map_waiting.jpg"))
         elif not c.valid:
             embed.set_image(url="attachment://nation_map.png")
             await interaction.response.edit_message(embed=embed, view=c_view)
-        dpi = await self.client.image_generator.generate_area_map(nation.towns, True, False, self.client.image_generator.MapBackground.AUTO, False, c, nation.borders[1])
-        file = discord.File(await self.client.image_generator.render_plt(dpi, c), "nation_map.png")
+        file = discord.File(await self.client.image_generator.render_plt(job, c), "nation_map.png")
         embed.set_image(url="attachment://nation_map.png")
         if c.valid and not edit:
             await interaction.response.send_message(embed=embed, view=c_view, file=file)
@@ -338,15 +339,15 @@ class Get(commands.GroupCog, name="get", description="All get commands"):
         c_view.add_command(commands_view.Command("history culture towns", "Town History", (culture.name,), button_style=discord.ButtonStyle.secondary, emoji="🗾", row=2))
         c_view.add_command(commands_view.Command("history culture residents", "Resident History", (culture.name,), button_style=discord.ButtonStyle.secondary, emoji="👤", row=2))
         
-        c = self.client.image_generator.town_cache_item(f"Culture+{culture.name}", culture.towns).check_cache()
+        c = self.client.image_generator.town_cache_item(f"Culture+{culture.name}", culture.towns)
+        job = await self.client.image_generator.generate_area_map(culture.towns, False, True, self.client.image_generator.MapBackground.AUTO, False, c)
         if not c.valid and not edit:
             embed.set_image(url="attachment://map_waiting.jpg")
             await interaction.response.send_message(embed=embed, view=c_view, file=discord.File(s.waiting_bg_path, "map_waiting.jpg"))
         elif not c.valid:
             embed.set_image(url="attachment://culture_map.png")
             await interaction.response.edit_message(embed=embed, view=c_view)
-        dpi = await self.client.image_generator.generate_area_map(culture.towns, False, True, self.client.image_generator.MapBackground.AUTO, False, c)
-        file = discord.File(await self.client.image_generator.render_plt(dpi, c), "culture_map.png")
+        file = discord.File(await self.client.image_generator.render_plt(job, c), "culture_map.png")
         embed.set_image(url="attachment://culture_map.png")
         if c.valid and not edit:
             await interaction.response.send_message(embed=embed, view=c_view, file=file)
@@ -394,15 +395,15 @@ class Get(commands.GroupCog, name="get", description="All get commands"):
         c_view.add_command(commands_view.Command("history religion towns", "Town History", (religion.name,), button_style=discord.ButtonStyle.secondary, emoji="🗾", row=2))
         c_view.add_command(commands_view.Command("history religion followers", "Follower History", (religion.name,), button_style=discord.ButtonStyle.secondary, emoji="👤", row=2))
         
-        c = self.client.image_generator.town_cache_item(f"Religion+{religion.name}", religion.towns).check_cache()
+        c = self.client.image_generator.town_cache_item(f"Religion+{religion.name}", religion.towns)
+        job = await self.client.image_generator.generate_area_map(religion.towns, False, True, self.client.image_generator.MapBackground.AUTO, False, c)
         if not c.valid and not edit:
             embed.set_image(url="attachment://map_waiting.jpg")
             await interaction.response.send_message(embed=embed, view=c_view, file=discord.File(s.waiting_bg_path, "map_waiting.jpg"))
         elif not c.valid:
             embed.set_image(url="attachment://religion_map.png")
             await interaction.response.edit_message(embed=embed, view=c_view)
-        dpi = await self.client.image_generator.generate_area_map(religion.towns, False, True, self.client.image_generator.MapBackground.AUTO, False, c)
-        file = discord.File(await self.client.image_generator.render_plt(dpi, c), "religion_map.png")
+        file = discord.File(await self.client.image_generator.render_plt(job, c), "religion_map.png")
         embed.set_image(url="attachment://religion_map.png")
         if c.valid and not edit:
             await interaction.response.send_message(embed=embed, view=c_view, file=file)
@@ -444,9 +445,9 @@ class Get(commands.GroupCog, name="get", description="All get commands"):
         c_view.add_command(commands_view.Command("history global residents", "Resident History", (), button_style=discord.ButtonStyle.secondary, emoji="👤", row=2))
         c_view.add_command(commands_view.Command("history global nations", "Nation History", (), button_style=discord.ButtonStyle.secondary, emoji="👑", row=2))
 
-        c = self.client.image_generator.town_cache_item(f"Global", world.towns).check_cache()
+        ready = self.client.image_generator.earth_tiles.ready
         
-        if not c.valid and not edit:
+        if not ready and not edit:
             embed.set_image(url="attachment://map_waiting.jpg")
             await interaction.response.send_message(embed=embed, file=discord.File(s.waiting_bg_path, "map_waiting.jpg"), view=c_view)
         elif edit:
@@ -454,10 +455,9 @@ class Get(commands.GroupCog, name="get", description="All get commands"):
             await interaction.response.edit_message(embed=embed, view=c_view)
         
         embed.set_image(url="attachment://earth_map.png")
-        dpi = await self.client.image_generator.generate_area_map(world.towns, False, True, self.client.image_generator.MapBackground.ON, True, c)
-        file = discord.File(await self.client.image_generator.render_plt(dpi, c), "earth_map.png")
+        file = discord.File(io.BytesIO(await self.client.image_generator.earth_map_png(world.towns)), "earth_map.png")
 
-        if edit or not c.valid:
+        if edit or not ready:
             await interaction.edit_original_response(embed=embed, view=c_view, attachments=[file])
         else:
             await interaction.response.send_message(embed=embed, view=c_view, file=file)
@@ -498,11 +498,9 @@ class Get(commands.GroupCog, name="get", description="All get commands"):
                 await interaction.response.defer()
 
                 embed.set_image(url="attachment://earth_map.png")
-                c = self.client.image_generator.town_cache_item(f"Global", world.towns).check_cache()
-                dpi = await self.client.image_generator.generate_area_map(world.towns, False, True, self.client.image_generator.MapBackground.ON, True, c)
-                if not c.valid: await self.client.image_generator.render_plt(dpi, c)
-                await self.client.image_generator.layer_player_locations(world.online_players, world.offline_players)
-                file = discord.File(await self.client.image_generator.render_plt(dpi, c), "earth_map.png")
+                job = await self.client.image_generator.earth_map(world.towns)
+                await self.client.image_generator.layer_player_locations(job, world.online_players, world.offline_players)
+                file = discord.File(await self.client.image_generator.render_plt(job), "earth_map.png")
 
                 return await interaction.followup.edit_message(embed=embed, attachments=[file], view=view, message_id=interaction.message.id)
 
@@ -511,8 +509,6 @@ class Get(commands.GroupCog, name="get", description="All get commands"):
         view.add_item(button)
 
 
-        c = self.client.image_generator.town_cache_item(f"Global", self.client.world.towns).check_cache()
-        
         if not edit:
             embed.set_image(url="attachment://map_waiting.jpg")
             await interaction.response.send_message(embed=embed, file=discord.File(s.waiting_bg_path, "map_waiting.jpg"), view=view)
@@ -521,12 +517,9 @@ class Get(commands.GroupCog, name="get", description="All get commands"):
             await interaction.response.edit_message(embed=embed, view=view)
         
         embed.set_image(url="attachment://earth_map.png")
-        dpi = await self.client.image_generator.generate_area_map(self.client.world.towns, False, True, self.client.image_generator.MapBackground.ON, True, c)
-        if not c.valid:
-            await self.client.image_generator.render_plt(dpi, c)
-
-        await self.client.image_generator.layer_player_locations(online_players, [])
-        file = discord.File(await self.client.image_generator.render_plt(dpi), "earth_map.png")
+        job = await self.client.image_generator.earth_map(self.client.world.towns)
+        await self.client.image_generator.layer_player_locations(job, online_players, [])
+        file = discord.File(await self.client.image_generator.render_plt(job), "earth_map.png")
 
         
         await interaction.edit_original_response(embed=embed, view=view, attachments=[file])
@@ -112,14 +112,14 @@ def generate_command(
         
         if not qualitative:
             lg = c.image_generator.LineGraph(c.image_generator.XTickFormatter.DATE, y_formatter)
-            lg.add_line(c.image_generator.Line([c.image_generator.Vertex(r.fields[0].value, r.fields[1].value) for r in rs]))
-            await c.image_generator.plot_linegraph(
+            lg.add_line(c.image_generator.Line(x=[r.fields[0].value for r in rs], y=[r.fields[1].value for r in rs]))
+            job = await c.image_generator.plot_linegraph(
                 lg, f"{name} {attnameformat} history", "Date", y or "Value"
             )
-            file = await c.image_generator.render_plt(s.IMAGE_DPI_GRAPH, pad=True)
+            file = await c.image_generator.render_plt(job, pad=True)
         else:
-            await c.image_generator.plot_timeline(timeline_points, f"{name} {attnameformat} history", boolean_values=parser==bool)
-            file = await c.image_generator.render_plt(s.IMAGE_DPI_GRAPH, pad=True)
+            job = await c.image_generator.plot_timeline(timeline_points, f"{name} {attnameformat} history", boolean_values=parser==bool)
+            file = await c.image_generator.render_plt(job, pad=True)
 
         graph = discord.File(file, filename="graph.png")
 
@@ -175,11 +175,8 @@ def generate_command_today(
     async def cmd_uni(interaction : discord.Interaction, town : str = None, player : str = None, nation : str = None, culture : str = None, religion : str = None):
 
         edit = interaction.extras.get("edit")
-        conditions = []
 
         o_type = "town" if town else "player" if player else "nation" if nation else "global"
-        table_name = "town_day_history" if town else "player_day_history" if player else "nation_day_history" if nation else "global_day_history"
-        name_attribute = "town" if town else "player" if player else "nation" if nation else None
 
         if town:
             o = c.world.get_town(town, True)
@@ -190,20 +187,12 @@ def generate_command_today(
         else:
             o = None
 
-        table = await c.database.get_table(table_name)
-
-        if o_type != "global":
-            if not o: raise client.errors.MildError("Nothing found!")
-            conditions.append(db.CreationCondition(name_attribute, o.name))
+        if o_type != "global" and not o: raise client.errors.MildError("Nothing found!")
         
-        rs = await table.get_records(
-            conditions, 
-            ["time", attribute], 
-            order=db.CreationOrder("time", db.types.OrderAscending)
-        )
+        rs = c.history_today.read(o_type, o.name if o else None, attribute, datetime.datetime.now()-datetime.timedelta(days=1))
 
         if len(rs) == 0:
-            raise client.errors.MildError(f"No data to show yet! Wait until some is available (max 20 minutes)")
+            raise client.errors.MildError(f"No data to show yet! Wait until some is available (after the next refresh)")
 
         name = o.name_formatted + "'s" if o else 'Global'
         attnameformat = attname.replace('_', ' ')
@@ -212,30 +201,27 @@ def generate_command_today(
         last = None
         values = {}
         parsed_values = {}
-        for record in rs:
+        for time, value in rs:
             
-            if record.attribute(attribute) == None:
-                continue
-            
-            parsed = parser(record.attribute(attribute)) if parser else record.attribute(attribute)
+            parsed = parser(value) if parser else value
             
-            parsed_values[str(record.attribute('time'))] = parsed
+            parsed_values[str(time)] = parsed
 
             change = parsed-last if last else None
             change = (("+" if change >= 0 else "-") + formatter(change).replace("-", "")) if change not in [None, 0] else ""
             val = formatter(parsed)
             
-            log = f"**<t:{int(record.attribute('time').timestamp())}:f>**: {discord.utils.escape_markdown(str(val))}" + (f" (`{change}`)\n" if last and len(change)>0 else "\n") + log
+            log = f"**<t:{int(time.timestamp())}:f>**: {discord.utils.escape_markdown(str(val))}" + (f" (`{change}`)\n" if last and len(change)>0 else "\n") + log
             last = parsed
         
-            values[str(record.attribute('time'))] = int(parsed)
+            values[str(time)] = int(parsed)
         
         lg = c.image_generator.LineGraph(c.image_generator.XTickFormatter.DATETIME, y_formatter)
-        lg.add_line(c.image_generator.Line([c.image_generator.Vertex(r.fields[0].value, r.fields[1].value) for r in rs]))
-        await c.image_generator.plot_linegraph(
+        lg.add_line(c.image_generator.Line(x=[time for time, _ in rs], y=[value for _, value in rs]))
+        job = await c.image_generator.plot_linegraph(
             lg, f"{name} {attnameformat} history today", "Time (GMT)", y or "Value"
         )
-        file = await c.image_generator.render_plt(s.IMAGE_DPI_GRAPH, pad=True)
+        file = await c.image_generator.render_plt(job, pad=True)
         graph = discord.File(file, filename="graph.png")
 
         embed = discord.Embed(title=f"{name} {attnameformat} history today", color=s.embed)
@@ -323,10 +309,10 @@ def generate_visited_command(cog, c : client.Client, is_town=False, is_player=Fa
 
         files = []
         if len(objects) > 0:
-            await c.image_generator.plot_barchart(
+            job = await c.image_generator.plot_barchart(
                 values[0:s.top_graph_object_count], f"{str(o)}'s visited {opp} history ({len(objects)})", opp.title(), "Time (minutes)", y_formatter=c.image_generator.YTickFormatter.TIME
             )
-            file = await c.image_generator.render_plt(s.IMAGE_DPI_GRAPH, pad=True)
+            file = await c.image_generator.render_plt(job, pad=True)
             files.append(discord.File(file, filename="graph.png"))
             embed.set_image(url="attachment://graph.png")
 
@@ -351,8 +337,8 @@ def generate_visited_command(cog, c : client.Client, is_town=False, is_player=Fa
                             if hasattr(item, "label") and item.label == "Map":
                                 item.disabled = True 
 
-                        dpi = await c.image_generator.generate_area_map(towns, True, True, True, True, None, [])
-                        map = discord.File(await c.image_generator.render_plt(dpi, None), "graph.png")
+                        job = await c.image_generator.generate_area_map(towns, True, True, True, True, None, [])
+                        map = discord.File(await c.image_generator.render_plt(job), "graph.png")
                         
                         await interaction.followup.edit_message(embed=embed, attachments=[map], message_id=interaction.message.id, view=view)
                     return map_button_callback
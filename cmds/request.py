@@ -196,7 +196,9 @@ class Mod(commands.Cog):
         if interaction.user.id not in s.mods:
             raise client.errors.MildError("You are not a Bot Moderator!")
         
-        await self.client.merge_objects(object_type, old_object_name, new_object_name)
+        async with self.client.refresh_lock:
+            await self.client.merge_objects(object_type, old_object_name, new_object_name)
+            await self.client.commit()
 
 
         await interaction.response.send_message(
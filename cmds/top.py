@@ -38,11 +38,13 @@ def generate_command(
 
         if is_town:
             if not_in_history:
-                rs = await c.towns_table.get_records(attributes=["name", attribute], order=db.CreationOrder(attribute, db.types.OrderDescending))
-                total = await c.towns_table.total_column(attribute)
+                columns = c.world.snapshot.get("town")
+                rs = columns.ordered(attribute)
+                total = columns.total(attribute)
             else:
                 rs = await c.town_history_table.get_records(attributes=["town AS name", attribute], order=db.CreationOrder(attribute, db.types.OrderDescending), conditions=[db.CreationCondition("date", on_date)])
                 total = await c.town_history_table.total_column(attribute, conditions=[db.CreationCondition("date", on_date)])
+                rs = [(r.attribute("name"), r.fields[1].value) for r in rs]
             l = [t.name for t in c.world.towns]
         elif is_player:
             rs = await c.player_history_table.get_records(
@@ -51,12 +53,14 @@ def generate_command(
                 conditions=[db.CreationCondition("date", on_date, "<=")],
                 group=["player"]
             )
+            rs = [(r.attribute("name"), r.fields[1].value) for r in rs]
             total = 0
-            for r in rs: total += r.attribute(attribute) or 0
+            for _, value in rs: total += value or 0
             l = [p.name for p in c.world.players]
         else: # is nation
             rs = await c.nation_history_table.get_records(conditions=[db.CreationCondition("date", on_date)], attributes=["nation AS name", attribute], order=db.CreationOrder(attribute, db.types.OrderDescending))
             total = await c.nation_history_table.total_column(attribute, conditions=[db.CreationCondition("date", on_date)])
+            rs = [(r.attribute("name"), r.fields[1].value) for r in rs]
             l = [n.name for n in c.world.nations]
 
         o_type = "nation" if is_nation else "town" if is_town else "player" if is_player else "culture" if is_culture else "religion"
@@ -65,13 +69,13 @@ def generate_command(
         if is_culture or is_religion:
             rs = await c.object_history_table.get_records(conditions=[db.CreationCondition("type", o_type), db.CreationCondition("date", on_date)], attributes=["object AS name", attribute], order=db.CreationOrder(attribute, db.types.OrderDescending))
             total = await c.object_history_table.total_column(attribute, conditions=[db.CreationCondition("type", o_type), db.CreationCondition("date", on_date)])
+            rs = [(r.attribute("name"), r.fields[1].value) for r in rs]
             l = [o.name for o in c.world._objects[o_type + "s"]]
 
         log = ""
         values : list[c.image_generator.Vertex] = []
         i = -1
-        for record in (reversed(rs) if reverse else rs):
-            r_name = record.attribute("name")
+        for r_name, value in (reversed(rs) if reverse else rs):
             if is_town and (r_name in s.DEFAULT_TOWNS or True in [l in r_name for l in s.DEFAULT_TOWNS_SUBSTRING]):
                 continue
             if is_religion and "Production" in r_name:
@@ -80,9 +84,9 @@ def generate_command(
                 continue
             i += 1
             
-            parsed = (parser(record.fields[1].value) if parser else record.fields[1].value) or 0
+            parsed = (parser(value) if parser else value) or 0
             val = formatter(parsed)
-            attval = record.attribute(attribute) or 0
+            attval = value or 0
             if total > 0:
                 perc = (attval/total)*100 if type(attval) != datetime.date else (parsed/total)*100
             else:
@@ -97,10 +101,10 @@ def generate_command(
         
         title = f"Top {o_type}s by {attnameformat} " + (f"on {on} " if on else "") + f"({i:,})"
 
-        await c.image_generator.plot_barchart(
+        job = await c.image_generator.plot_barchart(
             values[0:s.top_graph_object_count], title, o_type.title(), y or "Value", y_formatter, highlight=highlight
         )
-        graph = discord.File(await c.image_generator.render_plt(s.IMAGE_DPI_GRAPH, pad=True), "graph.png")
+        graph = discord.File(await c.image_generator.render_plt(job, pad=True), "graph.png")
 
         embed = discord.Embed(title=title, color=s.embed)
         if interaction.extras.get("author"): embed._author = interaction.extras.get("author")
@@ -1,5 +1,5 @@
 
 from db import creation 
 from db import types
-from db.creation import CreationAttribute, CreationTable, CreationField, CreationCondition, CreationOrder, CreationTableJoin
+from db.creation import CreationAttribute, CreationTable, CreationField, CreationCondition, CreationOrder, CreationTableJoin, CreationIndex
 from db.wrapper import Database
\ No newline at end of file
@@ -104,7 +104,8 @@ class CreationField():
         return s
     
     @classmethod
-    def external_query(self, table : wrapper.Table, attribute : CreationAttribute|str, condition : CreationCondition|typing.List[CreationCondition], operator : str = "=", query_attribute:CreationAttribute|str=None):
+    def external_query(self, table : wrapper.Table, attribute : CreationAttribute|str, condition : CreationCondition|typing.List[CreationCondition], operator : str = "=", query_attribute:CreationAttribute|str=None, bindings : bool = False):
+        """bindings: keep condition values as ? parameters so the same query can be reused for many records (executemany)"""
         if type(condition) == list:
             conditions = condition
         else:
@@ -112,38 +113,60 @@ class CreationField():
         
         attribute_name = self.attribute_name_calc(self, str(attribute))
         attribute_name_val = self.attribute_name_calc(self, str(query_attribute or attribute))
+        values = []
         for condition in conditions:
             if type(condition) == CreationCondition:
-                condition.no_bindings = True
+                condition.no_bindings = not bindings
+                if bindings:
+                    values.append(condition.value)
 
         where = (f"WHERE " + " AND ".join(str(condition) for condition in conditions)) if len(conditions) > 0 else ""
         s = self(attribute_name, f"(SELECT {attribute_name_val} FROM {table.name if type(table) != str else table} {where})")
-        s._seperate_values = []
+        s._seperate_values = values
         s.no_quotations = True
         s.operator = operator
 
         return s
     
+    @property 
+    def value_query(self):
+        """The field's value as it appears in a query. Either a ? binding or an expression"""
+        if self.no_quotations or len(self._seperate_values) == 0:
+            return str(self.field_value)
+        return "?"
+
     @property
     def str_no_table(self):
         attribute_name = self.attribute_name_calc(self.attribute_name)
-
-        if len(self._seperate_values) == 0:
-            return f"{attribute_name} {self.operator} {self.field_value}"
-        else:
-            return f"{attribute_name} {self.operator} ?"
+        return f"{attribute_name} {self.operator} {self.value_query}"
 
     def __str__(self):
         attribute_name = self.attribute_name_calc(self.attribute_name)
-        if len(self._seperate_values) == 0:
-            return f"{attribute_name} {self.operator} {self.field_value}"
-        else:
-            return f"{attribute_name} {self.operator} ?"
+        return f"{attribute_name} {self.operator} {self.value_query}"
+
+class CreationIndex():
+    def __init__(self, attributes : typing.List[typing.Union[str, wrapper.Attribute]], unique : bool = False, where : str = None, name : str = None):
+        """where: makes a partial index, eg. "object_type = 'town'" """
+        self.attributes = [a if type(a) == str else a.name for a in attributes]
+        self.unique = unique 
+        self.where = where
+        self.__name = name
+    
+    def name(self, table_name : str) -> str:
+        return self.__name or f"{'unique' if self.unique else 'index'}_{table_name}_{'_'.join(self.attributes)}"
+
+    def _create_index_query(self, table_name : str):
+        where = f" WHERE {self.where}" if self.where else ""
+        return f"CREATE {'UNIQUE ' if self.unique else ''}INDEX IF NOT EXISTS {self.name(table_name)} ON {table_name} ({', '.join(self.attributes)}){where};"
+
+    def __repr__(self):
+        return f"<Index {', '.join(self.attributes)}{' unique' if self.unique else ''}>"
 
 class CreationTable():
-    def __init__(self, name : str, attributes : typing.List[CreationAttribute]):
+    def __init__(self, name : str, attributes : typing.List[CreationAttribute], indexes : typing.List[CreationIndex] = None):
         self.name = name 
         self.attributes = attributes
+        self.indexes = indexes or []
     
     def create_in_db(self, db : wrapper.Database):
         db.create_table(self)
@@ -1,22 +1,59 @@
-
-import aiosqlite 
+import aiosqlite
+import contextvars
 import os
-import sqlite3 
+import sqlite3
+
+# Set for tasks that write, so they keep reading their own uncommitted changes
+_uses_writer : contextvars.ContextVar[bool] = contextvars.ContextVar("uses_writer", default=False)
 
 class RawDatabase():
-    def __init__(self, path : str):
-        self.path = path 
+    def __init__(self, path : str, read_connections : int = 0):
+        self.path = path
+        self.read_connections = read_connections
 
         self._connection_store : aiosqlite.Connection = None
-    
-    @property 
+        self._read_connection_store : list[aiosqlite.Connection] = []
+        self.__next_read = 0
+
+    @property
     def filename(self):
         return os.path.basename(self.path)
 
     async def connect(self):
-        self._connection_store = await aiosqlite.connect(self.path, detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES) 
+        self._connection_store = await aiosqlite.connect(self.path, detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES)
         return self._connection_store
-    
-    @property 
+
+    async def connect_readers(self):
+        """Open the read only pool. Call once the database is in WAL mode so readers aren't blocked by the writer"""
+        for _ in range(self.read_connections - len(self._read_connection_store)):
+            connection = await aiosqlite.connect(f"file:{self.path}?mode=ro", uri=True, detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES)
+            await connection.execute("PRAGMA query_only = ON")
+            self._read_connection_store.append(connection)
+
+    async def close(self):
+        for connection in self._read_connection_store:
+            await connection.close()
+        self._read_connection_store = []
+        if self._connection_store:
+            await self._connection_store.close()
+            self._connection_store = None
+
+    def use_writer(self) -> contextvars.Token:
+        """Route reads in the current task to the writer connection. Tasks made from this one inherit it,
+        so anything which starts other tasks (eg. setup) should undo it with stop_using_writer"""
+        return _uses_writer.set(True)
+
+    def stop_using_writer(self, token : contextvars.Token):
+        _uses_writer.reset(token)
+
+    @property
     def connection(self):
         return self._connection_store
+
+    @property
+    def read_connection(self):
+        if _uses_writer.get() or len(self._read_connection_store) == 0:
+            return self._connection_store
+
+        self.__next_read = (self.__next_read + 1) % len(self._read_connection_store)
+        return self._read_connection_store[self.__next_read]
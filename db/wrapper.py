@@ -210,6 +210,7 @@ class Table():
             for field in record:
                 if field.no_quotations:
                     values_for_query_record.append(str(field.field_value))
+                    values_for_record += field._seperate_values
                 else:
                     values_for_record.append(str(field.field_value))
                     values_for_query_record.append(" ? ")
@@ -217,10 +218,68 @@ class Table():
             vals.append("(" + ", ".join(values_for_query_record) + ")")
             values += values_for_record
         
+        self.db.use_writer()
         await self.db.connection.execute(f"INSERT INTO {self.name} ({', '.join(attributes)}) VALUES {', '.join(vals)}", tuple(values))
         await self.db.commit(True)
 
+    async def upsert_records(self,
+            records : typing.List[typing.List[typing.Union[creation.CreationField, typing.Any]]],
+            conflict_attributes : typing.List[typing.Union[str, Attribute]],
+            update_fields : typing.List[typing.Union[creation.CreationField, str, Attribute]] = None
+    ) -> int:
+        """
+        Insert many records with one executemany. Where a record with the same conflict_attributes already exists it is updated instead
+        - conflict_attributes must have a unique index (see Database.create_index)
+        - update_fields are attribute names (set to the value that was being inserted) or CreationFields (eg. CreationField.add)
+        - Every record must have the same layout, including where CreationField expressions are (use external_query(bindings=True))
+        """
+        if len(records) == 0:
+            return 0
+
+        attributes = []
+        values_for_query = []
+        for i, field in enumerate(records[0]):
+            if type(field) == creation.CreationField:
+                attributes.append(field.attribute_name_calc(field.attribute_name))
+                values_for_query.append(field.value_query)
+            else:
+                attributes.append(self.attributes[i].name)
+                values_for_query.append("?")
         
+        update_commands = []
+        update_params = []
+        for field in update_fields or []:
+            if type(field) == creation.CreationField:
+                update_commands.append(field.str_no_table)
+                update_params += field._seperate_values
+            else:
+                name = field.name if type(field) == Attribute else field
+                update_commands.append(f"{name} = excluded.{name}")
+
+        params = []
+        for record in records:
+            values = []
+            for field in record:
+                if type(field) == creation.CreationField:
+                    values += field._seperate_values
+                else:
+                    values.append(field)
+            params.append(tuple(values + update_params))
+        
+        conflict = ", ".join(a.name if type(a) == Attribute else a for a in conflict_attributes)
+        on_conflict = f"DO UPDATE SET {', '.join(update_commands)}" if len(update_commands) > 0 else "DO NOTHING"
+
+        self.db.use_writer()
+        cursor = await self.db.connection.executemany(
+            f"INSERT INTO {self.name} ({', '.join(attributes)}) VALUES ({', '.join(values_for_query)}) ON CONFLICT ({conflict}) {on_conflict}", 
+            params
+        )
+        await self.db.commit(True)
+
+        self.__records = None
+
+        return cursor.rowcount
+
 
     async def get_records(
             self,
@@ -293,6 +352,7 @@ class Table():
 
         conditions_str += " AND ".join(str(c) for c in conditions)
 
+        self.db.use_writer()
         cursor = await self.db.connection.execute(conditions_str, tuple(params))
         await self.db.commit(True)
 
@@ -311,6 +371,7 @@ class Table():
             conditions.append(c)
         
         delete_command += " AND ".join(str(c) for c in conditions)
+        self.db.use_writer()
         await self.db.connection.execute(delete_command, tuple(params))
         await self.db.commit(True)
 
@@ -366,6 +427,7 @@ class Table():
         condition_str = "WHERE (" + (") OR (".join(" AND ".join(str(condition) for condition in c) for c in conditions) + ")") if len(conditions) > 0 else ""
         command = f"UPDATE {self.name} SET {set_command} {condition_str} "
         #print(command, params)
+        self.db.use_writer()
         cursor = await self.db.connection.execute(command, params)
         await self.db.commit(True)
         if self.__records:
@@ -400,7 +462,7 @@ class Table():
         
         conditions_command = ("WHERE " + " AND ".join(cds)) if len(cds) > 0 else ""
         
-        r = await (await self.db.connection.execute(f"SELECT EXISTS(SELECT * FROM {self.name} {conditions_command} )", params)).fetchone()
+        r = await (await self.db.read_connection.execute(f"SELECT EXISTS(SELECT * FROM {self.name} {conditions_command} )", params)).fetchone()
         return bool(r[0])
 
     async def add_record_if_not_exists(
@@ -415,6 +477,7 @@ class Table():
         return True
 
     async def clear(self):
+        self.db.use_writer()
         await self.db.connection.execute(f"DELETE FROM {self.name}")
 
         
@@ -433,8 +496,8 @@ class Table():
 
 class Database(database.RawDatabase):
 
-    def __init__(self, path: str, auto_commit : typing.Union[bool, datetime.timedelta] = True):
-        super().__init__(path)
+    def __init__(self, path: str, auto_commit : typing.Union[bool, datetime.timedelta] = True, read_connections : int = 0):
+        super().__init__(path, read_connections)
 
         self.path = path
         self.auto_commit = auto_commit
@@ -468,11 +531,41 @@ class Database(database.RawDatabase):
 
     async def create_or_get_table(self, table: creation.CreationTable):
         
+        got_table = None
         for existing_table in (await self.tables):
             if table.name == existing_table.name:
-                return existing_table
+                got_table = existing_table
+                break
+        
+        if not got_table:
+            got_table = await self.create_table(table)
+
+        # Indexes are made here too so databases made before an index was added get it
+        for index in table.indexes:
+            await self.create_index(got_table, index)
+
+        return got_table
+
+    async def create_index(self, table : typing.Union[str, Table], index : typing.Union[creation.CreationIndex, typing.List[typing.Union[str, Attribute]]], unique : bool = False) -> str:
+        table_name = table.name if type(table) in [Table, creation.CreationTable] else table
+        if type(index) != creation.CreationIndex:
+            index = creation.CreationIndex(index, unique)
+        index_name = index.name(table_name)
+
+        exists = await (await self.connection.execute("SELECT EXISTS(SELECT * FROM sqlite_master WHERE type='index' AND name = ?)", (index_name, ))).fetchone()
+        if exists[0]:
+            return index_name
+
+        if index.unique: # Old databases may have duplicates which would stop the index being made. Keep the newest record
+            where = f" WHERE {index.where}" if index.where else ""
+            cursor = await self.connection.execute(f"DELETE FROM {table_name} WHERE rowid NOT IN (SELECT MAX(rowid) FROM {table_name}{where} GROUP BY {', '.join(index.attributes)}){' AND '+index.where if index.where else ''}")
+            if cursor.rowcount > 0:
+                print(f"Removed {cursor.rowcount} duplicate rows from {table_name} to make {index_name}")
+
+        await self.connection.execute(index._create_index_query(table_name))
+        await self.commit(True)
 
-        return await self.create_table(table)
+        return index_name
 
     async def delete_table(self, table: typing.Union[str, Table]):
         table_name = table.name if type(table) in [Table, creation.CreationTable] else table
@@ -560,7 +653,7 @@ class Database(database.RawDatabase):
         
         selection = ", ".join(str(a) for a in attrs ) if len(attrs) != len(table.attributes) or join else "*"
         #print(f"SELECT{distinct_command} {selection} FROM {table.name}{join_command}{conditions_str}{group_command} {order_command}{limit_command}", tuple(params))
-        cursor = await self.connection.execute(f"SELECT{distinct_command} {selection} FROM {table.name}{join_command}{conditions_str}{group_command} {order_command}{limit_command}", tuple(params))
+        cursor = await self.read_connection.execute(f"SELECT{distinct_command} {selection} FROM {table.name}{join_command}{conditions_str}{group_command} {order_command}{limit_command}", tuple(params))
         fetched = await cursor.fetchall()
 
         resp = []
@@ -40,7 +40,7 @@ async def players_today_autocomplete(interaction : discord.Interaction, current
 
     c : client.Client = interaction.client.client
 
-    rs = [r.attribute("player") for r in await c.player_day_history_table.get_records([db.CreationCondition("player", f"%{current}%", "LIKE")], attributes=["player"], group=["player"])]
+    rs = [name for name in c.history_today.names("player", datetime.datetime.now()-datetime.timedelta(days=1)) if current.lower() in name.lower()]
 
     return [app_commands.Choice(name=r, value=r) for r in rs][:25]
 
@@ -54,33 +54,26 @@ async def deleted_towns_autocomplete(interaction : discord.Interaction, current
 
     c : client.Client = interaction.client.client
 
-    rs = [r.attribute("town") for r in await c.town_history_table.get_records([db.CreationCondition("town", f"%{current}%", "LIKE")], attributes=[c.town_history_table.attribute("town")], group=[c.town_history_table.attribute("town")])]
-    rs = list(set(rs) - set(n.name for n in c.world.towns))
+    rs = await c.history_catalogue.search_deleted("town", current, c.world.search_indexes["town"])
 
-    return [app_commands.Choice(name=r, value=r) for r in rs][:25]
+    return [app_commands.Choice(name=r, value=r) for r in rs]
 
 async def deleted_nations_autocomplete(interaction : discord.Interaction, current : str):
 
     c : client.Client = interaction.client.client
 
-    rs = [r.attribute("nation") for r in await c.nation_history_table.get_records([db.CreationCondition("nation", f"%{current}%", "LIKE")], attributes=[c.nation_history_table.attribute("nation")], group=[c.nation_history_table.attribute("nation")])]
-    rs = list(set(rs) - set(n.name for n in c.world.nations))
+    rs = await c.history_catalogue.search_deleted("nation", current, c.world.search_indexes["nation"])
 
-    return [app_commands.Choice(name=r, value=r) for r in rs][:25]
+    return [app_commands.Choice(name=r, value=r) for r in rs]
 
 def history_date_autocomplete_wrapper(object_type : str):
 
     async def history_date_autocomplete(interaction : discord.Interaction, current : str):
         
         c : client.Client = interaction.client.client
-        table = await c.database.get_table(f"{object_type}_history")
-        dates = await table.get_records(attributes=["date"], group=["date"], order=db.CreationOrder("date", db.types.OrderAscending))
-        dates_formatted = [datetime.datetime.strftime(r.attribute("date"), s.DATE_STRFTIME) for r in dates ]
-
-        return [
-            app_commands.Choice(name=d, value=d)
-            for d in dates_formatted if current.lower() in d.lower()
-        ][:25]
+        dates_formatted = await c.history_catalogue.search_dates(object_type, current)
+
+        return [app_commands.Choice(name=d, value=d) for d in dates_formatted]
     
     return history_date_autocomplete
 
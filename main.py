@@ -28,6 +28,7 @@ async def on_ready():
 
     _refresh.start()
     _chat_refresh.start()
+    _maintenance.start()
 
     for guild in bot.guilds:
         print(guild.name, guild.owner)
@@ -39,6 +40,13 @@ async def _chat_refresh():
     except Exception as e:
         print(e)
 
+@tasks.loop(seconds=s.maintenance_period)
+async def _maintenance():
+    try:
+        await c.maintenance.run()
+    except Exception as e:
+        await bot.get_channel(s.alert_channel).send(f"Maintenance error: \n```{e}``` {discord.utils.escape_markdown(traceback.format_exc())}"[:2000])
+
 @tasks.loop(seconds=c.refresh_period)
 async def _refresh():
     c.refresh_no += 1
@@ -48,12 +56,15 @@ async def _refresh():
     print("Refreshing", c.refresh_period)
     w = False
     try:
-        w = await c.fetch_world()
+        async with c.refresh_lock:
+            w = await c.fetch_world()
 
-        if w != False:
-            await c.cull_db()
-            await c.database.commit()
+            if w != False:
+                if c.chat_counters.due:
+                    await c.chat_counters.flush()
+                await c.commit()
 
+        if w != False:
             try:
                 await c.notifications.refresh()
             except Exception as e:
@@ -95,4 +106,13 @@ async def setup_hook():
 
 bot.setup_hook = setup_hook
 
-bot.run(os.getenv("token"))
+async def close():
+    try:
+        await c.close() # Write buffered chat counters
+    finally:
+        await commands.Bot.close(bot)
+
+bot.close = close
+
+if __name__ == "__main__": # Render workers import this module
+    bot.run(os.getenv("token"))
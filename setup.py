@@ -8,7 +8,7 @@ import datetime
 
 """
 Setup file!
--Make sure to clear all images from ./cache if adjusting map settings, otherwise may still show an old image when testing
+-Make sure to clear all images from ./cache if adjusting map settings (eg. DPI), otherwise may still show an old image when testing
 
 """
 
@@ -28,13 +28,21 @@ DEFAULT_TOWNS = ["RulerSpawn", "Sea", "Unclaimed"] # Ignore these towns in certa
 DEFAULT_TOWNS_SUBSTRING = ["Quarry", "Treasure"]
 DONT_TRACK_TOWNS = ["Sea", "RulerSpawn", "Unclaimed", "EW"] # Ignore these towns while tracking.
 
-today_tracking_period = datetime.timedelta(minutes=30)
-production_today_tracking_minutes = [0, 30]
-
 IMAGE_DPI_GRAPH = 100 # DPI (image quality) for graphs (bar charts, pie charts, line graphs)
 IMAGE_DPI_DRAWING = 300 # DPI (image quality) for drawings (maps)
 IMAGE_DPI_DRAWING_BIG = 500 # DPI (image quality) for big drawings (maps)
 IMAGE_DPI_RENDER = 600
+render_profiles = { # Where an image is shown. dpi None keeps the image's own DPI (above). line_width multiplies map border widths so they stay visible when small
+    "thumbnail":{"dpi":50, "line_width":4}, # Embed thumbnails, shown at around 80px
+    "inline":{"dpi":150, "line_width":1.5}, # Small images in messages
+    "full":{"dpi":None, "line_width":1}, # Embed images
+    "zoom":{"dpi":IMAGE_DPI_RENDER, "line_width":1} # Images to be opened and zoomed into
+}
+render_workers = 2 # Processes used to render images so the bot isn't blocked
+image_cache_budget = 200*1000*1000 # Bytes of cached maps kept in ./cache. The least recently used are removed first
+earth_tile_size = 160 # Pixels along each side of a tile of the whole earth map
+earth_tile_columns = 16 # Tiles across the whole earth map. It's half as many tiles high
+background_mipmap_levels = 6 # Versions of the map backgrounds each render worker keeps decoded, each half the size of the one before
 timeline_colors = ["red", "green", "brown", "orange", "purple", "pink"] # Colours for timelines 
 compare_emojis = [":red_square:", ":orange_square:", ":yellow_square:", ":green_square:", ":blue_square:"] # Emojis for compare commands
 compare_line_colors = ["red", "orange", "yellow", "green", "cyan"]
@@ -55,6 +63,27 @@ DATE_STRFTIME = "%a %b %d %Y"
 map_url = "https://map.rulercraft.com" # Base map URL
 default_refresh_period = 20 # Duration in seconds to refresh
 map_link_zoom = 10 # Zoom level for map links. Eg "Location" in /get player
+database_read_connections = 4 # Read only connections used by commands, so they don't queue behind the refresh
+chat_journal_path = "chat_journal.jsonl" # Chat counters not committed to the database yet. Replayed on startup
+chat_flush_period = timedelta(minutes=1) # How often buffered chat counters are written to the database
+chat_flush_threshold = 500 # Write buffered chat counters early if this many players/objects have changed
+backup_keep_daily = 7 # Days to keep every backup for
+backup_keep_weekly = 4 # Weeks to then keep one backup a week for
+backup_keep_monthly = 12 # Months to then keep one backup a month for
+maintenance_period = 30 # Seconds between maintenance runs (culling, trimming history)
+maintenance_slice_budget = 0.5 # Seconds a maintenance job can hold the database for before letting the refresh in
+maintenance_chunk_size = 5000 # Rowids checked per maintenance statement
+maintenance_day_history_period = timedelta(hours=1) # How often day history older than a day is removed
+maintenance_nightly_hour = 4 # Hour that nightly maintenance (history abstraction, orphaned rows) starts at
+cull_period = timedelta(minutes=1) # How often removed players/towns/nations are culled
+history_today_path = "history_today.pickle" # Town, player, nation and global history for /history_today
+history_today_save_period = timedelta(minutes=5) # How often that history is saved to disk
+history_today_resolutions = { # (seconds per value, 0 for every refresh, values kept) from finest to coarsest. Only the last day is read
+    "global":[(0, 180), (300, 288)],
+    "town":[(0, 90), (300, 288)],
+    "nation":[(0, 90), (300, 288)],
+    "player":[(0, 90), (300, 288)]
+}
 
 #cull_history_from = timedelta(days=60) # Duration of time to remove history from the database after
 cull_players_from = timedelta(days=45) # Duration of time to remove players from the database after